@@ -0,0 +1,99 @@
+"""
+Answer cache for the license chatbot.
+
+Answers are kept per worker in a bounded LRU with a TTL, keyed by the
+normalized question, the data versions the chatbot reads and the caller's
+scope (role and department). Any change to that data moves a version, so a
+cached answer is only reused while the data behind it is unchanged; old
+entries age out through the LRU and TTL.
+
+With a per-process cache (see versions.cache_is_shared) another worker's
+changes never move the versions seen here, so answers are only kept for
+LOCAL_TTL_SECONDS and are at most that far behind the database.
+"""
+import hashlib
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from .versions import cache_is_shared, get_versions
+
+MAX_ENTRIES = 512
+TTL_SECONDS = 10 * 60
+LOCAL_TTL_SECONDS = 60
+
+# Everything the chatbot's context and retrieval index are built from
+DATA_VERSIONS = ('catalog', 'users', 'license-requests', 'issues', 'rollups')
+
+WORD_RE = re.compile(r'[a-z0-9]+')
+
+
+def question_fingerprint(question):
+    """Same fingerprint for questions that only differ in case, spacing or punctuation."""
+    normalized = ' '.join(WORD_RE.findall(question.lower()))
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+def scope_for_user(user):
+    """What the caller can see, as part of the cache key."""
+    profile = getattr(user, 'profile', None)
+    if profile is None:
+        return ('USER', None)
+    return (profile.role, profile.department_key)
+
+
+class AnswerCache:
+    """A thread-safe LRU of answers with a per-entry TTL and hit/miss counters."""
+
+    def __init__(self, max_entries=MAX_ENTRIES, ttl=TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'expirations': 0}
+
+    def key(self, question, scope):
+        versions = get_versions(DATA_VERSIONS)
+        return (question_fingerprint(question), tuple(versions[name] for name in DATA_VERSIONS), scope)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] <= time.monotonic():
+                del self._entries[key]
+                self._counters['expirations'] += 1
+                entry = None
+            if entry is None:
+                self._counters['misses'] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._counters['hits'] += 1
+            return entry[1]
+
+    def current_ttl(self):
+        return self.ttl if cache_is_shared() else min(self.ttl, LOCAL_TTL_SECONDS)
+
+    def put(self, key, answer):
+        ttl = self.current_ttl()
+        with self._lock:
+            self._entries[key] = (time.monotonic() + ttl, answer)
+            self._entries.move_to_end(key)
+            self._counters['stores'] += 1
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self._counters['evictions'] += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self._counters['hits'] + self._counters['misses']
+            return {
+                **self._counters,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.current_ttl(),
+                'hit_rate': round(self._counters['hits'] / lookups, 3) if lookups else None,
+            }
+
+
+answer_cache = AnswerCache()
@@ -0,0 +1,9 @@
+from django.apps import AppConfig
+
+class ApiConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'api'
+
+    # Register the signal handlers that keep derived tables in sync.
+    def ready(self):
+        import api.signals
@@ -0,0 +1,173 @@
+"""
+JWT authentication that reads the user's role and department from the token.
+
+Tokens issued by /api/token/ carry the user's username, role, department and
+a claims version. ClaimsJWTAuthentication turns a valid token into an
+in-memory User with its Profile attached, so `request.user.profile.role`
+and friends cost no query. Recently verified tokens are kept in a small LRU
+so their signature is only checked once per worker.
+
+Changing a user's role, department or active flag takes a new claims
+version (see api/signals.py), which rejects the tokens issued before the
+change; the client gets a 401 and calls /api/token/refresh/, which reloads
+the claims from the database. Tokens without claims fall back to the
+default database lookup.
+
+Claims versions live in Django's cache, so claims are only trusted when that
+cache is shared by every process (see versions.cache_is_shared). With the
+per-process LocMem cache, a token issued or revoked by another worker, the
+ASGI process or a script would be misjudged, so every request loads the
+user and profile from the database instead.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer, TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import AccessToken
+
+from tenants.models import Profile
+
+from .versions import cache_is_shared
+
+VERIFIED_TOKEN_CACHE_SIZE = 2048
+
+
+def _claims_version_key(user_id):
+    return f'claims-version:{user_id}'
+
+
+def get_claims_version(user_id):
+    """
+    Returns the user's current claims version. A missing counter (cold or
+    evicted cache) starts at the current time rather than 1, so it can
+    never match a version handed out before it was lost.
+    """
+    key = _claims_version_key(user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key)
+    return version
+
+
+def revoke_claims(user_id):
+    """Rejects every token issued to the user so far; they must refresh it."""
+    key = _claims_version_key(user_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.add(key, time.time_ns(), timeout=None)
+
+
+def add_claims(token, user):
+    """Writes the user's current role and department into `token`."""
+    profile = Profile.objects.filter(user_id=user.pk).values('role', 'department', 'department_key').first() or {}
+    token['username'] = user.get_username()
+    token['role'] = profile.get('role')
+    token['department'] = profile.get('department')
+    token['department_key'] = profile.get('department_key')
+    token['cv'] = get_claims_version(user.pk)
+    return token
+
+
+def issue_access_token(user):
+    """Returns a fresh access token (as a string) with the user's current claims."""
+    return str(add_claims(AccessToken.for_user(user), user))
+
+
+class ClaimsTokenObtainPairSerializer(TokenObtainPairSerializer):
+    @classmethod
+    def get_token(cls, user):
+        # The access token copies these claims from the refresh token
+        return add_claims(super().get_token(user), user)
+
+
+class ClaimsTokenRefreshSerializer(TokenRefreshSerializer):
+    def validate(self, attrs):
+        data = super().validate(attrs)
+        # Re-issue the access token with the user's current claims instead of
+        # the ones copied from the refresh token
+        access = AccessToken(data['access'])
+        user = User.objects.filter(pk=access[api_settings.USER_ID_CLAIM]).first()
+        if user is None or not user.is_active:
+            raise AuthenticationFailed('User is inactive or no longer exists.', code='user_inactive')
+        data['access'] = str(add_claims(access, user))
+        return data
+
+
+class VerifiedTokenCache:
+    """A thread-safe, bounded LRU of raw token -> validated token."""
+
+    def __init__(self, max_size=VERIFIED_TOKEN_CACHE_SIZE):
+        self.max_size = max_size
+        self._tokens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, raw_token):
+        with self._lock:
+            token = self._tokens.get(raw_token)
+            if token is None:
+                return None
+            if token['exp'] <= time.time():
+                del self._tokens[raw_token]
+                return None
+            self._tokens.move_to_end(raw_token)
+            return token
+
+    def put(self, raw_token, token):
+        with self._lock:
+            self._tokens[raw_token] = token
+            self._tokens.move_to_end(raw_token)
+            while len(self._tokens) > self.max_size:
+                self._tokens.popitem(last=False)
+
+
+_verified_tokens = VerifiedTokenCache()
+
+
+def principal_from_claims(token):
+    """
+    Builds the authenticated user from the token claims, without a query.
+    It is read-only: views that save the user or profile must load them first.
+    """
+    user = User(id=token[api_settings.USER_ID_CLAIM], username=token['username'], is_active=True)
+    user._state.adding = False
+    user._state.db = 'default'
+    profile = Profile(
+        user_id=user.pk,
+        role=token['role'],
+        department=token['department'],
+        department_key=token['department_key']
+    )
+    # Cache both sides of the one-to-one so user.profile and profile.user don't query
+    Profile.user.field.set_cached_value(profile, user)
+    User.profile.related.set_cached_value(user, profile)
+    return user
+
+
+class ClaimsJWTAuthentication(JWTAuthentication):
+    def get_validated_token(self, raw_token):
+        token = _verified_tokens.get(raw_token)
+        if token is None:
+            token = super().get_validated_token(raw_token)
+            _verified_tokens.put(raw_token, token)
+        return token
+
+    def get_user(self, validated_token):
+        if 'cv' not in validated_token or not validated_token.get('role') or not cache_is_shared():
+            # Issued before claims were added, the user has no profile, or
+            # revocations made in other processes can't be seen from here
+            return super().get_user(validated_token)
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken('Token contained no recognizable user identification')
+        if validated_token['cv'] != get_claims_version(user_id):
+            raise InvalidToken('Token claims are out of date; refresh the token.')
+        return principal_from_claims(validated_token)
@@ -0,0 +1,145 @@
+"""
+Department budget ceilings for license grants.
+
+A grant is checked against DepartmentRollup.monthly_spend, the running total
+the rollup signals keep up to date, so a check costs a couple of primary-key
+reads and a catalog lookup however much the department already holds. Spend
+is summed over the department's distinct software, so a grant of software the
+department already uses adds nothing and is never a breach.
+
+Requests over budget are flagged when they are created. When one is approved
+the check is repeated: FLAG departments just keep the flag, HOLD departments
+refuse the approval with BudgetExceededError until the ceiling is raised.
+Every breach is sent as a `budget_breached` signal and logged.
+"""
+import logging
+from decimal import Decimal
+
+from django.dispatch import Signal
+
+from tenants.models import Profile
+from .catalog import get_software
+from .models import DepartmentBudget, DepartmentRollup, LicenseRequest
+from .rollups import department_key_for_user
+from .versions import bump_version_on_commit
+
+logger = logging.getLogger(__name__)
+
+# Sent with sender=LicenseRequest and the keyword arguments license_request,
+# department_key, ceiling, projected_spend, stage ('requested' or 'approval')
+# and held (True if the approval was refused).
+budget_breached = Signal()
+
+
+class BudgetExceededError(Exception):
+    """Raised when approving a GRANT would push a HOLD department over budget."""
+
+    def __init__(self, department_key, ceiling, projected_spend):
+        self.department_key = department_key
+        self.ceiling = ceiling
+        self.projected_spend = projected_spend
+        super().__init__(
+            f'Department {department_key} would spend {projected_spend} of its {ceiling} monthly budget.'
+        )
+
+
+def _projected_spend(monthly_spend, software_counts, software_id):
+    if software_counts.get(str(software_id)):
+        return monthly_spend
+    software = get_software(software_id)
+    return monthly_spend + (software['monthly_cost'] if software else Decimal('0'))
+
+
+def _emit(license_request, department_key, budget, projected_spend, stage, held):
+    logger.warning(
+        'License request %s would take department %s to %s of its %s monthly budget (%s, %s).',
+        license_request.pk, department_key, projected_spend, budget.monthly_ceiling,
+        stage, 'held' if held else 'flagged'
+    )
+    budget_breached.send(
+        sender=LicenseRequest,
+        license_request=license_request,
+        department_key=department_key,
+        ceiling=budget.monthly_ceiling,
+        projected_spend=projected_spend,
+        stage=stage,
+        held=held
+    )
+
+
+def flag_requests(license_requests):
+    """
+    Sets over_budget on the GRANT requests whose department would go over
+    its ceiling and emits an event for each. Works on any number of requests
+    with a fixed number of queries. Saved requests are updated in the
+    database; unsaved ones (for bulk_create) only get the attribute set.
+    Returns the flagged requests.
+    """
+    grants = [r for r in license_requests if r.request_type == LicenseRequest.RequestType.GRANT]
+    if not grants:
+        return []
+
+    department_by_user = dict(
+        Profile.objects.filter(user_id__in={r.user_id for r in grants}).values_list('user_id', 'department_key')
+    )
+    budgets = DepartmentBudget.objects.in_bulk([key for key in set(department_by_user.values()) if key])
+    if not budgets:
+        return []
+    spend = {
+        key: (monthly_spend, software_counts)
+        for key, monthly_spend, software_counts in DepartmentRollup.objects.filter(
+            pk__in=list(budgets)
+        ).values_list('department_key', 'monthly_spend', 'software_counts')
+    }
+
+    flagged = []
+    for license_request in grants:
+        department_key = department_by_user.get(license_request.user_id)
+        budget = budgets.get(department_key)
+        if budget is None:
+            continue
+        monthly_spend, software_counts = spend.get(department_key, (Decimal('0'), {}))
+        projected = _projected_spend(monthly_spend, software_counts, license_request.software_id)
+        if projected > max(budget.monthly_ceiling, monthly_spend):
+            license_request.over_budget = True
+            flagged.append(license_request)
+            _emit(license_request, department_key, budget, projected, 'requested', held=False)
+
+    saved = [r.pk for r in flagged if r.pk]
+    if saved:
+        LicenseRequest.objects.filter(pk__in=saved).update(over_budget=True)
+        bump_version_on_commit('license-requests')
+    return flagged
+
+
+def check_approval(license_request):
+    """
+    Checks a GRANT against its department's budget as it is approved. Run it
+    inside the approval's transaction: the department's rollup row is locked,
+    so concurrent approvals in one department see each other's spend.
+    Raises BudgetExceededError for a HOLD department; a FLAG department's
+    request is flagged and goes through.
+    """
+    if license_request.request_type != LicenseRequest.RequestType.GRANT:
+        return
+    department_key = department_key_for_user(license_request.user_id)
+    if not department_key:
+        return
+    budget = DepartmentBudget.objects.filter(pk=department_key).first()
+    if budget is None:
+        return
+
+    monthly_spend, software_counts = DepartmentRollup.objects.select_for_update().filter(
+        pk=department_key
+    ).values_list('monthly_spend', 'software_counts').first() or (Decimal('0'), {})
+    projected = _projected_spend(monthly_spend, software_counts, license_request.software_id)
+    if projected <= max(budget.monthly_ceiling, monthly_spend):
+        return
+
+    held = budget.enforcement == DepartmentBudget.Enforcement.HOLD
+    _emit(license_request, department_key, budget, projected, 'approval', held)
+    if held:
+        raise BudgetExceededError(department_key, budget.monthly_ceiling, projected)
+    license_request.over_budget = True
+    LicenseRequest.objects.filter(pk=license_request.pk).update(over_budget=True)
+    bump_version_on_commit('license-requests')
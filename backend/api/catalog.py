@@ -0,0 +1,99 @@
+"""
+Process-local cache of the software catalog.
+
+The catalog is small and read on nearly every write, so each worker keeps
+it in memory as id -> row and normalized name -> id. A version counter in
+the shared cache backend is bumped whenever a SaaSApplication is saved or
+deleted (see api/signals.py), and a worker reloads its copy the next time it
+sees a newer version. Name resolution is then a dict lookup.
+
+With a per-process cache (LocMem) other workers never see the bump, so
+lookups read the database instead of a copy that could be stale.
+"""
+import threading
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+
+from .models import SaaSApplication, normalize_software_name
+from .versions import bump_version, cache_is_shared, get_version
+
+CATALOG_FIELDS = (
+    'id', 'name', 'name_key', 'vendor', 'category', 'total_licenses',
+    'monthly_cost', 'renewal_date', 'description',
+)
+
+_lock = threading.Lock()
+_catalog = {'version': None, 'by_id': {}, 'by_name': {}}
+
+
+def invalidate_catalog(software_id=None):
+    """Tells every worker to reload the catalog on its next read."""
+    bump_version('catalog', changed=software_id)
+
+
+def _load(version):
+    by_id = {}
+    by_name = {}
+    for row in SaaSApplication.objects.order_by('id').values(*CATALOG_FIELDS):
+        by_id[row['id']] = row
+        # Legacy duplicates have no name_key; the oldest row keeps the name
+        key = row['name_key'] or normalize_software_name(row['name'])
+        if key:
+            by_name.setdefault(key, row['id'])
+    return {'version': version, 'by_id': by_id, 'by_name': by_name}
+
+
+def get_catalog():
+    """Returns this worker's catalog, reloading it if another worker changed it."""
+    global _catalog
+    if not cache_is_shared():
+        return _load(None)
+    version = get_version('catalog')
+    catalog = _catalog
+    if catalog['version'] != version:
+        with _lock:
+            if _catalog['version'] != version:
+                _catalog = _load(version)
+            catalog = _catalog
+    return catalog
+
+
+def get_software(software_id):
+    """Returns the cached row (a dict) for a software id, or None."""
+    if not cache_is_shared():
+        return SaaSApplication.objects.filter(pk=software_id).values(*CATALOG_FIELDS).first()
+    return get_catalog()['by_id'].get(software_id)
+
+
+def resolve_software_id(name):
+    """Returns the id of the software with this name (case-insensitive), or None."""
+    key = normalize_software_name(name)
+    if not cache_is_shared():
+        if not key:
+            return None
+        # Legacy duplicates have no name_key; the oldest row keeps the name
+        return SaaSApplication.objects.filter(
+            Q(name_key=key) | Q(name_key__isnull=True, name__iexact=name.strip())
+        ).order_by('id').values_list('id', flat=True).first()
+    return get_catalog()['by_name'].get(key)
+
+
+def get_or_create_software(name, defaults):
+    """
+    Resolves a software by name, creating it with `defaults` if it doesn't exist.
+    Safe under concurrent requests: the unique name_key index makes the
+    losing insert fail, and it then reads the winner's row.
+    """
+    software_id = resolve_software_id(name)
+    if software_id:
+        return software_id
+
+    try:
+        with transaction.atomic():
+            software = SaaSApplication.objects.create(name=name.strip(), **defaults)
+        return software.id
+    except IntegrityError:
+        return SaaSApplication.objects.values_list('id', flat=True).get(
+            name_key=normalize_software_name(name)
+        )
@@ -0,0 +1,120 @@
+"""
+Cached data context for the license chatbot.
+
+The chatbot's context is split into sections (inventory, request stats and
+users), each cached under the data versions of the tables it reads (see
+api/versions.py). A change to one table only rebuilds the sections that
+depend on it, and each section is built with a fixed number of set-based
+queries. The worker also remembers the last context it assembled, so a
+question whose data hasn't changed costs one cache read.
+
+With a per-process cache (see versions.cache_is_shared) a change made by
+another worker never moves this worker's versions, so the sections expire
+after LOCAL_SECTION_TIMEOUT and the last context isn't reused: the chatbot
+is at most that far behind the database.
+"""
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db.models import Count, F, Q
+
+from .inventory import software_inventory
+from .models import LicenseRequest
+from .versions import cache_is_shared, get_versions
+
+SECTION_TIMEOUT = 60 * 60
+LOCAL_SECTION_TIMEOUT = 60
+
+
+def build_request_stats():
+    """Request counts and patterns: one aggregate plus two grouped queries."""
+    counts = LicenseRequest.objects.aggregate(
+        total_requests=Count('id'),
+        pending=Count('id', filter=Q(status='PENDING')),
+        approved=Count('id', filter=Q(status='APPROVED')),
+        rejected=Count('id', filter=Q(status='REJECTED')),
+    )
+    most_requested = LicenseRequest.objects.filter(
+        request_type='GRANT'
+    ).values('software__name').annotate(
+        count=Count('id')
+    ).order_by('-count')[:5]
+    revoke_requests = LicenseRequest.objects.filter(
+        request_type='REVOKE'
+    ).values('software__name', 'software__monthly_cost').annotate(
+        count=Count('id')
+    ).order_by('software__name')
+    return {
+        **counts,
+        'most_requested_software': list(most_requested),
+        'revoke_requests': list(revoke_requests),
+    }
+
+
+def build_user_rows():
+    """Every user with their department and role, read in one joined query."""
+    return list(User.objects.order_by('id').values(
+        'username', 'email', 'first_name', 'last_name', 'is_active', 'is_staff', 'is_superuser',
+        department=F('profile__department'),
+        role=F('profile__role'),
+    ))
+
+
+# section name -> (builder, data versions it depends on)
+SECTIONS = {
+    'inventory': (software_inventory, ('catalog',)),
+    'request_stats': (build_request_stats, ('license-requests', 'catalog')),
+    'users': (build_user_rows, ('users',)),
+}
+
+
+class ChatContext:
+    """The chatbot's view of the data, plus the totals its prompt quotes."""
+
+    def __init__(self, inventory, request_stats, users):
+        self.inventory = inventory
+        self.request_stats = request_stats
+        self.users = users
+        self.total_monthly_cost = sum(app['monthly_cost'] for app in inventory)
+        self.total_licenses = sum(app['total_licenses'] for app in inventory)
+        self.departments = {}
+        for user in users:
+            department = user.get('department') or 'No Department'
+            self.departments[department] = self.departments.get(department, 0) + 1
+
+
+def _section_key(name, versions):
+    depends_on = SECTIONS[name][1]
+    return f'chat-context:{name}:' + ':'.join(f'{v}{versions[v]}' for v in depends_on)
+
+
+_last = {'keys': None, 'context': None}
+
+
+def get_chat_context():
+    """Returns the current chatbot context, rebuilding only the stale sections."""
+    global _last
+    names = sorted({v for _, depends_on in SECTIONS.values() for v in depends_on})
+    versions = get_versions(names)
+    keys = {name: _section_key(name, versions) for name in SECTIONS}
+
+    shared = cache_is_shared()
+    snapshot = _last
+    if shared and snapshot['keys'] == keys:
+        return snapshot['context']
+
+    cached = cache.get_many(list(keys.values()))
+    sections = {}
+    fresh = {}
+    for name, key in keys.items():
+        if key in cached:
+            sections[name] = cached[key]
+        else:
+            sections[name] = fresh[key] = SECTIONS[name][0]()
+    if fresh:
+        cache.set_many(fresh, timeout=SECTION_TIMEOUT if shared else LOCAL_SECTION_TIMEOUT)
+
+    context = ChatContext(**sections)
+    if shared:
+        # Swapped in as one object so concurrent readers never see a mixed pair
+        _last = {'keys': keys, 'context': context}
+    return context
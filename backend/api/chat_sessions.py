@@ -0,0 +1,144 @@
+"""
+Server-side conversation sessions for the license chatbot.
+
+The first turn of a session sends the full prompt, like the stateless
+chatbot. In the chat history of later turns it is replaced by a compact
+context: the totals, request statistics and department breakdown under
+CONTEXT_TOKEN_BUDGET tokens, plus the first question. Follow-up turns send
+only their question and the records relevant to it, and are kept in the
+history as just the question and the answer. The history is bounded by
+MAX_TURNS and HISTORY_TOKEN_BUDGET, dropping the oldest turns first, so the
+input billed per turn stays well below a full prompt.
+
+Sessions are stored in Django's cache with an idle TTL, so with Redis any
+worker can continue a conversation. With the per-process LocMem cache each
+worker has its own sessions, and a follow-up that reaches another worker
+starts a new one. Either way the cache evicts the least recently used
+sessions when it is full. Turns of one session are expected one at a time
+(the chatbot waits for each answer); if two overlap, the last one saved wins.
+"""
+import threading
+import uuid
+
+from django.core.cache import cache
+
+from .prompt_encoder import count_tokens
+
+IDLE_TTL_SECONDS = 30 * 60
+MAX_TURNS = 6
+HISTORY_TOKEN_BUDGET = 1200
+CONTEXT_TOKEN_BUDGET = 400
+
+
+def _key(session_id):
+    return f'chat-session:{session_id}'
+
+
+class ChatSession:
+    def __init__(self, user_id, scope, id=None):
+        self.id = id or uuid.uuid4().hex
+        self.user_id = user_id
+        self.scope = scope
+        # The first turn, with the compact data context in place of its prompt
+        self.first_question = None
+        self.context = None
+        self.first_answer = None
+        # Digest of the data behind the compact context (see license_agent.summary_digest)
+        self.summary = None
+        # (question, answer) of the follow-up turns
+        self.turns = []
+        self.turn_count = 0
+
+    @property
+    def started(self):
+        return self.first_answer is not None
+
+    def chat_history(self):
+        history = []
+        for message, answer in ([(self.context, self.first_answer)] if self.started else []) + self.turns:
+            history.append({'role': 'USER', 'message': message})
+            history.append({'role': 'CHATBOT', 'message': answer})
+        return history
+
+    def set_context(self, question, context, summary):
+        self.first_question = question
+        self.context = context
+        self.summary = summary
+
+    def record_turn(self, question, answer):
+        if not self.started:
+            self.first_answer = answer
+        else:
+            self.turns.append((question, answer))
+            tokens = [count_tokens(q) + count_tokens(a) for q, a in self.turns]
+            while len(self.turns) > MAX_TURNS or (len(self.turns) > 1 and sum(tokens) > HISTORY_TOKEN_BUDGET):
+                self.turns.pop(0)
+                tokens.pop(0)
+        self.turn_count += 1
+
+    def to_state(self):
+        return {
+            'user_id': self.user_id,
+            'scope': self.scope,
+            'first_question': self.first_question,
+            'context': self.context,
+            'first_answer': self.first_answer,
+            'summary': self.summary,
+            'turns': self.turns,
+            'turn_count': self.turn_count,
+        }
+
+    @classmethod
+    def from_state(cls, session_id, state):
+        session = cls(state['user_id'], state['scope'], id=session_id)
+        session.first_question = state['first_question']
+        session.context = state['context']
+        session.first_answer = state['first_answer']
+        session.summary = state['summary']
+        session.turns = [tuple(turn) for turn in state['turns']]
+        session.turn_count = state['turn_count']
+        return session
+
+
+class SessionStore:
+    """Sessions in the Django cache, expiring after IDLE_TTL_SECONDS without a turn."""
+
+    def __init__(self, ttl=IDLE_TTL_SECONDS):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._counters = {'created': 0, 'resumed': 0, 'not_found': 0, 'saved': 0}
+
+    def _incr(self, name):
+        with self._lock:
+            self._counters[name] += 1
+
+    def create(self, user_id, scope):
+        """A new session; it is stored once its first turn is saved."""
+        self._incr('created')
+        return ChatSession(user_id, scope)
+
+    def get(self, session_id, user_id, scope):
+        """
+        Returns the caller's session, or None if it expired, was evicted, is
+        held by another worker's LocMem cache, or belongs to someone else or
+        to the caller's previous role/department.
+        """
+        state = cache.get(_key(session_id))
+        if state is None:
+            self._incr('not_found')
+            return None
+        if state['user_id'] != user_id or tuple(state['scope']) != tuple(scope):
+            return None
+        self._incr('resumed')
+        return ChatSession.from_state(session_id, state)
+
+    def save(self, session):
+        cache.set(_key(session.id), session.to_state(), timeout=self.ttl)
+        self._incr('saved')
+
+    def stats(self):
+        with self._lock:
+            return {**self._counters, 'idle_ttl_seconds': self.ttl}
+
+
+session_store = SessionStore()
@@ -0,0 +1,94 @@
+"""
+Streaming chatbot endpoint (Server-Sent Events) for ASGI servers.
+
+The view is async: the question's prompt is built in a worker thread (it
+reads the cached context and the retrieval index), then the answer is
+streamed from the LLM with the shared async client while the event loop
+serves other conversations. Events are `token` ({"text": ...}) for each
+chunk, then `done` ({"cached": bool, "session_id": ..., "turn": n}), or
+`error` ({"error": ...}). Like the sync chatbot, a question posted with the
+`session_id` of an earlier answer continues that conversation (see
+api/chat_sessions.py).
+
+Serve it with an ASGI server, e.g.
+`gunicorn saas_project.asgi:application -k uvicorn.workers.UvicornWorker`.
+"""
+import json
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse, StreamingHttpResponse
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_POST
+from rest_framework.exceptions import AuthenticationFailed
+
+from . import llm
+from .answer_cache import answer_cache, scope_for_user
+from .authentication import ClaimsJWTAuthentication
+from .chat_sessions import session_store
+from .license_agent import finish_session_turn, prepare_session_turn
+
+
+def _sse(event, data):
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+
+def _authenticate(request):
+    try:
+        result = ClaimsJWTAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return None
+    return result[0] if result else None
+
+
+def _prepare(question, user, session_id):
+    """Returns (session, cached answer or None, prompt, chat history, cache key)."""
+    scope = scope_for_user(user)
+    session = session_store.get(str(session_id), user.pk, scope) if session_id else None
+    if session is None:
+        session = session_store.create(user.pk, scope)
+    prompt, chat_history, key = prepare_session_turn(question, session)
+    cached = answer_cache.get(key) if key is not None else None
+    if cached is not None:
+        finish_session_turn(session, question, cached)
+    return session, cached, prompt, chat_history, key
+
+
+@csrf_exempt
+@require_POST
+async def license_chatbot_stream(request):
+    user = await sync_to_async(_authenticate)(request)
+    if user is None:
+        return JsonResponse({'detail': 'Authentication credentials were not provided or are invalid.'}, status=401)
+
+    try:
+        body = json.loads(request.body or b'{}')
+        question = str(body.get('question') or '').strip()
+        session_id = body.get('session_id')
+    except (ValueError, AttributeError):
+        question, session_id = '', None
+    if not question:
+        return JsonResponse({'error': 'Question is required'}, status=400)
+
+    session, cached, prompt, chat_history, key = await sync_to_async(_prepare)(question, user, session_id)
+
+    async def events():
+        if cached is not None:
+            yield _sse('token', {'text': cached})
+            yield _sse('done', {'cached': True, 'session_id': session.id, 'turn': session.turn_count})
+            return
+        parts = []
+        try:
+            async for text in llm.astream_chat(prompt, chat_history=chat_history):
+                parts.append(text)
+                yield _sse('token', {'text': text})
+        except llm.LLMError as e:
+            yield _sse('error', {'error': str(e)})
+            return
+        await sync_to_async(finish_session_turn)(session, question, ''.join(parts), key)
+        yield _sse('done', {'cached': False, 'session_id': session.id, 'turn': session.turn_count})
+
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Stop proxies (e.g. nginx) from buffering the stream
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,63 @@
+"""
+Conditional GET for the read endpoints the frontend polls.
+
+Each endpoint declares the data versions (see api/versions.py) its payload
+depends on. The ETag is a hash of those versions, the request URL and the
+user, so checking If-None-Match costs one cache read, and a 304 is sent
+before the view runs any query of its own. A new version is taken by the
+signal handlers in api/signals.py whenever the underlying rows change.
+
+Validators are only sent when the cache is shared between processes (see
+versions.cache_is_shared): with a per-process cache, a change made by
+another worker, the lease reaper or a management command wouldn't move the
+versions this worker sees, and it would keep answering 304 with stale data.
+"""
+import hashlib
+from functools import wraps
+
+from django.utils import timezone
+from django.utils.http import parse_etags
+from rest_framework import status
+from rest_framework.response import Response
+
+from .versions import cache_is_shared, get_versions
+
+
+def compute_etag(request, resources, daily=False):
+    """
+    Returns a strong ETag for this request and the current versions of
+    `resources`. `daily` also ties it to today's date, for payloads like
+    renewal buckets that change as time passes.
+    """
+    versions = get_versions(resources)
+    parts = [request.get_full_path(), str(request.user.pk)]
+    parts += [f'{name}={versions[name]}' for name in resources]
+    if daily:
+        parts.append(timezone.localdate().isoformat())
+    return '"%s"' % hashlib.sha256('|'.join(parts).encode()).hexdigest()[:40]
+
+
+def conditional_get(*resources, daily=False):
+    """
+    Decorates an APIView get() so it answers a matching If-None-Match with
+    304 Not Modified and tags every 200 response with its ETag.
+    """
+    def decorator(method):
+        @wraps(method)
+        def wrapper(self, request, *args, **kwargs):
+            if not cache_is_shared():
+                return method(self, request, *args, **kwargs)
+            etag = compute_etag(request, resources, daily=daily)
+            if_none_match = parse_etags(request.headers.get('If-None-Match', ''))
+            if etag in if_none_match or '*' in if_none_match:
+                response = Response(status=status.HTTP_304_NOT_MODIFIED)
+            else:
+                response = method(self, request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+            response['ETag'] = etag
+            # Let browsers keep the payload but always revalidate it
+            response['Cache-Control'] = 'private, no-cache'
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,172 @@
+"""
+The UserLicense entitlement table, projected from approved license requests.
+
+An approved GRANT gives its user the software and an approved REVOKE takes
+it away, and each held license takes one of the software's seats.
+apply_approved_request() applies one event as it is approved, and
+withdraw_approval() undoes one when an approved request is rejected or
+deleted, and rebuild_entitlements() replays every approved request from
+scratch. The
+department rollups follow the UserLicense rows through their save/delete
+signals (see api/signals.py).
+"""
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from . import budgets
+from .models import LicenseLease, LicenseRequest, SaaSApplication, UserLicense
+from .versions import bump_version_on_commit
+
+
+class SeatCapacityError(Exception):
+    """Raised when a GRANT would allocate more seats than the software has."""
+
+    def __init__(self, software_id):
+        self.software_id = software_id
+        super().__init__(f'No seats left for software {software_id}.')
+
+
+def reserve_seat(software_id):
+    """
+    Takes one seat with a single conditional UPDATE, so concurrent approvals
+    can't over-allocate and only the software's row is locked.
+    Raises SeatCapacityError if every seat is taken.
+    """
+    reserved = SaaSApplication.objects.filter(
+        pk=software_id,
+        allocated_licenses__lt=F('total_licenses')
+    ).update(allocated_licenses=F('allocated_licenses') + 1)
+    if not reserved:
+        raise SeatCapacityError(software_id)
+    bump_version_on_commit('seats')
+
+
+def release_seat(software_id):
+    """Gives one seat back (called when a UserLicense is deleted)."""
+    SaaSApplication.objects.filter(
+        pk=software_id,
+        allocated_licenses__gt=0
+    ).update(allocated_licenses=F('allocated_licenses') - 1)
+    bump_version_on_commit('seats')
+
+
+def apply_approved_request(license_request):
+    """
+    Applies one approved GRANT or REVOKE to the entitlement table.
+    Raises SeatCapacityError if a GRANT needs a seat and none are left, or
+    BudgetExceededError if it would push a HOLD department over budget; run
+    it inside the approval's transaction so the approval is rolled back too.
+    """
+    if license_request.request_type == LicenseRequest.RequestType.GRANT:
+        already_held = UserLicense.objects.filter(
+            user_id=license_request.user_id,
+            software_id=license_request.software_id
+        ).exists()
+        if already_held:
+            return
+        with transaction.atomic():
+            budgets.check_approval(license_request)
+            reserve_seat(license_request.software_id)
+            UserLicense.objects.create(
+                user_id=license_request.user_id,
+                software_id=license_request.software_id,
+                granted_by_request_id=license_request.pk
+            )
+    elif license_request.request_type == LicenseRequest.RequestType.REVOKE:
+        UserLicense.objects.filter(
+            user_id=license_request.user_id,
+            software_id=license_request.software_id
+        ).delete()
+
+
+def withdraw_approval(user_id, software_id):
+    """
+    Brings the user's license for the software back in line with their
+    approved requests, after one of them stopped being approved (rejected or
+    deleted after approval). Deleting the UserLicense gives its seat back and
+    updates the rollup through the delete signals. Withdrawing a REVOKE
+    reinstates the license, taking a seat again; raises SeatCapacityError if
+    none are left.
+    """
+    holder = None
+    events = LicenseRequest.objects.filter(
+        status=LicenseRequest.RequestStatus.APPROVED,
+        user_id=user_id,
+        software_id=software_id
+    ).order_by('updated_at', 'id').values_list('id', 'request_type')
+    for request_id, request_type in events:
+        if request_type == LicenseRequest.RequestType.GRANT:
+            holder = holder or request_id
+        else:
+            holder = None
+
+    held = UserLicense.objects.filter(user_id=user_id, software_id=software_id)
+    if holder is None:
+        held.delete()
+    elif not held.exists():
+        with transaction.atomic():
+            reserve_seat(software_id)
+            UserLicense.objects.create(user_id=user_id, software_id=software_id, granted_by_request_id=holder)
+
+
+def replay_entitlements():
+    """
+    Replays every approved request in the order it was approved and returns
+    the resulting {(user_id, software_id): granting request id} map.
+    """
+    holdings = {}
+    events = LicenseRequest.objects.filter(
+        status=LicenseRequest.RequestStatus.APPROVED
+    ).order_by('updated_at', 'id').values_list('id', 'request_type', 'user_id', 'software_id')
+
+    for request_id, request_type, user_id, software_id in events.iterator(chunk_size=2000):
+        if request_type == LicenseRequest.RequestType.GRANT:
+            holdings.setdefault((user_id, software_id), request_id)
+        else:
+            holdings.pop((user_id, software_id), None)
+    return holdings
+
+
+def rebuild_entitlements(dry_run=False):
+    """
+    Rebuilds the entitlement table from the approved requests.
+    Returns (missing, extra): the (user_id, software_id) pairs that had to be
+    added and removed. The caller should rebuild the department rollups too.
+    """
+    live = replay_entitlements()
+
+    with transaction.atomic():
+        stored = {
+            (user_id, software_id): pk
+            for pk, user_id, software_id in UserLicense.objects.select_for_update().values_list(
+                'pk', 'user_id', 'software_id'
+            )
+        }
+        missing = sorted(set(live) - set(stored))
+        extra = sorted(set(stored) - set(live))
+
+        if not dry_run:
+            # bulk_create skips the rollup signals; the caller rebuilds the rollups afterwards
+            UserLicense.objects.filter(pk__in=[stored[pair] for pair in extra]).delete()
+            UserLicense.objects.bulk_create(
+                UserLicense(user_id=user_id, software_id=software_id, granted_by_request_id=live[(user_id, software_id)])
+                for user_id, software_id in missing
+            )
+            # Recount every software's seats from the rebuilt table and its open floating leases
+            held = UserLicense.objects.filter(software=OuterRef('pk')).order_by().values('software').annotate(
+                n=Count('id')
+            ).values('n')
+            leased = LicenseLease.objects.filter(
+                software=OuterRef('pk'), released_at__isnull=True
+            ).order_by().values('software').annotate(n=Count('id')).values('n')
+            SaaSApplication.objects.update(
+                allocated_licenses=(
+                    Coalesce(Subquery(held, output_field=IntegerField()), 0)
+                    + Coalesce(Subquery(leased, output_field=IntegerField()), 0)
+                )
+            )
+            bump_version_on_commit('seats')
+            bump_version_on_commit('rollups')
+
+    return missing, extra
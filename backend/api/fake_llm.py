@@ -0,0 +1,140 @@
+"""
+A local stand-in for the Cohere chat API, for load tests and offline runs.
+
+It speaks just enough HTTP/1.1 (with keep-alive) to answer POST /v1/chat,
+streaming or not, with a made-up answer to the question in the prompt.
+Latency, the delay between streamed tokens and an error rate can be set so
+clients can be exercised against slow or failing providers. Point the app at
+it with CO_API_URL=http://127.0.0.1:<port> and any CO_API_KEY.
+"""
+import asyncio
+import json
+import random
+
+QUESTION_MARKER = 'USER QUESTION:'
+
+
+def fake_answer(message):
+    """A deterministic answer that quotes the question found in the prompt."""
+    question = message
+    if QUESTION_MARKER in message:
+        question = message.split(QUESTION_MARKER, 1)[1]
+    question = (question.strip().splitlines() or [''])[0]
+    return f'This is a simulated answer to "{question.strip()[:200]}" based on the license data provided.'
+
+
+class FakeLLMServer:
+    def __init__(self, host='127.0.0.1', port=0, token_delay=0.05, latency=0.0, error_rate=0.0, seed=None):
+        self.host = host
+        self.port = port
+        self.token_delay = token_delay
+        self.latency = latency
+        self.error_rate = error_rate
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._server = None
+        self._writers = set()
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    @property
+    def url(self):
+        return f'http://{self.host}:{self.port}'
+
+    async def serve_forever(self):
+        if self._server is None:
+            await self.start()
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        self._server.close()
+        # wait_closed() also waits for clients' idle keep-alive connections (Python 3.12+)
+        for writer in list(self._writers):
+            writer.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        self._writers.add(writer)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+                await self._respond(request_line.decode('latin-1').split(), body, writer)
+                if headers.get('connection', '').lower() == 'close':
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _respond(self, request_line, body, writer):
+        self.requests += 1
+        if request_line[:2] != ['POST', '/v1/chat']:
+            return await self._send_json(writer, 404, {'message': 'Not found'})
+
+        payload = json.loads(body or b'{}')
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.error_rate and self._random.random() < self.error_rate:
+            return await self._send_json(writer, 503, {'message': 'Simulated provider outage'})
+
+        message = payload.get('message', '')
+        answer = fake_answer(message)
+        tokens = [word + ' ' for word in answer.split(' ')]
+        history = ''.join(turn.get('message', '') for turn in payload.get('chat_history') or ())
+        billed = {'input_tokens': (len(message) + len(history)) // 4 + 1, 'output_tokens': len(tokens)}
+
+        if not payload.get('stream'):
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay * len(tokens))
+            return await self._send_json(writer, 200, {
+                'text': answer,
+                'finish_reason': 'COMPLETE',
+                'meta': {'billed_units': billed},
+            })
+
+        writer.write(
+            b'HTTP/1.1 200 OK\r\nContent-Type: application/stream+json\r\n'
+            b'Transfer-Encoding: chunked\r\n\r\n'
+        )
+        await self._send_chunk(writer, {'is_finished': False, 'event_type': 'stream-start'})
+        for token in tokens:
+            if self.token_delay:
+                await asyncio.sleep(self.token_delay)
+            await self._send_chunk(writer, {'is_finished': False, 'event_type': 'text-generation', 'text': token})
+        await self._send_chunk(writer, {
+            'is_finished': True,
+            'event_type': 'stream-end',
+            'finish_reason': 'COMPLETE',
+            'response': {'text': answer, 'meta': {'billed_units': billed}},
+        })
+        writer.write(b'0\r\n\r\n')
+        await writer.drain()
+
+    async def _send_chunk(self, writer, event):
+        data = json.dumps(event).encode() + b'\n'
+        writer.write(f'{len(data):x}\r\n'.encode() + data + b'\r\n')
+        await writer.drain()
+
+    async def _send_json(self, writer, status_code, data):
+        body = json.dumps(data).encode()
+        reason = {200: 'OK', 404: 'Not Found', 503: 'Service Unavailable'}.get(status_code, 'Error')
+        writer.write(
+            f'HTTP/1.1 {status_code} {reason}\r\nContent-Type: application/json\r\n'
+            f'Content-Length: {len(body)}\r\n\r\n'.encode() + body
+        )
+        await writer.drain()
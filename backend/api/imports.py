@@ -0,0 +1,137 @@
+"""
+Bulk import of license requests from CSV or JSON.
+
+Each row has `user` (id or username), `software_name`, `request_type`
+(GRANT or REVOKE, defaults to GRANT) and an optional `reason`. All the
+software names in the file are resolved from the catalog cache and all the users
+with one in_bulk per key type, then the valid rows are inserted with
+bulk_create in chunks. Rejected rows are collected for the error report.
+"""
+import csv
+import io
+import json
+
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from . import budgets
+from .catalog import get_catalog
+from .models import LicenseRequest, normalize_software_name
+from .versions import bump_version_on_commit
+
+CHUNK_SIZE = 500
+REQUIRED_COLUMNS = ('user', 'software_name')
+
+
+class ImportFileError(ValueError):
+    pass
+
+
+def parse_rows(stream, file_format):
+    """
+    Returns the rows of a CSV or JSON file as a list of dicts.
+    `stream` is a binary file object. Raises ImportFileError if it can't be read.
+    """
+    try:
+        text = io.TextIOWrapper(stream, encoding='utf-8-sig')
+        if file_format == 'csv':
+            rows = list(csv.DictReader(text))
+        else:
+            rows = json.load(text)
+    except (UnicodeDecodeError, csv.Error, json.JSONDecodeError) as e:
+        raise ImportFileError(f'Could not read the {file_format.upper()} file: {e}')
+
+    if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+        raise ImportFileError('The file must contain a list of rows.')
+    return rows
+
+
+def _resolve_users(rows):
+    """Looks every user in the file up with one in_bulk per key type."""
+    ids = set()
+    usernames = set()
+    for row in rows:
+        value = str(row.get('user') or '').strip()
+        if value.isdigit():
+            ids.add(int(value))
+        elif value:
+            usernames.add(value)
+
+    by_id = User.objects.in_bulk(ids) if ids else {}
+    by_username = User.objects.in_bulk(usernames, field_name='username') if usernames else {}
+    return by_id, by_username
+
+
+def _resolve_software(rows):
+    """
+    Resolves every software name in the file against the in-memory catalog
+    (see api/catalog.py), case-insensitively.
+    """
+    by_name = get_catalog()['by_name']
+    return {
+        name: by_name[name]
+        for name in (normalize_software_name(str(row.get('software_name') or '')) for row in rows)
+        if name in by_name
+    }
+
+
+def import_license_requests(rows, requested_by, approval_level='ADMIN', chunk_size=CHUNK_SIZE):
+    """
+    Validates and inserts the rows. Returns (created_count, errors) where
+    errors is a list of {'row', 'errors', 'data'} for the rejected rows
+    (row numbers start at 1).
+    """
+    users_by_id, users_by_username = _resolve_users(rows)
+    software_by_name = _resolve_software(rows)
+
+    valid = []
+    errors = []
+    for number, row in enumerate(rows, start=1):
+        row_errors = []
+        for column in REQUIRED_COLUMNS:
+            if not str(row.get(column) or '').strip():
+                row_errors.append(f"'{column}' is required.")
+
+        user_value = str(row.get('user') or '').strip()
+        user = users_by_id.get(int(user_value)) if user_value.isdigit() else users_by_username.get(user_value)
+        if user_value and not user:
+            row_errors.append(f"User '{user_value}' not found.")
+
+        software_name = str(row.get('software_name') or '').strip()
+        software_id = software_by_name.get(normalize_software_name(software_name))
+        if software_name and not software_id:
+            row_errors.append(f"Software '{software_name}' not found in the inventory.")
+
+        request_type = str(row.get('request_type') or LicenseRequest.RequestType.GRANT).strip().upper()
+        if request_type not in LicenseRequest.RequestType.values:
+            row_errors.append('request_type must be GRANT or REVOKE.')
+
+        if row_errors:
+            errors.append({'row': number, 'errors': row_errors, 'data': row})
+            continue
+
+        valid.append(LicenseRequest(
+            request_type=request_type,
+            user=user,
+            software_id=software_id,
+            requested_by=requested_by,
+            approval_level=approval_level,
+            reason=str(row.get('reason') or '').strip(),
+        ))
+
+    budgets.flag_requests(valid)
+
+    with transaction.atomic():
+        for start in range(0, len(valid), chunk_size):
+            LicenseRequest.objects.bulk_create(valid[start:start + chunk_size])
+        if valid:
+            bump_version_on_commit('license-requests')
+
+    return len(valid), errors
+
+
+def stream_error_report(errors, summary):
+    """Yields the rejected rows as NDJSON, followed by a summary line."""
+    for error in errors:
+        yield json.dumps(error, default=str) + '\n'
+    yield json.dumps({'summary': summary}) + '\n'
@@ -0,0 +1,71 @@
+"""
+Set-based summaries of the software inventory.
+
+Shared by InventoryStatsView and the AI agent so both read the catalog the
+same way: totals and renewal buckets come from one aggregate query, and row
+listings come from values() projections instead of model instances.
+"""
+from datetime import timedelta
+
+from django.db.models import Count, F, Q, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import SaaSApplication
+
+
+def summarize_inventory(today=None):
+    """
+    Returns the inventory totals and renewal buckets in a single SQL pass.
+    The buckets don't overlap: a software renewing in 45 days is only
+    counted in `within_31_60_days`.
+    """
+    today = today or timezone.localdate()
+    in_30 = today + timedelta(days=30)
+    in_60 = today + timedelta(days=60)
+    in_90 = today + timedelta(days=90)
+
+    return SaaSApplication.objects.aggregate(
+        total_software=Count('id'),
+        active_licenses=Coalesce(Sum('total_licenses'), Value(0)),
+        allocated_licenses=Coalesce(Sum('allocated_licenses'), Value(0)),
+        expired=Count('id', filter=Q(renewal_date__lt=today)),
+        within_30_days=Count('id', filter=Q(renewal_date__gte=today, renewal_date__lte=in_30)),
+        within_31_60_days=Count('id', filter=Q(renewal_date__gt=in_30, renewal_date__lte=in_60)),
+        within_61_90_days=Count('id', filter=Q(renewal_date__gt=in_60, renewal_date__lte=in_90)),
+    )
+
+
+def software_list():
+    """Rows for the Inventory page charts, read without building model instances."""
+    rows = SaaSApplication.objects.order_by('id').values(
+        'name', 'vendor', 'category', 'total_licenses', 'allocated_licenses', 'monthly_cost', 'renewal_date'
+    )
+    return [
+        {
+            **row,
+            'seats_available': max(row['total_licenses'] - row['allocated_licenses'], 0),
+            'monthly_cost': str(row['monthly_cost']),
+            'renewal_date': str(row['renewal_date']),
+        }
+        for row in rows
+    ]
+
+
+def software_inventory():
+    """Rows for the AI agent, in the shape its prompts expect."""
+    rows = SaaSApplication.objects.order_by('id').values(
+        'vendor', 'category', 'total_licenses', 'monthly_cost', 'renewal_date',
+        software_name=F('name'),
+    )
+    return [
+        {
+            'software_name': row['software_name'],
+            'vendor': row['vendor'],
+            'category': row['category'],
+            'total_licenses': row['total_licenses'],
+            'monthly_cost': float(row['monthly_cost']),
+            'renewal_date': str(row['renewal_date']),
+        }
+        for row in rows
+    ]
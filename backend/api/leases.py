@@ -0,0 +1,204 @@
+"""
+Floating (concurrent) licenses, shared through expiring leases.
+
+A FLOATING software's total_licenses is a pool. A user checks out a lease
+with a TTL, keeps it alive with heartbeats and releases it when done. Each
+open lease holds one seat on the same allocated_licenses counter as named
+grants, so checkout and release are a conditional UPDATE on the counter plus
+a single-row insert/update on the lease: no scans, and only the software's
+row is locked for the length of that UPDATE.
+
+Leases whose holder stopped sending heartbeats are reclaimed by LeaseReaper,
+which keeps the next deadlines in a min-heap fed from the partial
+(expires_at) index on open leases, so it only ever reads leases that are
+about to expire. checkout() also reclaims expired leases of the software it
+is asked for before refusing, so a stopped reaper delays cleanup but never
+locks users out of the pool.
+"""
+import heapq
+import time
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .entitlements import SeatCapacityError, release_seat, reserve_seat
+from .models import LicenseLease, SaaSApplication
+
+DEFAULT_TTL = timedelta(minutes=15)
+MIN_TTL = timedelta(minutes=1)
+MAX_TTL = timedelta(hours=8)
+
+
+class LeaseError(Exception):
+    """Raised when a lease can't be checked out, renewed or released."""
+
+
+def _ttl(ttl_seconds):
+    if ttl_seconds is None:
+        return DEFAULT_TTL
+    # Clamped as a number first: timedelta overflows on huge values
+    seconds = min(max(int(ttl_seconds), MIN_TTL.total_seconds()), MAX_TTL.total_seconds())
+    return timedelta(seconds=seconds)
+
+
+def _open_leases():
+    return LicenseLease.objects.filter(released_at__isnull=True)
+
+
+def _close(lease_filter, reason, now):
+    """
+    Closes the open leases matching `lease_filter` and gives their seats
+    back. The released_at IS NULL guard makes this idempotent, so a lease
+    closed by both its holder and the reaper only releases one seat.
+    Returns the number of leases closed.
+    """
+    closed = 0
+    with transaction.atomic():
+        rows = list(_open_leases().filter(lease_filter).values_list('pk', 'software_id'))
+        for pk, software_id in rows:
+            if _open_leases().filter(pk=pk).update(released_at=now, release_reason=reason):
+                release_seat(software_id)
+                closed += 1
+    return closed
+
+
+def reclaim_expired(software_id=None, now=None, limit=100):
+    """
+    Reclaims up to `limit` expired leases (of one software, or of all), oldest
+    deadline first. Reads through the open-lease expiry index.
+    """
+    now = now or timezone.now()
+    expired = _open_leases().filter(expires_at__lte=now)
+    if software_id is not None:
+        expired = expired.filter(software_id=software_id)
+    pks = list(expired.order_by('expires_at').values_list('pk', flat=True)[:limit])
+    if not pks:
+        return 0
+    # Re-checks the deadline so a lease renewed in the meantime is kept
+    return _close(Q(pk__in=pks, expires_at__lte=now), LicenseLease.ReleaseReason.EXPIRED, now)
+
+
+def checkout(user, software_id, ttl_seconds=None):
+    """
+    Checks out a seat of a FLOATING software for `user` and returns the lease.
+    If the user already holds an open lease on it, that lease is renewed and
+    returned instead of taking a second seat.
+    Raises SeatCapacityError if the pool is full, or LeaseError if the
+    software doesn't exist or isn't floating.
+    """
+    mode = SaaSApplication.objects.filter(pk=software_id).values_list('license_mode', flat=True).first()
+    if mode is None:
+        raise LeaseError('Software not found.')
+    if mode != SaaSApplication.LicenseMode.FLOATING:
+        raise LeaseError('This software is not licensed as floating seats.')
+
+    ttl = _ttl(ttl_seconds)
+    now = timezone.now()
+
+    existing = _open_leases().filter(user=user, software_id=software_id).first()
+    if existing is not None:
+        if existing.expires_at > now:
+            return renew(existing.token, user, ttl_seconds)
+        # The user's own lease lapsed; close it so the new one can open
+        _close(Q(pk=existing.pk), LicenseLease.ReleaseReason.EXPIRED, now)
+
+    try:
+        with transaction.atomic():
+            try:
+                reserve_seat(software_id)
+            except SeatCapacityError:
+                # The pool may only be held by lapsed leases; reclaim a few and retry once
+                if not reclaim_expired(software_id, now=now, limit=10):
+                    raise
+                reserve_seat(software_id)
+            return LicenseLease.objects.create(
+                software_id=software_id,
+                user=user,
+                expires_at=now + ttl
+            )
+    except IntegrityError:
+        # A concurrent checkout by the same user won; its seat reservation
+        # was rolled back with ours, so just hand back the winner's lease
+        lease = _open_leases().filter(user=user, software_id=software_id).first()
+        if lease is None:
+            raise
+        return lease
+
+
+def renew(token, user, ttl_seconds=None):
+    """
+    Heartbeat: pushes an open lease's deadline out by its TTL with one
+    conditional UPDATE. Raises LeaseError if the lease is unknown, not the
+    user's, already released or already expired (the client must check out again).
+    """
+    now = timezone.now()
+    renewed = _open_leases().filter(token=token, user=user, expires_at__gt=now).update(
+        expires_at=now + _ttl(ttl_seconds)
+    )
+    if not renewed:
+        raise LeaseError('Lease not found or already expired.')
+    return LicenseLease.objects.get(token=token)
+
+
+def release(token, user):
+    """Releases an open lease and gives its seat back. Releasing twice is a no-op."""
+    if not LicenseLease.objects.filter(token=token, user=user).exists():
+        raise LeaseError('Lease not found.')
+    _close(Q(token=token, user=user), LicenseLease.ReleaseReason.RELEASED, timezone.now())
+
+
+class LeaseReaper:
+    """
+    Reclaims expired leases in deadline order.
+
+    The heap holds (expires_at, lease id) for the open leases due within the
+    next `horizon`, loaded in expiry order from the open-lease index. The
+    reaper sleeps until the earliest deadline, closes the leases that are
+    really due (a renewed lease fails the deadline check and is skipped, and
+    comes back on a later refill), and refills the heap every `horizon`.
+    """
+
+    def __init__(self, horizon=timedelta(seconds=30), batch_size=500):
+        self.horizon = horizon
+        self.batch_size = batch_size
+        self._heap = []
+        self._queued = set()
+        self._next_refill = None
+
+    def refill(self, now):
+        due = _open_leases().filter(expires_at__lte=now + self.horizon).order_by('expires_at')
+        for pk, expires_at in due.values_list('pk', 'expires_at')[:self.batch_size]:
+            if pk not in self._queued:
+                heapq.heappush(self._heap, (expires_at, pk))
+                self._queued.add(pk)
+        self._next_refill = now + self.horizon
+
+    def run_once(self, now=None):
+        """Refills the heap if due and reclaims every lease past its deadline. Returns the count."""
+        now = now or timezone.now()
+        if self._next_refill is None or now >= self._next_refill:
+            self.refill(now)
+
+        due = []
+        while self._heap and self._heap[0][0] <= now:
+            _, pk = heapq.heappop(self._heap)
+            self._queued.discard(pk)
+            due.append(pk)
+        if not due:
+            return 0
+        return _close(Q(pk__in=due, expires_at__lte=now), LicenseLease.ReleaseReason.EXPIRED, now)
+
+    def seconds_until_next(self, now=None):
+        """How long the reaper can sleep before it has work to do."""
+        now = now or timezone.now()
+        wake_at = self._next_refill or now
+        if self._heap:
+            wake_at = min(wake_at, self._heap[0][0])
+        return max((wake_at - now).total_seconds(), 0)
+
+    def run_forever(self, max_sleep=30):
+        while True:
+            self.run_once()
+            time.sleep(min(self.seconds_until_next(), max_sleep) or 0.1)
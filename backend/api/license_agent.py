@@ -1,12 +1,23 @@
-import os
-import cohere
-from .models import SaaSApplication, LicenseRequest
-from django.contrib.auth.models import User
-from datetime import timedelta
-from django.utils import timezone
-from django.db.models import Count, Q
+import hashlib
 
-# This file uses Cohere directly without LangChain to avoid version conflicts
+from . import llm
+from .chat_sessions import CONTEXT_TOKEN_BUDGET, session_store
+from .inventory import software_inventory
+from .chat_context import build_request_stats, build_user_rows, get_chat_context
+from .retrieval import search as search_records
+from .answer_cache import answer_cache
+from .prompt_encoder import PromptBuilder, count_tokens, format_report
+
+# This file calls the LLM through api/llm.py (Cohere by default, see LLM_PROVIDER) without LangChain
+
+# Prompt tables (see api/prompt_encoder.py): (row key, column header)
+INVENTORY_COLUMNS = [
+    ('software_name', 'software'), ('vendor', 'vendor'), ('category', 'category'),
+    ('total_licenses', 'licenses'), ('monthly_cost', 'monthly_cost'), ('renewal_date', 'renews'),
+]
+MOST_REQUESTED_COLUMNS = [('software__name', 'software'), ('count', 'grant_requests')]
+REVOKE_COLUMNS = [('software__name', 'software'), ('software__monthly_cost', 'monthly_cost'), ('count', 'revoke_requests')]
+DEPARTMENT_COLUMNS = [('department', 'department'), ('users', 'users')]
 
 def get_software_inventory() -> list[dict]:
     """
@@ -14,18 +25,7 @@ def get_software_inventory() -> list[dict]:
     Returns a list of dictionaries with software name, total licenses, monthly cost, and renewal date.
     """
     print("--- TOOL: Fetching software inventory ---")
-    applications = SaaSApplication.objects.all()
-    
-    results = []
-    for app in applications:
-        results.append({
-            "software_name": app.name,
-            "vendor": app.vendor,
-            "category": app.category,
-            "total_licenses": app.total_licenses,
-            "monthly_cost": float(app.monthly_cost),
-            "renewal_date": str(app.renewal_date)
-        })
+    results = software_inventory()
     print(f"--- TOOL: Found {len(results)} software applications ---")
     return results
 
@@ -36,33 +36,7 @@ def get_license_request_stats() -> dict:
     """
     print("--- TOOL: Analyzing license request patterns ---")
     
-    total_requests = LicenseRequest.objects.count()
-    pending = LicenseRequest.objects.filter(status='PENDING').count()
-    approved = LicenseRequest.objects.filter(status='APPROVED').count()
-    rejected = LicenseRequest.objects.filter(status='REJECTED').count()
-    
-    # Get most requested software
-    most_requested = LicenseRequest.objects.filter(
-        request_type='GRANT'
-    ).values('software__name').annotate(
-        count=Count('id')
-    ).order_by('-count')[:5]
-    
-    # Get revoke requests (potential unused licenses)
-    revoke_requests = LicenseRequest.objects.filter(
-        request_type='REVOKE'
-    ).values('software__name', 'software__monthly_cost').annotate(
-        count=Count('id')
-    )
-    
-    result = {
-        "total_requests": total_requests,
-        "pending": pending,
-        "approved": approved,
-        "rejected": rejected,
-        "most_requested_software": list(most_requested),
-        "revoke_requests": list(revoke_requests)
-    }
+    result = build_request_stats()
     
     print(f"--- TOOL: Analysis complete ---")
     return result
@@ -74,35 +48,8 @@ def get_user_data() -> list[dict]:
     Returns a list of dictionaries with user details.
     """
     print("--- TOOL: Fetching user data ---")
-    users = User.objects.all()
-    
-    results = []
-    for user in users:
-        # Get user profile data
-        profile_data = {
-            "username": user.username,
-            "email": user.email,
-            "first_name": user.first_name,
-            "last_name": user.last_name,
-            "is_active": user.is_active,
-            "is_staff": user.is_staff,
-            "is_superuser": user.is_superuser,
-        }
-        
-        # Try to get department from profile
-        try:
-            if hasattr(user, 'profile'):
-                profile_data["department"] = user.profile.department
-                profile_data["role"] = user.profile.role
-            else:
-                # Fallback: check if department is stored directly on user
-                profile_data["department"] = getattr(user, 'department', None)
-                profile_data["role"] = getattr(user, 'role', None)
-        except:
-            profile_data["department"] = None
-            profile_data["role"] = None
-        
-        results.append(profile_data)
+    # One joined query instead of a profile lookup per user
+    results = build_user_rows()
     
     print(f"--- TOOL: Found {len(results)} users ---")
     return results
@@ -113,14 +60,6 @@ def run_optimization_agent():
     """
     print("\n>>> INITIALIZING COHERE AI ANALYSIS...")
     
-    # Get the API key from environment
-    api_key = os.getenv('CO_API_KEY')
-    if not api_key:
-        return "Error: CO_API_KEY not found in environment variables"
-    
-    # Initialize Cohere client
-    co = cohere.Client(api_key)
-    
     # Gather data
     print(">>> Gathering software inventory data...")
     inventory = get_software_inventory()
@@ -132,19 +71,32 @@ def run_optimization_agent():
     total_monthly_cost = sum(app['monthly_cost'] for app in inventory)
     total_licenses = sum(app['total_licenses'] for app in inventory)
     
+    # Compact tables under a token budget instead of Python reprs of the rows
+    builder = PromptBuilder()
+    builder.text('metrics', (
+        f"- Total Monthly Cost: ${total_monthly_cost:,.2f}\n"
+        f"- Total Licenses: {total_licenses}\n"
+        f"- Total Software Applications: {len(inventory)}"
+    ))
+    builder.table('inventory', inventory, INVENTORY_COLUMNS,
+                  rank=lambda app: app['monthly_cost'], totals=('monthly_cost', 'total_licenses'), weight=3)
+    _add_request_stats(builder, request_stats)
+    
     # Build a comprehensive prompt with the data
-    prompt = f"""You are a SaaS license optimization expert analyzing an organization's software portfolio. Provide SPECIFIC, DATA-DRIVEN recommendations.
+    prompt, report = builder.build("""You are a SaaS license optimization expert analyzing an organization's software portfolio. Provide SPECIFIC, DATA-DRIVEN recommendations.
 
 CURRENT STATE:
-- Total Monthly Cost: ${total_monthly_cost:,.2f}
-- Total Licenses: {total_licenses}
-- Total Software Applications: {len(inventory)}
+{metrics}
 
-SOFTWARE INVENTORY (with costs and license counts):
+SOFTWARE INVENTORY (one row per software, most expensive first):
 {inventory}
 
 LICENSE REQUEST PATTERNS:
-{request_stats}
+Requests: {request_counts}
+Most requested software:
+{most_requested}
+Revoke requests per software:
+{revoke_requests}
 
 ANALYSIS REQUIREMENTS:
 1. **Cost Optimization Opportunities**: Identify specific software with high costs and low utilization. Provide EXACT dollar amounts for potential savings.
@@ -163,91 +115,106 @@ ANALYSIS REQUIREMENTS:
 
 6. **ROI Summary**: Calculate total potential monthly savings and annual savings.
 
-FORMAT: Use clear sections with bullet points. Include specific numbers, dollar amounts, and software names in every recommendation."""
+FORMAT: Use clear sections with bullet points. Include specific numbers, dollar amounts, and software names in every recommendation.""")
+    print(f">>> PROMPT: {format_report(report)}")
 
     print(">>> Sending data to Cohere AI for analysis...")
     
     try:
-        # Call Cohere API with command-r-08-2024 (current available model)
-        # See https://docs.cohere.com/docs/models for available models
-        response = co.chat(
-            message=prompt,
-            model='command-r-08-2024',
-            temperature=0.3
-        )
-        
+        # Retries, backoff and the model fallback are handled by the shared client
+        text = llm.chat(prompt, model=llm.DEFAULT_MODEL, temperature=0.3)
         print(">>> ANALYSIS COMPLETE.")
-        return response.text
+        return text
         
-    except Exception as e:
+    except llm.LLMError as e:
         print(f">>> ERROR: {str(e)}")
-        # If model not found, try without specifying model (uses default)
-        try:
-            print(">>> Retrying with default model...")
-            response = co.chat(
-                message=prompt,
-                temperature=0.3
-            )
-            print(">>> ANALYSIS COMPLETE.")
-            return response.text
-        except Exception as e2:
-            print(f">>> ERROR: {str(e2)}")
-            return f"Error generating recommendations: {str(e2)}"
-
-
-def chat_with_license_data(user_question: str) -> str:
+        return f"Error generating recommendations: {str(e)}"
+
+
+def _add_request_stats(builder, request_stats):
+    """Adds the request counts and the per-software request tables to a prompt."""
+    builder.text('request_counts', ', '.join(
+        f"{name.replace('_', ' ')} {request_stats[name]}"
+        for name in ('total_requests', 'pending', 'approved', 'rejected')
+    ))
+    builder.table('most_requested', request_stats['most_requested_software'], MOST_REQUESTED_COLUMNS,
+                  rank=lambda row: row['count'])
+    builder.table('revoke_requests', request_stats['revoke_requests'], REVOKE_COLUMNS,
+                  rank=lambda row: row['count'], totals=('count',))
+
+
+def summary_digest(context):
+    """A digest of the data behind the summary sections of the chatbot prompt, to tell when it changed."""
+    snapshot = (
+        context.total_monthly_cost, context.total_licenses, len(context.inventory), len(context.users),
+        context.request_stats, context.departments,
+    )
+    return hashlib.sha256(repr(snapshot).encode()).hexdigest()
+
+
+def _add_summary_sections(builder, context):
+    """Adds the totals, request statistics and department breakdown to a chatbot prompt."""
+    builder.text('metrics', (
+        f"- Total Monthly Cost: ${context.total_monthly_cost:,.2f}\n"
+        f"- Total Licenses: {context.total_licenses}\n"
+        f"- Total Software Applications: {len(context.inventory)}\n"
+        f"- Total Users: {len(context.users)}"
+    ))
+    _add_request_stats(builder, context.request_stats)
+    builder.table('departments', [
+        {'department': name, 'users': count} for name, count in context.departments.items()
+    ], DEPARTMENT_COLUMNS, rank=lambda row: row['users'], totals=('users',))
+    return SUMMARY_TEMPLATE
+
+
+SUMMARY_TEMPLATE = (
+    "CURRENT METRICS:\n{metrics}\n\n"
+    "LICENSE REQUEST STATISTICS:\nRequests: {request_counts}\n"
+    "Most requested software:\n{most_requested}\nRevoke requests per software:\n{revoke_requests}\n\n"
+    "DEPARTMENT BREAKDOWN:\n{departments}"
+)
+
+# Records sent with each follow-up question of a chatbot session (see api/chat_sessions.py)
+FOLLOWUP_RECORDS_TOKEN_BUDGET = 500
+
+
+def find_relevant_records(user_question: str, token_budget=None) -> list[str]:
     """
-    Interactive chatbot that answers questions about license data
+    The records relevant to a question, within `token_budget` tokens or half
+    of the prompt's token budget (see api/retrieval.py).
     """
-    print(f"\n>>> CHATBOT: Processing question: {user_question}")
-    
-    # Get the API key from environment
-    api_key = os.getenv('CO_API_KEY')
-    if not api_key:
-        return "Error: CO_API_KEY not found in environment variables"
-    
-    # Initialize Cohere client
-    co = cohere.Client(api_key)
-    
-    # Gather current data
-    inventory = get_software_inventory()
-    request_stats = get_license_request_stats()
-    user_data = get_user_data()
-    
-    # Calculate metrics
-    total_monthly_cost = sum(app['monthly_cost'] for app in inventory)
-    total_licenses = sum(app['total_licenses'] for app in inventory)
-    total_users = len(user_data)
-    
-    # Get department breakdown
-    departments = {}
-    for user in user_data:
-        dept = user.get('department') or 'No Department'
-        departments[dept] = departments.get(dept, 0) + 1
-    
-    # Build context-aware prompt
-    prompt = f"""You are a helpful AI assistant with access to the organization's complete SaaS license and user data. Answer the user's question based on the following comprehensive data:
+    return search_records(user_question, token_budget=token_budget or PromptBuilder().token_budget // 2)
 
-CURRENT METRICS:
-- Total Monthly Cost: ${total_monthly_cost:,.2f}
-- Total Licenses: {total_licenses}
-- Total Software Applications: {len(inventory)}
-- Total Users: {total_users}
-- Departments: {list(departments.keys())}
 
-USER DATA (with departments and roles):
-{user_data}
+def _format_records(records):
+    return "\n".join(f"- {record}" for record in records) or "- (no matching records)"
 
-SOFTWARE INVENTORY (with costs and license counts):
-{inventory}
 
-LICENSE REQUEST STATISTICS:
-{request_stats}
+def build_chat_prompt(user_question: str, relevant_records=None) -> str:
+    """
+    Builds the chatbot prompt for a question from the cached data context
+    and the records relevant to it. Shared by the sync and streaming chatbots.
+    """
+    # Cached snapshot of the data, only rebuilt after it changes (see api/chat_context.py)
+    context = get_chat_context()
+    builder = PromptBuilder()
+    summary_template = _add_summary_sections(builder, context)
+    
+    # Only the records relevant to the question go into the prompt
+    if relevant_records is None:
+        relevant_records = find_relevant_records(user_question)
+    builder.text('relevant_records', _format_records(relevant_records))
+    builder.text('question', user_question)
+    
+    # Build context-aware prompt
+    prompt, report = builder.build("""You are a helpful AI assistant with access to the organization's SaaS license and user data. Answer the user's question based on the following data:
 
-DEPARTMENT BREAKDOWN:
-{departments}
+RECORDS RELEVANT TO THE QUESTION (users, software, departments, requests and issues):
+{relevant_records}
 
-USER QUESTION: {user_question}
+""" + summary_template + """
+
+USER QUESTION: {question}
 
 Provide a clear, specific answer based on the data above. Include:
 - Relevant numbers, software names, and costs
@@ -255,27 +222,126 @@ Provide a clear, specific answer based on the data above. Include:
 - Specific lists when asked (e.g., "users in Engineering department")
 - Calculations and summaries as needed
 
-If the question asks about users, departments, or roles, use the USER DATA section. Be specific and list actual names when appropriate."""
+If the question asks about specific users, software, departments, requests or issues, use the RELEVANT RECORDS section. It only lists the best matches, so use CURRENT METRICS and DEPARTMENT BREAKDOWN for totals. Be specific and list actual names when appropriate.""")
+    print(f">>> CHATBOT: Prompt {format_report(report)}")
+    return prompt
+
 
+def chat_with_license_data(user_question: str, scope=None) -> str:
+    """
+    Interactive chatbot that answers questions about license data.
+    `scope` (see answer_cache.scope_for_user) keeps cached answers per caller visibility.
+    """
+    print(f"\n>>> CHATBOT: Processing question: {user_question}")
+    
+    # Repeat questions are answered from the cache until the data changes
+    cache_key = answer_cache.key(user_question, scope)
+    cached_answer = answer_cache.get(cache_key)
+    if cached_answer is not None:
+        print(">>> CHATBOT: Answered from cache.")
+        return cached_answer
+    
+    prompt = build_chat_prompt(user_question)
+    
     print(">>> CHATBOT: Sending to Cohere AI...")
     
     try:
-        response = co.chat(
-            message=prompt,
-            model='command-r-08-2024',
-            temperature=0.5
-        )
+        answer = llm.chat(prompt, model=llm.DEFAULT_MODEL, temperature=0.5)
         
         print(">>> CHATBOT: Response received.")
-        return response.text
+        answer_cache.put(cache_key, answer)
+        return answer
         
-    except Exception as e:
+    except llm.LLMError as e:
         print(f">>> CHATBOT ERROR: {str(e)}")
-        try:
-            response = co.chat(
-                message=prompt,
-                temperature=0.5
-            )
-            return response.text
-        except Exception as e2:
-            return f"Error: {str(e2)}"
+        return f"Error: {str(e)}"
+
+
+def build_session_context(first_question: str) -> tuple[str, str]:
+    """
+    The compact data context that stands in for a session's first prompt in
+    its chat history: the summary sections under CONTEXT_TOKEN_BUDGET tokens
+    and the first question. Returns (context, summary digest).
+    """
+    context = get_chat_context()
+    builder = PromptBuilder(token_budget=CONTEXT_TOKEN_BUDGET)
+    summary_template = _add_summary_sections(builder, context)
+    builder.text('question', first_question)
+    prompt, report = builder.build(
+        "Summary of the organization's SaaS license and user data:\n\n" + summary_template
+        + "\n\nUSER QUESTION: {question}"
+    )
+    print(f">>> CHATBOT: Session context {format_report(report)}")
+    return prompt, summary_digest(context)
+
+
+def build_followup_prompt(user_question: str, relevant_records) -> str:
+    """
+    Builds a follow-up turn for a chatbot session: the data summary is in
+    the chat history, so only the records relevant to this question go in.
+    """
+    builder = PromptBuilder()
+    builder.text('relevant_records', _format_records(relevant_records))
+    builder.text('question', user_question)
+    prompt, report = builder.build("""RECORDS RELEVANT TO THIS QUESTION (best matches only):
+{relevant_records}
+
+USER QUESTION: {question}
+
+Answer using the records above and the data summary earlier in this conversation. Be specific and list actual names when appropriate.""")
+    print(f">>> CHATBOT: Follow-up prompt {format_report(report)}")
+    return prompt
+
+
+def prepare_session_turn(user_question: str, session):
+    """
+    Returns (prompt, chat history, cache key) for the next turn of a chatbot
+    session (see api/chat_sessions.py). Only the first turn sends the full
+    prompt, and only it has a cache key, since it can share answers with the
+    stateless chatbot. The compact context in the history is rebuilt when
+    the data behind it changes.
+    """
+    print(f"\n>>> CHATBOT: Session {session.id}, turn {session.turn_count + 1}: {user_question}")
+    if not session.started:
+        session.set_context(user_question, *build_session_context(user_question))
+        return build_chat_prompt(user_question), [], answer_cache.key(user_question, session.scope)
+
+    if summary_digest(get_chat_context()) != session.summary:
+        session.set_context(session.first_question, *build_session_context(session.first_question))
+    records = find_relevant_records(user_question, token_budget=FOLLOWUP_RECORDS_TOKEN_BUDGET)
+    prompt = build_followup_prompt(user_question, records)
+    chat_history = session.chat_history()
+    history_tokens = sum(count_tokens(turn['message']) for turn in chat_history)
+    print(f">>> CHATBOT: Input {count_tokens(prompt) + history_tokens} tokens (chat history {history_tokens})")
+    return prompt, chat_history, None
+
+
+def finish_session_turn(session, user_question: str, answer: str, cache_key=None):
+    """Records a turn's answer in its session (and the answer cache, for a first turn)."""
+    if cache_key is not None:
+        answer_cache.put(cache_key, answer)
+    session.record_turn(user_question, answer)
+    session_store.save(session)
+
+
+def chat_in_session(user_question: str, session) -> str:
+    """
+    One turn of a multi-turn conversation: the first turn is answered like
+    the stateless chatbot, later ones build on the chat history.
+    """
+    prompt, chat_history, cache_key = prepare_session_turn(user_question, session)
+    if cache_key is not None:
+        answer = answer_cache.get(cache_key)
+        if answer is not None:
+            print(">>> CHATBOT: Answered from cache.")
+            finish_session_turn(session, user_question, answer)
+            return answer
+    
+    try:
+        answer = llm.chat(prompt, model=llm.DEFAULT_MODEL, temperature=0.5, chat_history=chat_history)
+    except llm.LLMError as e:
+        print(f">>> CHATBOT ERROR: {str(e)}")
+        return f"Error: {str(e)}"
+    
+    finish_session_turn(session, user_question, answer, cache_key)
+    return answer
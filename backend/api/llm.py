@@ -0,0 +1,363 @@
+"""
+HTTP client for the Cohere chat API, shared by the AI agent and the chatbots.
+
+Talks to the v1 chat endpoint directly with httpx, so the base URL can point
+at the local fake server (api/fake_llm.py) with CO_API_URL. One LLMClient
+per process holds:
+
+- a keep-alive connection pool (one sync client, plus one async client per
+  event loop) with explicit connect and read timeouts;
+- retries with jittered exponential backoff, only for errors worth retrying
+  (timeouts, connection errors, 429 and 5xx);
+- a circuit breaker that fails fast while the provider keeps failing, and
+  lets one trial call through after a cool-down;
+- latency and token metrics (see LLMClient.stats()).
+
+That client is the 'cohere' provider. The LLM_PROVIDER setting can swap it
+for an offline stub or record/replay (see api/llm_providers.py); chat() and
+astream_chat() below go through whichever provider is configured.
+"""
+import asyncio
+import json
+import os
+import random
+import threading
+import time
+import weakref
+from collections import deque
+from contextlib import aclosing
+
+import httpx
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+DEFAULT_MODEL = 'command-r-08-2024'
+CONNECT_TIMEOUT = 5.0
+# Between two received chunks, not for the whole answer
+READ_TIMEOUT = 60.0
+MAX_RETRIES = 2
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 8.0
+FAILURE_THRESHOLD = 5
+RESET_TIMEOUT = 30.0
+# A half-open trial that hasn't reported back by then counts as failed
+TRIAL_TIMEOUT = 5 * 60.0
+
+RETRYABLE_STATUS = frozenset({429, 500, 502, 503, 504})
+
+
+class LLMError(Exception):
+    """Raised when the LLM provider can't be reached or returns an error."""
+
+
+class CircuitOpenError(LLMError):
+    """Raised without calling the provider while the circuit breaker is open."""
+
+
+class _RetryableError(LLMError):
+    pass
+
+
+def api_url():
+    return os.getenv('CO_API_URL', 'https://api.cohere.com').rstrip('/')
+
+
+def _api_key():
+    api_key = os.getenv('CO_API_KEY')
+    if not api_key:
+        raise LLMError('CO_API_KEY not found in environment variables')
+    return api_key
+
+
+def _error_for(status_code, body):
+    message = f'LLM provider returned {status_code}: {body[:200].decode(errors="replace")}'
+    if status_code in RETRYABLE_STATUS:
+        return _RetryableError(message)
+    return LLMError(message)
+
+
+class CircuitBreaker:
+    """
+    Opens after `failure_threshold` consecutive failures. While open, calls
+    are refused until `reset_timeout` has passed; then one trial call is let
+    through, and its outcome closes or re-opens the circuit. A trial that
+    ends without an outcome (cancelled) is abandoned, and one that never
+    reports back re-opens the circuit after `trial_timeout`.
+    """
+
+    TRIAL = 'trial'
+
+    def __init__(self, failure_threshold=FAILURE_THRESHOLD, reset_timeout=RESET_TIMEOUT, trial_timeout=TRIAL_TIMEOUT):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.trial_timeout = trial_timeout
+        self.state = 'closed'
+        self.failures = 0
+        self._opened_at = 0.0
+        self._trial_started_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Returns False to refuse the call, TRIAL for the one call testing a half-open circuit, else True."""
+        with self._lock:
+            now = time.monotonic()
+            if self.state == 'closed':
+                return True
+            if self.state == 'half-open' and now - self._trial_started_at >= self.trial_timeout:
+                self.state = 'open'
+                self._opened_at = now
+                return False
+            if self.state == 'open' and now - self._opened_at >= self.reset_timeout:
+                self.state = 'half-open'
+                self._trial_started_at = now
+                return self.TRIAL
+            # Open, or half-open with the trial call still running
+            return False
+
+    def abandon_trial(self):
+        """The trial call ended without telling whether the provider is back: let the next call try."""
+        with self._lock:
+            if self.state == 'half-open':
+                self.state = 'open'
+                self._opened_at = time.monotonic() - self.reset_timeout
+
+    def record_success(self):
+        with self._lock:
+            self.state = 'closed'
+            self.failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == 'half-open' or self.failures >= self.failure_threshold:
+                self.state = 'open'
+                self._opened_at = time.monotonic()
+
+
+class LLMMetrics:
+    def __init__(self, window=1000):
+        self._lock = threading.Lock()
+        self._latencies = deque(maxlen=window)
+        self.counters = {
+            'calls': 0, 'successes': 0, 'failures': 0, 'retries': 0,
+            'short_circuited': 0, 'input_tokens': 0, 'output_tokens': 0,
+        }
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            self.counters[name] += amount
+
+    def record_success(self, latency, billed_units):
+        with self._lock:
+            self.counters['successes'] += 1
+            self.counters['input_tokens'] += int(billed_units.get('input_tokens') or 0)
+            self.counters['output_tokens'] += int(billed_units.get('output_tokens') or 0)
+            self._latencies.append(latency)
+
+    def snapshot(self):
+        with self._lock:
+            latencies = sorted(self._latencies)
+        percentile = lambda p: round(latencies[min(int(len(latencies) * p), len(latencies) - 1)], 3) if latencies else None
+        return {**self.counters, 'latency_p50_seconds': percentile(0.5), 'latency_p95_seconds': percentile(0.95)}
+
+
+class LLMClient:
+    name = 'cohere'
+
+    def __init__(self, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT, max_retries=MAX_RETRIES,
+                 backoff_base=BACKOFF_BASE, backoff_max=BACKOFF_MAX, breaker=None):
+        self.timeout = httpx.Timeout(read_timeout, connect=connect_timeout)
+        self.limits = httpx.Limits(max_connections=200, max_keepalive_connections=50)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = breaker or CircuitBreaker()
+        self.metrics = LLMMetrics()
+        self._client = None
+        self._client_lock = threading.Lock()
+        self._async_clients = weakref.WeakKeyDictionary()
+
+    def _sync_client(self):
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = httpx.Client(base_url=api_url(), timeout=self.timeout, limits=self.limits)
+        return self._client
+
+    def _async_client(self):
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(base_url=api_url(), timeout=self.timeout, limits=self.limits)
+            self._async_clients[loop] = client
+        return client
+
+    def _backoff(self, attempt):
+        # "Full jitter": a random wait up to the exponential cap
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _start_call(self):
+        """Returns True if this call is the circuit breaker's half-open trial."""
+        allowed = self.breaker.allow()
+        if not allowed:
+            self.metrics.incr('short_circuited')
+            raise CircuitOpenError('LLM provider is unavailable; not calling it for now.')
+        self.metrics.incr('calls')
+        return allowed == CircuitBreaker.TRIAL
+
+    def _fail(self, error):
+        self.metrics.incr('failures')
+        # Client errors (bad request, auth) don't mean the provider is down
+        if isinstance(error, _RetryableError):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        raise LLMError(str(error)) from error
+
+    def chat(self, message, model=DEFAULT_MODEL, temperature=0.3, chat_history=None):
+        """
+        Returns the full answer text. Raises LLMError (or CircuitOpenError).
+        `chat_history` is a list of earlier {'role': 'USER' or 'CHATBOT', 'message': ...} turns.
+        """
+        headers = {'Authorization': f'Bearer {_api_key()}'}
+        trial = self._start_call()
+        try:
+            return self._chat(message, model, temperature, chat_history, headers)
+        except BaseException:
+            # Outcomes are recorded before raising; this only catches a trial
+            # that ended without one (e.g. KeyboardInterrupt)
+            if trial:
+                self.breaker.abandon_trial()
+            raise
+
+    def _chat(self, message, model, temperature, chat_history, headers):
+        started = time.monotonic()
+        attempt = 0
+        while True:
+            payload = {'message': message, 'temperature': temperature}
+            if chat_history:
+                payload['chat_history'] = chat_history
+            if model:
+                payload['model'] = model
+            try:
+                response = self._sync_client().post('/v1/chat', json=payload, headers=headers)
+                if response.status_code == 200:
+                    data = response.json()
+                    self.breaker.record_success()
+                    self.metrics.record_success(time.monotonic() - started, data.get('meta', {}).get('billed_units', {}))
+                    return data.get('text', '')
+                if response.status_code == 404 and model:
+                    # Model retired or renamed: fall back to the provider's default once
+                    model = None
+                    continue
+                error = _error_for(response.status_code, response.content)
+            except httpx.HTTPError as e:
+                error = _RetryableError(f'LLM provider request failed: {e!r}')
+            except ValueError as e:
+                error = _RetryableError(f'LLM provider sent a malformed response: {e}')
+
+            if not isinstance(error, _RetryableError) or attempt >= self.max_retries:
+                self._fail(error)
+            time.sleep(self._backoff(attempt))
+            attempt += 1
+            self.metrics.incr('retries')
+
+    async def astream_chat(self, message, model=DEFAULT_MODEL, temperature=0.5, chat_history=None):
+        """
+        Yields the answer's text chunks as the provider generates them.
+        Failures before the first chunk are retried; later ones end the stream with LLMError.
+        """
+        headers = {'Authorization': f'Bearer {_api_key()}'}
+        trial = self._start_call()
+        try:
+            async with aclosing(self._astream_chat(message, model, temperature, chat_history, headers)) as chunks:
+                async for chunk in chunks:
+                    yield chunk
+        except BaseException:
+            # A cancelled request or a closed stream (client gone) leaves no outcome
+            if trial:
+                self.breaker.abandon_trial()
+            raise
+
+    async def _astream_chat(self, message, model, temperature, chat_history, headers):
+        started = time.monotonic()
+        attempt = 0
+        streamed = False
+        while True:
+            payload = {'message': message, 'model': model, 'temperature': temperature, 'stream': True}
+            if chat_history:
+                payload['chat_history'] = chat_history
+            try:
+                async with self._async_client().stream('POST', '/v1/chat', json=payload, headers=headers) as response:
+                    if response.status_code != 200:
+                        raise _error_for(response.status_code, await response.aread())
+                    async for line in response.aiter_lines():
+                        if not line.strip():
+                            continue
+                        event = json.loads(line)
+                        event_type = event.get('event_type')
+                        if event_type == 'text-generation':
+                            streamed = True
+                            yield event.get('text', '')
+                        elif event_type == 'stream-end':
+                            self.breaker.record_success()
+                            self.metrics.record_success(
+                                time.monotonic() - started,
+                                event.get('response', {}).get('meta', {}).get('billed_units', {})
+                            )
+                            return
+                raise _RetryableError('LLM stream ended without a stream-end event')
+            except httpx.HTTPError as e:
+                error = _RetryableError(f'LLM provider request failed: {e!r}')
+            except ValueError as e:
+                error = _RetryableError(f'LLM provider sent a malformed stream event: {e}')
+            except LLMError as e:
+                error = e
+
+            if streamed or not isinstance(error, _RetryableError) or attempt >= self.max_retries:
+                self._fail(error)
+            await asyncio.sleep(self._backoff(attempt))
+            attempt += 1
+            self.metrics.incr('retries')
+
+    def stats(self):
+        return {'provider': self.name, **self.metrics.snapshot(), 'circuit': self.breaker.state}
+
+    def close(self):
+        with self._client_lock:
+            if self._client is not None:
+                self._client.close()
+                self._client = None
+
+
+client = LLMClient()
+
+_provider = None
+_provider_lock = threading.Lock()
+
+
+def get_provider():
+    """This process's LLM provider, built from the LLM_* settings on first use."""
+    global _provider
+    if _provider is None:
+        with _provider_lock:
+            if _provider is None:
+                from .llm_providers import build_provider
+                _provider = build_provider()
+    return _provider
+
+
+@receiver(setting_changed)
+def reset_provider(setting, **kwargs):
+    # Lets override_settings(LLM_PROVIDER=...) take effect in tests and benchmarks
+    global _provider
+    if setting.startswith('LLM_'):
+        _provider = None
+
+
+def chat(message, model=DEFAULT_MODEL, temperature=0.3, chat_history=None):
+    return get_provider().chat(message, model=model, temperature=temperature, chat_history=chat_history)
+
+
+def astream_chat(message, model=DEFAULT_MODEL, temperature=0.5, chat_history=None):
+    return get_provider().astream_chat(message, model=model, temperature=temperature, chat_history=chat_history)
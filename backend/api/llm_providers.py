@@ -0,0 +1,172 @@
+"""
+LLM providers, chosen with the LLM_PROVIDER setting:
+
+- 'cohere' (default): the Cohere chat API through the pooled client in api/llm.py.
+- 'stub': a deterministic in-process answer with a configurable first-token
+  latency and token rate. It needs no network or API key, for load tests and CI.
+- 'record': calls Cohere and saves every response under LLM_RECORDINGS_DIR.
+- 'replay': answers from those recordings, and fails on prompts that were
+  never recorded.
+
+Every provider has chat(), astream_chat() and stats(), like llm.LLMClient.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.utils import timezone
+
+from . import llm
+from .fake_llm import fake_answer
+from .prompt_encoder import count_tokens
+
+
+class StubProvider:
+    """Answers with fake_llm.fake_answer(), paced like a real model."""
+
+    name = 'stub'
+
+    def __init__(self, latency=0.2, tokens_per_second=50.0):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.metrics = llm.LLMMetrics()
+
+    def _answer(self, message, chat_history):
+        answer = fake_answer(message)
+        tokens = [word + ' ' for word in answer.split(' ')]
+        input_tokens = count_tokens(message) + sum(count_tokens(turn['message']) for turn in chat_history or ())
+        return answer, tokens, {'input_tokens': input_tokens, 'output_tokens': len(tokens)}
+
+    def _token_delay(self):
+        return 1 / self.tokens_per_second if self.tokens_per_second else 0
+
+    def chat(self, message, model=llm.DEFAULT_MODEL, temperature=0.3, chat_history=None):
+        self.metrics.incr('calls')
+        started = time.monotonic()
+        answer, tokens, billed = self._answer(message, chat_history)
+        time.sleep(self.latency + self._token_delay() * len(tokens))
+        self.metrics.record_success(time.monotonic() - started, billed)
+        return answer
+
+    async def astream_chat(self, message, model=llm.DEFAULT_MODEL, temperature=0.5, chat_history=None):
+        self.metrics.incr('calls')
+        started = time.monotonic()
+        _, tokens, billed = self._answer(message, chat_history)
+        await asyncio.sleep(self.latency)
+        for token in tokens:
+            await asyncio.sleep(self._token_delay())
+            yield token
+        self.metrics.record_success(time.monotonic() - started, billed)
+
+    def stats(self):
+        return {
+            'provider': self.name, **self.metrics.snapshot(),
+            'latency_seconds': self.latency, 'tokens_per_second': self.tokens_per_second,
+        }
+
+
+class RecordingProvider:
+    """
+    Records the responses of `inner` to one JSON file per prompt, or replays
+    them. Files are named after a hash of the model, temperature, prompt and chat history,
+    so replay needs the same data (fixtures) the recording was made with.
+    """
+
+    def __init__(self, directory, inner=None, replay=False):
+        self.directory = Path(directory)
+        self.inner = inner
+        self.replay = replay
+        self.metrics = llm.LLMMetrics()
+
+    @property
+    def name(self):
+        return 'replay' if self.replay else 'record'
+
+    def _path(self, message, model, temperature, chat_history):
+        key = hashlib.sha256(json.dumps([model, temperature, message, chat_history or []]).encode()).hexdigest()
+        return self.directory / f'{key[:32]}.json'
+
+    def _load(self, path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)['chunks']
+        except FileNotFoundError:
+            raise llm.LLMError(
+                f'No recorded response for this prompt ({path.name}); record it first with LLM_PROVIDER=record.'
+            )
+
+    def _save(self, path, message, model, temperature, chunks):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        recording = {
+            'model': model,
+            'temperature': temperature,
+            'prompt': message,
+            'chunks': chunks,
+            'recorded_at': timezone.now().isoformat(),
+        }
+        # Written to a temporary file first so a crash never leaves half a recording
+        temporary = path.with_suffix('.tmp')
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump(recording, f, indent=2)
+        os.replace(temporary, path)
+
+    def chat(self, message, model=llm.DEFAULT_MODEL, temperature=0.3, chat_history=None):
+        self.metrics.incr('calls')
+        started = time.monotonic()
+        path = self._path(message, model, temperature, chat_history)
+        try:
+            if self.replay:
+                text = ''.join(self._load(path))
+            else:
+                text = self.inner.chat(message, model=model, temperature=temperature, chat_history=chat_history)
+                self._save(path, message, model, temperature, [text])
+        except llm.LLMError:
+            self.metrics.incr('failures')
+            raise
+        self.metrics.record_success(time.monotonic() - started, {})
+        return text
+
+    async def astream_chat(self, message, model=llm.DEFAULT_MODEL, temperature=0.5, chat_history=None):
+        self.metrics.incr('calls')
+        started = time.monotonic()
+        path = self._path(message, model, temperature, chat_history)
+        try:
+            if self.replay:
+                for chunk in self._load(path):
+                    yield chunk
+            else:
+                chunks = []
+                async for chunk in self.inner.astream_chat(message, model=model, temperature=temperature,
+                                                           chat_history=chat_history):
+                    chunks.append(chunk)
+                    yield chunk
+                self._save(path, message, model, temperature, chunks)
+        except llm.LLMError:
+            self.metrics.incr('failures')
+            raise
+        self.metrics.record_success(time.monotonic() - started, {})
+
+    def stats(self):
+        stats = {'provider': self.name, **self.metrics.snapshot(), 'recordings_dir': str(self.directory)}
+        if self.inner is not None and not self.replay:
+            stats['upstream'] = self.inner.stats()
+        return stats
+
+
+def build_provider():
+    name = getattr(settings, 'LLM_PROVIDER', 'cohere')
+    if name == 'cohere':
+        return llm.client
+    if name == 'stub':
+        return StubProvider(
+            latency=getattr(settings, 'LLM_STUB_LATENCY', 0.2),
+            tokens_per_second=getattr(settings, 'LLM_STUB_TOKENS_PER_SECOND', 50.0),
+        )
+    if name in ('record', 'replay'):
+        return RecordingProvider(settings.LLM_RECORDINGS_DIR, inner=llm.client, replay=name == 'replay')
+    raise ImproperlyConfigured(f"Unknown LLM_PROVIDER '{name}'; use cohere, stub, record or replay.")
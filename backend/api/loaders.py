@@ -0,0 +1,25 @@
+"""
+Batch loaders that fetch related data for a whole page of objects at once,
+so serializers don't have to run a query per row.
+"""
+from .models import UserLicense
+
+
+def load_user_licenses(user_ids):
+    """
+    Returns a dict of user_id -> [{'id', 'name'}] with each user's current
+    licenses, fetched for all the given users in a single query.
+    Users without licenses map to an empty list.
+    """
+    user_ids = list(user_ids)
+    license_map = {user_id: [] for user_id in user_ids}
+    if not user_ids:
+        return license_map
+
+    grants = UserLicense.objects.filter(
+        user_id__in=user_ids
+    ).order_by('user_id', 'software_id').values_list('user_id', 'software_id', 'software__name')
+
+    for user_id, software_id, software_name in grants:
+        license_map[user_id].append({'id': software_id, 'name': software_name})
+    return license_map
@@ -0,0 +1,86 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import override_settings
+from rest_framework.test import APIClient
+
+from api import llm
+from api.tasks import run_license_optimization_task
+
+
+def _percentile(values, p):
+    values = sorted(values)
+    return values[min(int(len(values) * p), len(values) - 1)]
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures end-to-end throughput of the chatbot endpoint and the optimization "
+        "agent task with an offline LLM provider (the stub, or replayed recordings), "
+        "so it runs without network access or CO_API_KEY. It only measures; the "
+        "behavior is covered by OfflineProviderTests in api/tests.py."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', required=True, help="User to ask the questions as.")
+        parser.add_argument('--provider', choices=['stub', 'replay'], default='stub')
+        parser.add_argument('--requests', type=int, default=50)
+        parser.add_argument('--concurrency', type=int, default=10)
+        parser.add_argument('--agent-runs', type=int, default=3)
+        parser.add_argument('--latency', type=float, default=0.2, help="Stub seconds before the first token.")
+        parser.add_argument('--tokens-per-second', type=float, default=200.0, help="Stub generation speed.")
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=options['username']).first()
+        if user is None:
+            raise CommandError(f"User '{options['username']}' not found.")
+
+        def ask(n):
+            client = APIClient(SERVER_NAME='localhost')
+            client.force_authenticate(user)
+            started = time.perf_counter()
+            try:
+                response = client.post(
+                    '/api/license-chatbot/',
+                    {'question': f'Benchmark question {n}: which software renews soon?'},
+                    format='json',
+                )
+                ok = response.status_code == 200 and not response.data['answer'].startswith('Error')
+                return ok, time.perf_counter() - started
+            finally:
+                connection.close()
+
+        with override_settings(
+            LLM_PROVIDER=options['provider'],
+            LLM_STUB_LATENCY=options['latency'],
+            LLM_STUB_TOKENS_PER_SECOND=options['tokens_per_second'],
+        ):
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+                results = list(pool.map(ask, range(options['requests'])))
+            total = time.perf_counter() - started
+            latencies = [elapsed for _, elapsed in results]
+            failed = sum(1 for ok, _ in results if not ok)
+            self.stdout.write(
+                f"Chatbot: {len(results)} requests in {total:.2f}s ({len(results) / total:.1f} req/s), "
+                f"p50 {_percentile(latencies, 0.5):.3f}s, p95 {_percentile(latencies, 0.95):.3f}s, {failed} failed."
+            )
+
+            agent_times = []
+            agent_failed = 0
+            for _ in range(options['agent_runs']):
+                started = time.perf_counter()
+                # Runs the task body in-process, as a worker would, without needing a broker
+                recommendations = run_license_optimization_task()
+                agent_times.append(time.perf_counter() - started)
+                if recommendations.startswith('Error'):
+                    agent_failed += 1
+            if agent_times:
+                self.stdout.write(
+                    f"Agent: {len(agent_times)} runs, {sum(agent_times) / len(agent_times):.3f}s on average, "
+                    f"{agent_failed} failed."
+                )
+            self.stdout.write(f"Provider: {llm.get_provider().stats()}")
@@ -0,0 +1,66 @@
+import asyncio
+import os
+import time
+
+import httpx
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from api.authentication import issue_access_token
+from api.fake_llm import FakeLLMServer
+
+
+class Command(BaseCommand):
+    help = (
+        "Streams many chatbot conversations at once through the ASGI app against the "
+        "local fake LLM server, and reports how long they took. With one shared event "
+        "loop the total should stay close to the time of a single conversation."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--username', required=True, help="User to ask the questions as.")
+        parser.add_argument('--conversations', type=int, default=50)
+        parser.add_argument('--token-delay', type=float, default=0.02)
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=options['username']).first()
+        if user is None:
+            raise CommandError(f"User '{options['username']}' not found.")
+        token = issue_access_token(user)
+        # Warm the context and retrieval index so the run measures streaming
+        from api.license_agent import build_chat_prompt
+        build_chat_prompt('warm up')
+
+        from saas_project.asgi import application
+
+        async def run():
+            server = await FakeLLMServer(token_delay=options['token_delay']).start()
+            os.environ['CO_API_URL'] = server.url
+            os.environ.setdefault('CO_API_KEY', 'fake-key')
+            transport = httpx.ASGITransport(app=application)
+            async with httpx.AsyncClient(transport=transport, base_url='http://localhost') as client:
+                async def ask(n):
+                    started = time.perf_counter()
+                    response = await client.post(
+                        '/api/license-chatbot/stream/',
+                        json={'question': f'Benchmark question {n}: which software renews soon?'},
+                        headers={'Authorization': f'Bearer {token}'},
+                    )
+                    tokens = response.text.count('event: token')
+                    return response.status_code, tokens, time.perf_counter() - started
+
+                started = time.perf_counter()
+                results = await asyncio.gather(*(ask(n) for n in range(options['conversations'])))
+                total = time.perf_counter() - started
+            await server.close()
+            return results, total
+
+        results, total = asyncio.run(run())
+        failed = [r for r in results if r[0] != 200 or not r[1]]
+        slowest = max(r[2] for r in results)
+        self.stdout.write(
+            f"{len(results)} conversations in {total:.2f}s (slowest {slowest:.2f}s), "
+            f"{sum(r[1] for r in results)} tokens streamed, {len(failed)} failed."
+        )
+        if failed:
+            raise CommandError("Some conversations failed.")
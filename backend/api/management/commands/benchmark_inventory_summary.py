@@ -0,0 +1,88 @@
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test.utils import setup_databases, teardown_databases
+from django.utils import timezone
+
+from api.inventory import summarize_inventory, software_list
+from api.models import SaaSApplication
+
+
+class _Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Measures InventoryStatsView's summary queries against 100, 10k and 100k "
+        "generated applications, in a throwaway test database like the test runner's "
+        "(the database user needs to be allowed to create it)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes',
+            type=int,
+            nargs='+',
+            default=[100, 10_000, 100_000],
+            help="Catalog sizes to benchmark.",
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help="Runs per measurement; the best run is reported.",
+        )
+
+    def handle(self, *args, **options):
+        # Never seeds the configured database: the catalog there is left alone
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'})
+        try:
+            self._run(options)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+
+    def _run(self, options):
+        self.stdout.write(f"{'apps':>8}  {'summary (ms)':>12}  {'software_list (ms)':>18}")
+        for size in options['sizes']:
+            # Each size is measured on its own, so its rows are rolled back afterwards
+            try:
+                with transaction.atomic():
+                    self._seed(size)
+                    summary_ms = self._best_of(options['repeat'], summarize_inventory)
+                    list_ms = self._best_of(options['repeat'], software_list)
+                    self.stdout.write(f"{size:>8}  {summary_ms:>12.2f}  {list_ms:>18.2f}")
+                    raise _Rollback()
+            except _Rollback:
+                pass
+
+    def _seed(self, size):
+        today = timezone.localdate()
+        rng = random.Random(size)
+        SaaSApplication.objects.bulk_create(
+            (
+                SaaSApplication(
+                    name=f"Bench App {i}",
+                    vendor=f"Vendor {i % 50}",
+                    category='Benchmark',
+                    total_licenses=rng.randint(1, 500),
+                    monthly_cost=Decimal(rng.randint(100, 100_000)) / 100,
+                    renewal_date=today + timedelta(days=rng.randint(-60, 365)),
+                )
+                for i in range(size)
+            ),
+            batch_size=2000,
+        )
+
+    def _best_of(self, repeat, func):
+        best = None
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            elapsed = (time.perf_counter() - start) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+        return best
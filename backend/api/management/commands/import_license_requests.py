@@ -0,0 +1,47 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from api.imports import ImportFileError, parse_rows, import_license_requests, stream_error_report
+
+
+class Command(BaseCommand):
+    help = "Bulk-creates license requests from a CSV or JSON file of (user, software_name, request_type, reason)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or JSON file to import.")
+        parser.add_argument(
+            '--requested-by',
+            required=True,
+            help="Username recorded as the requester of every imported request.",
+        )
+        parser.add_argument(
+            '--errors',
+            help="Write the rejected rows to this NDJSON file instead of the console.",
+        )
+
+    def handle(self, *args, **options):
+        try:
+            requested_by = User.objects.get(username=options['requested_by'])
+        except User.DoesNotExist:
+            raise CommandError(f"User '{options['requested_by']}' not found.")
+
+        file_format = 'csv' if options['path'].lower().endswith('.csv') else 'json'
+        try:
+            with open(options['path'], 'rb') as f:
+                rows = parse_rows(f, file_format)
+        except (OSError, ImportFileError) as e:
+            raise CommandError(str(e))
+
+        created, errors = import_license_requests(rows, requested_by=requested_by)
+        summary = {'rows': len(rows), 'created': created, 'rejected': len(errors)}
+
+        if errors:
+            if options['errors']:
+                with open(options['errors'], 'w') as out:
+                    out.writelines(stream_error_report(errors, summary))
+                self.stdout.write(self.style.WARNING(f"Wrote {len(errors)} rejected row(s) to {options['errors']}."))
+            else:
+                for line in stream_error_report(errors, summary):
+                    self.stdout.write(line, ending='')
+
+        self.stdout.write(self.style.SUCCESS(f"Imported {created} of {len(rows)} row(s)."))
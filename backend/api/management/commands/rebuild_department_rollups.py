@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from api.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = "Rebuilds the department rollup table from live data and reports any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help="Only report drift, don't rewrite the rollup table.",
+        )
+
+    def handle(self, *args, **options):
+        drift = rebuild_rollups(dry_run=options['check'])
+
+        if not drift:
+            self.stdout.write(self.style.SUCCESS("Department rollups match the live data."))
+            return
+
+        self.stdout.write(self.style.WARNING(f"Found {len(drift)} drifted value(s):"))
+        for department_key, field, stored_value, live_value in drift:
+            self.stdout.write(f"  {department_key}.{field}: stored={stored_value!r} live={live_value!r}")
+
+        if options['check']:
+            self.stdout.write("Run without --check to rebuild.")
+        else:
+            self.stdout.write(self.style.SUCCESS("Department rollups rebuilt."))
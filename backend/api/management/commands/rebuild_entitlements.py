@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand
+
+from api.entitlements import rebuild_entitlements
+from api.rollups import rebuild_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Replays every approved GRANT/REVOKE request to rebuild the UserLicense "
+        "entitlement table, then rebuilds the department rollups from it."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help="Only report differences, don't rewrite anything.",
+        )
+
+    def handle(self, *args, **options):
+        missing, extra = rebuild_entitlements(dry_run=options['check'])
+
+        if not missing and not extra:
+            self.stdout.write(self.style.SUCCESS("Entitlements match the approved requests."))
+        else:
+            self.stdout.write(self.style.WARNING(
+                f"Found {len(missing)} missing and {len(extra)} extra entitlement(s):"
+            ))
+            for user_id, software_id in missing:
+                self.stdout.write(f"  missing: user={user_id} software={software_id}")
+            for user_id, software_id in extra:
+                self.stdout.write(f"  extra: user={user_id} software={software_id}")
+
+        if options['check']:
+            return
+
+        drift = rebuild_rollups()
+        self.stdout.write(self.style.SUCCESS(
+            f"Entitlements rebuilt. Department rollups rebuilt ({len(drift)} drifted value(s) fixed)."
+        ))
@@ -0,0 +1,38 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from api.fake_llm import FakeLLMServer
+
+
+class Command(BaseCommand):
+    help = (
+        "Runs a local fake of the Cohere chat API for load tests and offline runs. "
+        "Point the app at it with CO_API_URL=http://<host>:<port> and any CO_API_KEY."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+        parser.add_argument('--token-delay', type=float, default=0.05, help="Seconds between streamed tokens.")
+        parser.add_argument('--latency', type=float, default=0.0, help="Seconds before the first byte of each response.")
+        parser.add_argument('--error-rate', type=float, default=0.0, help="Fraction of requests answered with a 503.")
+
+    def handle(self, *args, **options):
+        server = FakeLLMServer(
+            host=options['host'],
+            port=options['port'],
+            token_delay=options['token_delay'],
+            latency=options['latency'],
+            error_rate=options['error_rate'],
+        )
+
+        async def run():
+            await server.start()
+            self.stdout.write(f"Fake LLM server listening on {server.url}. Press Ctrl+C to stop.")
+            await server.serve_forever()
+
+        try:
+            asyncio.run(run())
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,34 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from api.leases import LeaseReaper, reclaim_expired
+
+
+class Command(BaseCommand):
+    help = (
+        "Reclaims expired floating-license leases. Runs continuously, waking up at "
+        "the next lease deadline; use --once to reclaim what is already expired and exit."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help="Reclaim expired leases once and exit.")
+        parser.add_argument('--horizon', type=int, default=30, help="Seconds of upcoming deadlines to queue per refill.")
+
+    def handle(self, *args, **options):
+        if options['once']:
+            total = 0
+            while True:
+                reclaimed = reclaim_expired(limit=500)
+                total += reclaimed
+                if reclaimed < 500:
+                    break
+            self.stdout.write(self.style.SUCCESS(f"Reclaimed {total} expired lease(s)."))
+            return
+
+        self.stdout.write("Lease reaper running. Press Ctrl+C to stop.")
+        reaper = LeaseReaper(horizon=timedelta(seconds=options['horizon']))
+        try:
+            reaper.run_forever()
+        except KeyboardInterrupt:
+            pass
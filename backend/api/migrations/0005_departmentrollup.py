@@ -0,0 +1,57 @@
+# Generated by Django 5.0.4 on 2026-10-17 16:22
+
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def populate_rollups(apps, schema_editor):
+    Profile = apps.get_model('tenants', 'Profile')
+    LicenseRequest = apps.get_model('api', 'LicenseRequest')
+    SaaSApplication = apps.get_model('api', 'SaaSApplication')
+    DepartmentRollup = apps.get_model('api', 'DepartmentRollup')
+
+    rollups = defaultdict(lambda: {'team_size': 0, 'approved_grants': 0, 'software_counts': {}})
+    user_departments = {}
+    for user_id, department in Profile.objects.values_list('user_id', 'department'):
+        key = (department or '').strip().lower()
+        if key:
+            user_departments[user_id] = key
+            rollups[key]['team_size'] += 1
+
+    grants = LicenseRequest.objects.filter(request_type='GRANT', status='APPROVED')
+    for user_id, software_id in grants.values_list('user_id', 'software_id'):
+        key = user_departments.get(user_id)
+        if key:
+            counts = rollups[key]['software_counts']
+            counts[str(software_id)] = counts.get(str(software_id), 0) + 1
+            rollups[key]['approved_grants'] += 1
+
+    costs = dict(SaaSApplication.objects.values_list('id', 'monthly_cost'))
+    for key, data in rollups.items():
+        spend = sum((costs.get(int(s), Decimal('0')) for s in data['software_counts']), Decimal('0'))
+        DepartmentRollup.objects.create(department_key=key, monthly_spend=spend, **data)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_airecommendation'),
+        ('tenants', '0002_profile_department'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DepartmentRollup',
+            fields=[
+                ('department_key', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('team_size', models.PositiveIntegerField(default=0)),
+                ('approved_grants', models.PositiveIntegerField(default=0)),
+                ('software_counts', models.JSONField(blank=True, default=dict)),
+                ('monthly_spend', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(populate_rollups, migrations.RunPython.noop),
+    ]
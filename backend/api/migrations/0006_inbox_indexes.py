@@ -0,0 +1,23 @@
+# Generated by Django 5.0.4 on 2026-10-17 17:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_departmentrollup'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='issuereport',
+            index=models.Index(fields=['status', 'created_at', 'id'], name='issue_inbox_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='licenserequest',
+            index=models.Index(fields=['status', 'approval_level', 'created_at', 'id'], name='licreq_inbox_idx'),
+        ),
+    ]
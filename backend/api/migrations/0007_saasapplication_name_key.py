@@ -0,0 +1,34 @@
+# Generated by Django 5.0.4 on 2026-10-17 17:20
+
+from django.db import migrations, models
+
+
+def fill_name_keys(apps, schema_editor):
+    """
+    Gives each software its normalized name key. When several rows share a
+    name, the oldest one (the one name lookups already picked) gets the key
+    and the others keep NULL.
+    """
+    SaaSApplication = apps.get_model('api', 'SaaSApplication')
+    seen = set()
+    for software_id, name in SaaSApplication.objects.order_by('id').values_list('id', 'name'):
+        key = (name or '').strip().lower() or None
+        if key and key not in seen:
+            seen.add(key)
+            SaaSApplication.objects.filter(pk=software_id).update(name_key=key)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_inbox_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='saasapplication',
+            name='name_key',
+            field=models.CharField(blank=True, editable=False, max_length=100, null=True, unique=True),
+        ),
+        migrations.RunPython(fill_name_keys, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,76 @@
+# Generated by Django 5.0.4 on 2026-10-17 17:21
+
+import django.db.models.deletion
+from django.conf import settings
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import migrations, models
+
+
+def replay_entitlements(apps, schema_editor):
+    """
+    Fills UserLicense by replaying approved GRANT/REVOKE requests in order,
+    then recounts the department rollups from it (they used to count
+    approved GRANT requests and ignore revocations).
+    """
+    LicenseRequest = apps.get_model('api', 'LicenseRequest')
+    UserLicense = apps.get_model('api', 'UserLicense')
+    Profile = apps.get_model('tenants', 'Profile')
+    SaaSApplication = apps.get_model('api', 'SaaSApplication')
+    DepartmentRollup = apps.get_model('api', 'DepartmentRollup')
+
+    holdings = {}
+    events = LicenseRequest.objects.filter(status='APPROVED').order_by('updated_at', 'id')
+    for request_id, request_type, user_id, software_id in events.values_list('id', 'request_type', 'user_id', 'software_id'):
+        if request_type == 'GRANT':
+            holdings.setdefault((user_id, software_id), request_id)
+        else:
+            holdings.pop((user_id, software_id), None)
+
+    UserLicense.objects.bulk_create(
+        UserLicense(user_id=user_id, software_id=software_id, granted_by_request_id=request_id)
+        for (user_id, software_id), request_id in holdings.items()
+    )
+
+    user_departments = dict(Profile.objects.exclude(department_key=None).values_list('user_id', 'department_key'))
+    costs = dict(SaaSApplication.objects.values_list('id', 'monthly_cost'))
+    counts = defaultdict(dict)
+    for user_id, software_id in holdings:
+        key = user_departments.get(user_id)
+        if key:
+            counts[key][str(software_id)] = counts[key].get(str(software_id), 0) + 1
+
+    for rollup in DepartmentRollup.objects.all():
+        software_counts = counts.get(rollup.department_key, {})
+        rollup.software_counts = software_counts
+        rollup.approved_grants = sum(software_counts.values())
+        rollup.monthly_spend = sum((costs.get(int(s), Decimal('0')) for s in software_counts), Decimal('0'))
+        rollup.save()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_saasapplication_name_key'),
+        ('tenants', '0003_profile_department_key'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UserLicense',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('granted_at', models.DateTimeField(auto_now_add=True)),
+                ('granted_by_request', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='api.licenserequest')),
+                ('software', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='user_licenses', to='api.saasapplication')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='user_licenses', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='userlicense',
+            constraint=models.UniqueConstraint(fields=('user', 'software'), name='unique_user_license'),
+        ),
+        migrations.RunPython(replay_entitlements, migrations.RunPython.noop),
+    ]
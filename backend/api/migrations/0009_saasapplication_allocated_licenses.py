@@ -0,0 +1,28 @@
+# Generated by Django 5.0.4 on 2026-10-17 17:23
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_allocated_seats(apps, schema_editor):
+    SaaSApplication = apps.get_model('api', 'SaaSApplication')
+    UserLicense = apps.get_model('api', 'UserLicense')
+    held = UserLicense.objects.values('software_id').annotate(n=Count('id'))
+    for row in held:
+        SaaSApplication.objects.filter(pk=row['software_id']).update(allocated_licenses=row['n'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_userlicense'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='saasapplication',
+            name='allocated_licenses',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(count_allocated_seats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.0.4 on 2026-10-17 17:24
+
+import django.db.models.deletion
+import uuid
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0009_saasapplication_allocated_licenses'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='saasapplication',
+            name='license_mode',
+            field=models.CharField(choices=[('NAMED', 'Named seats'), ('FLOATING', 'Floating (concurrent) seats')], default='NAMED', max_length=10),
+        ),
+        migrations.CreateModel(
+            name='LicenseLease',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('checked_out_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField()),
+                ('released_at', models.DateTimeField(blank=True, null=True)),
+                ('release_reason', models.CharField(blank=True, choices=[('RELEASED', 'Released'), ('EXPIRED', 'Expired')], max_length=10)),
+                ('software', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leases', to='api.saasapplication')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='license_leases', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('released_at__isnull', True)), fields=['expires_at'], name='lease_open_expiry_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='licenselease',
+            constraint=models.UniqueConstraint(condition=models.Q(('released_at__isnull', True)), fields=('software', 'user'), name='unique_open_lease'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.0.4 on 2026-10-17 17:26
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0010_floating_license_leases'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DepartmentBudget',
+            fields=[
+                ('department_key', models.CharField(max_length=100, primary_key=True, serialize=False)),
+                ('monthly_ceiling', models.DecimalField(decimal_places=2, max_digits=12)),
+                ('enforcement', models.CharField(choices=[('FLAG', 'Flag requests over budget'), ('HOLD', 'Hold approvals over budget')], default='HOLD', max_length=4)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='licenserequest',
+            name='over_budget',
+            field=models.BooleanField(default=False),
+        ),
+    ]
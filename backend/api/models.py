@@ -1,16 +1,66 @@
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import User
 
+
+def normalize_software_name(name):
+    """
+    Returns the canonical key for a software name, or None if it is blank.
+    "Slack", " slack " and "SLACK" all map to "slack".
+    """
+    if not name:
+        return None
+    return name.strip().lower() or None
+
 # Model for the software applications you are tracking.
 class SaaSApplication(models.Model):
+    class LicenseMode(models.TextChoices):
+        NAMED = 'NAMED', 'Named seats'
+        FLOATING = 'FLOATING', 'Floating (concurrent) seats'
+
     name = models.CharField(max_length=100)
+    # Normalized copy of `name`. The unique index stops two requests from
+    # auto-creating the same software at the same time. Duplicates created
+    # before the index existed keep a NULL key.
+    name_key = models.CharField(max_length=100, unique=True, null=True, blank=True, editable=False)
     vendor = models.CharField(max_length=100)
     category = models.CharField(max_length=50)
     total_licenses = models.PositiveIntegerField()
+    # FLOATING software is shared through short leases (see api/leases.py)
+    # instead of permanent grants. total_licenses is then the pool size.
+    license_mode = models.CharField(max_length=10, choices=LicenseMode.choices, default=LicenseMode.NAMED)
+    # Seats currently held (UserLicense rows and active leases). Only ever changed with atomic
+    # F() updates in api/entitlements.py, never by saving the model.
+    allocated_licenses = models.PositiveIntegerField(default=0, editable=False)
     monthly_cost = models.DecimalField(max_digits=10, decimal_places=2)
     renewal_date = models.DateField()
     description = models.TextField(blank=True)
 
+    @property
+    def seats_available(self):
+        return max(self.total_licenses - self.allocated_licenses, 0)
+
+    def save(self, *args, **kwargs):
+        key = normalize_software_name(self.name)
+        # Leave legacy duplicates alone unless they are renamed to a free name
+        is_legacy_duplicate = (
+            not self._state.adding and self.name_key is None and
+            SaaSApplication.objects.filter(name_key=key).exclude(pk=self.pk).exists()
+        )
+        if not is_legacy_duplicate:
+            self.name_key = key
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'name' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'name_key'}
+        elif update_fields is None and not self._state.adding:
+            # Never write back a stale in-memory seat count
+            kwargs['update_fields'] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name != 'allocated_licenses'
+            ]
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return self.name
 
@@ -60,6 +110,10 @@ class LicenseRequest(models.Model):
     )
     
     reason = models.TextField(blank=True, help_text="Reason for the request.")
+
+    # Set when granting this request would push the department over its
+    # budget ceiling (see api/budgets.py)
+    over_budget = models.BooleanField(default=False)
     
     # Admin's response when approving/rejecting
     admin_response = models.TextField(blank=True, help_text="Admin's response to the request")
@@ -77,9 +131,76 @@ class LicenseRequest(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Serves the approval inboxes' keyset pagination on (created_at, id)
+            models.Index(fields=['status', 'approval_level', 'created_at', 'id'], name='licreq_inbox_idx'),
+        ]
+
     def __str__(self):
         return f"{self.get_request_type_display()} request for {self.software.name}"
 
+# Who currently holds a license for which software. This is a projection of
+# approved GRANT/REVOKE requests, kept up to date by api/entitlements.py and
+# rebuilt with `python manage.py rebuild_entitlements`.
+class UserLicense(models.Model):
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='user_licenses')
+    software = models.ForeignKey(SaaSApplication, on_delete=models.CASCADE, related_name='user_licenses')
+    
+    # The approved GRANT request this entitlement came from
+    granted_by_request = models.ForeignKey(
+        LicenseRequest,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name='+'
+    )
+    granted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'software'], name='unique_user_license'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.software.name}"
+
+# A time-limited checkout of a FLOATING software seat. The holder keeps it
+# alive with heartbeats; expired leases are reclaimed by the lease reaper.
+class LicenseLease(models.Model):
+    class ReleaseReason(models.TextChoices):
+        RELEASED = 'RELEASED', 'Released'
+        EXPIRED = 'EXPIRED', 'Expired'
+
+    token = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    software = models.ForeignKey(SaaSApplication, on_delete=models.CASCADE, related_name='leases')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='license_leases')
+    checked_out_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+    released_at = models.DateTimeField(null=True, blank=True)
+    release_reason = models.CharField(max_length=10, choices=ReleaseReason.choices, blank=True)
+
+    class Meta:
+        constraints = [
+            # A user holds at most one open lease per software
+            models.UniqueConstraint(
+                fields=['software', 'user'],
+                condition=models.Q(released_at__isnull=True),
+                name='unique_open_lease'
+            ),
+        ]
+        indexes = [
+            # Lets the reaper read open leases in expiry order without a table scan
+            models.Index(
+                fields=['expires_at'],
+                condition=models.Q(released_at__isnull=True),
+                name='lease_open_expiry_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} - {self.software.name} lease"
+
 # Model for issue reports submitted by users
 class IssueReport(models.Model):
     class IssueType(models.TextChoices):
@@ -114,6 +235,12 @@ class IssueReport(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
     resolved_at = models.DateTimeField(null=True, blank=True)
 
+    class Meta:
+        indexes = [
+            # Serves the issue inboxes' keyset pagination on (created_at, id)
+            models.Index(fields=['status', 'created_at', 'id'], name='issue_inbox_idx'),
+        ]
+
     def __str__(self):
         return f"{self.get_issue_type_display()} - {self.software_name} by {self.reported_by.username}"
 
@@ -131,3 +258,45 @@ class AIRecommendation(models.Model):
     
     def __str__(self):
         return f"AI Recommendations - {self.created_at.strftime('%Y-%m-%d %H:%M')}"
+
+
+class DepartmentRollup(models.Model):
+    """
+    Per-department totals for the Department Head dashboard.
+    Kept up to date by the signal handlers in api/signals.py and can be
+    rebuilt with `python manage.py rebuild_department_rollups`.
+    """
+    # Normalized department name (see tenants.models.normalize_department)
+    department_key = models.CharField(max_length=100, primary_key=True)
+    team_size = models.PositiveIntegerField(default=0)
+    approved_grants = models.PositiveIntegerField(default=0)
+
+    # Maps software id (as a string) -> number of approved grants in this department.
+    # The keys are the department's distinct software set.
+    software_counts = models.JSONField(default=dict, blank=True)
+
+    # Sum of monthly_cost over the distinct software set
+    monthly_spend = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Rollup for {self.department_key}"
+
+
+class DepartmentBudget(models.Model):
+    """
+    Monthly spend ceiling for a department. License grants are checked
+    against it when requested and when approved (see api/budgets.py).
+    """
+    class Enforcement(models.TextChoices):
+        FLAG = 'FLAG', 'Flag requests over budget'
+        HOLD = 'HOLD', 'Hold approvals over budget'
+
+    # Normalized department name (see tenants.models.normalize_department)
+    department_key = models.CharField(max_length=100, primary_key=True)
+    monthly_ceiling = models.DecimalField(max_digits=12, decimal_places=2)
+    enforcement = models.CharField(max_length=4, choices=Enforcement.choices, default=Enforcement.HOLD)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.department_key}: {self.monthly_ceiling}/month ({self.enforcement})"
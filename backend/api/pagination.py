@@ -0,0 +1,101 @@
+import binascii
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from datetime import datetime
+
+from django.db.models import Q
+from rest_framework.pagination import CursorPagination
+
+
+class UserKeysetPagination(CursorPagination):
+    """
+    Keyset pagination for the admin user table, ordered by user id.
+
+    Pagination is opt-in so existing clients that expect a plain list keep
+    working: it only kicks in when the request sends `page_size` or `cursor`.
+    """
+    ordering = 'id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if self.page_size_query_param not in params and self.cursor_query_param not in params:
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+
+class InboxCursorPaginator:
+    """
+    Keyset pagination for the approval and issue inboxes, ordered newest first
+    on (created_at, id).
+
+    The cursor is an opaque token holding the last row's position, so every
+    page is an indexed range scan no matter how deep the client goes. The
+    total is counted up to `count_limit` rows; beyond that it is reported as
+    capped instead of scanning the whole backlog.
+
+    Like UserKeysetPagination it is opt-in: without `page_size` or `cursor`
+    in the request, the whole inbox comes back with a plain `count`, the
+    response shape existing clients expect.
+    """
+    default_page_size = 50
+    max_page_size = 200
+    count_limit = 1000
+
+    def __init__(self, request):
+        self.request = request
+
+    def get_page_size(self):
+        try:
+            page_size = int(self.request.query_params.get('page_size', self.default_page_size))
+        except (TypeError, ValueError):
+            return self.default_page_size
+        return max(1, min(page_size, self.max_page_size))
+
+    @staticmethod
+    def encode_cursor(obj):
+        position = {'t': obj.created_at.isoformat(), 'id': obj.pk}
+        return urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip('=')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """Returns (created_at, id) or raises ValueError for a malformed cursor."""
+        try:
+            padding = '=' * (-len(cursor) % 4)
+            position = json.loads(urlsafe_b64decode((cursor + padding).encode()))
+            created_at = datetime.fromisoformat(position['t'])
+            return created_at, int(position['id'])
+        except (KeyError, TypeError, ValueError, binascii.Error) as e:
+            raise ValueError('Invalid cursor.') from e
+
+    def paginate(self, queryset):
+        """
+        Returns (rows, pagination) where pagination holds the page metadata to
+        merge into the response. Raises ValueError for a malformed cursor.
+        """
+        params = self.request.query_params
+        if 'page_size' not in params and 'cursor' not in params:
+            rows = list(queryset)
+            return rows, {'count': len(rows)}
+
+        total = queryset.order_by()[:self.count_limit + 1].count()
+
+        cursor = self.request.query_params.get('cursor')
+        if cursor:
+            created_at, pk = self.decode_cursor(cursor)
+            queryset = queryset.filter(
+                Q(created_at__lt=created_at) | Q(created_at=created_at, pk__lt=pk)
+            )
+
+        page_size = self.get_page_size()
+        rows = list(queryset.order_by('-created_at', '-pk')[:page_size + 1])
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+
+        return rows, {
+            'count': min(total, self.count_limit),
+            'count_capped': total > self.count_limit,
+            'next_cursor': self.encode_cursor(rows[-1]) if has_more else None,
+        }
@@ -0,0 +1,147 @@
+"""
+Compact, token-budgeted prompt sections for the AI agent and the chatbot.
+
+Lists of dicts are rendered as pipe-separated tables, with the column names
+written once in the header, instead of Python reprs that repeat every key on
+every row. Tokens are counted locally. When the prompt would go over its
+budget, each table keeps its most important rows that fit and replaces the
+rest with one aggregate line. PromptBuilder.build() also reports how many
+tokens each section used.
+"""
+import math
+import re
+from decimal import Decimal
+
+from django.conf import settings
+
+DEFAULT_TOKEN_BUDGET = 3000
+
+# Words, digit runs and single punctuation marks, split roughly the way BPE tokenizers do
+TOKEN_RE = re.compile(r'[A-Za-z]+|\d+|[^\sA-Za-z\d]')
+PLACEHOLDER_RE = re.compile(r'\{(\w+)\}')
+
+
+def count_tokens(text):
+    """Local estimate of the LLM token count; long words and numbers count as several tokens."""
+    return sum(
+        math.ceil(len(piece) / 6) if piece[0].isalpha() else math.ceil(len(piece) / 3)
+        for piece in TOKEN_RE.findall(text)
+    )
+
+
+def format_value(value):
+    if value is None or value == '':
+        return '-'
+    if isinstance(value, bool):
+        return 'yes' if value else 'no'
+    if isinstance(value, (float, Decimal)):
+        return f'{value:.2f}'.rstrip('0').rstrip('.')
+    return str(value).replace('|', '/').replace('\n', ' ')
+
+
+def render_table(rows, columns):
+    """`columns` is a list of (key, header) pairs."""
+    lines = ['|'.join(header for _, header in columns)]
+    lines.extend('|'.join(format_value(row.get(key)) for key, _ in columns) for row in rows)
+    return '\n'.join(lines)
+
+
+class _Table:
+    def __init__(self, rows, columns, rank, totals, weight):
+        self.columns = columns
+        self.rows = sorted(rows, key=rank, reverse=True) if rank else list(rows)
+        self.totals = totals
+        self.weight = weight
+        self.header = render_table([], columns)
+        self.lines = [render_table([row], columns).split('\n', 1)[1] for row in self.rows]
+        self.costs = [count_tokens(line) for line in self.lines]
+        self.full_cost = count_tokens(self.header) + sum(self.costs)
+
+    def summary(self, omitted):
+        rows = self.rows[len(self.rows) - omitted:]
+        parts = [f'{len(rows)} more rows not shown']
+        headers = dict(self.columns)
+        for key in self.totals:
+            parts.append(f'{headers.get(key, key)} total {format_value(sum(row.get(key) or 0 for row in rows))}')
+        return f"(+{', '.join(parts)})"
+
+    def render(self, budget):
+        """Returns (text, rows omitted), keeping as many of the top rows as fit in `budget`."""
+        if self.full_cost <= budget:
+            return '\n'.join([self.header, *self.lines]), 0
+        # Leave room for the summary line (its size barely depends on the count)
+        reserve = count_tokens(self.summary(len(self.rows)))
+        used = count_tokens(self.header) + reserve
+        kept = 0
+        for cost in self.costs:
+            if used + cost > budget:
+                break
+            used += cost
+            kept += 1
+        omitted = len(self.rows) - kept
+        return '\n'.join([self.header, *self.lines[:kept], self.summary(omitted)]), omitted
+
+
+class PromptBuilder:
+    """
+    Collects named sections and fills them into a prompt template under a
+    token budget. Text sections are always included in full; tables share
+    what is left of the budget by weight.
+    """
+
+    def __init__(self, token_budget=None):
+        self.token_budget = token_budget or getattr(settings, 'LLM_PROMPT_TOKEN_BUDGET', DEFAULT_TOKEN_BUDGET)
+        self._texts = {}
+        self._tables = {}
+
+    def text(self, name, text):
+        self._texts[name] = text
+        return self
+
+    def table(self, name, rows, columns, rank=None, totals=(), weight=1):
+        """
+        `rank` orders the rows most important first (e.g. by monthly cost);
+        the `totals` columns are summed over the rows left out.
+        """
+        self._tables[name] = _Table(rows, columns, rank, totals, weight)
+        return self
+
+    def build(self, template):
+        """
+        Returns (prompt, report), where the template uses `{name}` for each
+        section and report is {'sections': {name: tokens}, 'omitted_rows':
+        {table name: rows}, 'total': tokens, 'budget': tokens}.
+        """
+        rendered = dict(self._texts)
+        sections = {'instructions': count_tokens(PLACEHOLDER_RE.sub('', template))}
+        sections.update((name, count_tokens(text)) for name, text in self._texts.items())
+        omitted_rows = {}
+
+        remaining = max(self.token_budget - sum(sections.values()), 0)
+        remaining_weight = sum(table.weight for table in self._tables.values())
+        # Smallest tables first, so what they don't use goes to the bigger ones
+        for name, table in sorted(self._tables.items(), key=lambda item: item[1].full_cost / item[1].weight):
+            share = remaining * table.weight / remaining_weight if remaining_weight else 0
+            rendered[name], omitted = table.render(share)
+            sections[name] = count_tokens(rendered[name])
+            if omitted:
+                omitted_rows[name] = omitted
+            remaining = max(remaining - sections[name], 0)
+            remaining_weight -= table.weight
+
+        prompt = PLACEHOLDER_RE.sub(lambda match: rendered[match.group(1)], template)
+        report = {
+            'sections': sections,
+            'omitted_rows': omitted_rows,
+            'total': sum(sections.values()),
+            'budget': self.token_budget,
+        }
+        return prompt, report
+
+
+def format_report(report):
+    sections = ', '.join(f'{name} {tokens}' for name, tokens in report['sections'].items())
+    line = f"{report['total']}/{report['budget']} tokens ({sections})"
+    if report['omitted_rows']:
+        line += '; rows left out: ' + ', '.join(f'{name} {n}' for name, n in report['omitted_rows'].items())
+    return line
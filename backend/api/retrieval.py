@@ -0,0 +1,284 @@
+"""
+Local BM25 retrieval over the license data, for the chatbot's prompt.
+
+Every software, user, department, license request and issue is indexed as a
+one-line text record. search() scores the records against a question with
+BM25 and returns the best ones that fit a token budget, so the prompt only
+carries the rows the question is about. Everything runs in-process.
+
+Each worker keeps its own index and keeps it current through the data
+versions (api/versions.py): when a version moved, the index reads the change
+log for the pks that changed and re-indexes just those rows, falling back
+to reloading that kind of record if the log is incomplete (bulk writes).
+Requests and issues also show their user's name and department (and a
+request its software's name), so a change to a user or software re-indexes
+the records that point at it.
+
+With a per-process cache (see versions.cache_is_shared) another worker's
+changes never move this worker's versions, so the index is reloaded
+whole every LOCAL_RELOAD_INTERVAL instead and is at most that far behind.
+"""
+import math
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.contrib.auth.models import User
+from django.db.models import F
+
+from .models import DepartmentRollup, IssueReport, LicenseRequest, SaaSApplication
+from .prompt_encoder import count_tokens
+from .versions import cache_is_shared, get_changes, get_versions
+
+BM25_K1 = 1.5
+BM25_B = 0.75
+DEFAULT_TOKEN_BUDGET = 1500
+LOCAL_RELOAD_INTERVAL = 60
+
+TOKEN_RE = re.compile(r'[a-z0-9]+')
+STOP_WORDS = frozenset(
+    'a an and are as at be by do does for from has have how i in is it me my of on or '
+    'our show tell that the their there this to us was we what when which who why with'.split()
+)
+
+
+def tokenize(text):
+    return [t for t in TOKEN_RE.findall(text.lower()) if t not in STOP_WORDS]
+
+
+# --- RECORD SOURCES ---
+# Each one returns {doc_id: text} for the given pks (or all rows if pks is None).
+
+def _filtered(queryset, pks):
+    return queryset if pks is None else queryset.filter(pk__in=pks)
+
+
+def software_records(pks=None):
+    rows = _filtered(SaaSApplication.objects.all(), pks).values(
+        'id', 'name', 'vendor', 'category', 'description', 'license_mode',
+        'total_licenses', 'monthly_cost', 'renewal_date'
+    )
+    return {
+        f"software:{r['id']}": (
+            f"Software {r['name']} by {r['vendor']} ({r['category']}, {r['license_mode'].lower()} seats): "
+            f"{r['total_licenses']} licenses, ${r['monthly_cost']}/month, renews {r['renewal_date']}. "
+            f"{r['description'] or ''}"
+        ).strip()
+        for r in rows.iterator(chunk_size=2000)
+    }
+
+
+def user_records(pks=None):
+    rows = _filtered(User.objects.all(), pks).values(
+        'id', 'username', 'email', 'first_name', 'last_name', 'is_active',
+        department=F('profile__department'), role=F('profile__role'),
+    )
+    return {
+        f"user:{r['id']}": (
+            f"User {r['username']} ({' '.join(filter(None, [r['first_name'], r['last_name']])) or 'no name'}, "
+            f"{r['email'] or 'no email'}): role {r['role'] or 'none'}, "
+            f"department {r['department'] or 'none'}, {'active' if r['is_active'] else 'inactive'}."
+        )
+        for r in rows.iterator(chunk_size=2000)
+    }
+
+
+def request_records(pks=None):
+    rows = _filtered(LicenseRequest.objects.all(), pks).values(
+        'id', 'request_type', 'status', 'approval_level', 'over_budget', 'reason', 'created_at',
+        username=F('user__username'), department=F('user__profile__department'),
+        software_name=F('software__name'),
+    )
+    return {
+        f"request:{r['id']}": (
+            f"License request #{r['id']}: {r['request_type']} {r['software_name']} for {r['username']} "
+            f"(department {r['department'] or 'none'}), {r['status'].lower()}"
+            f"{', waiting for ' + r['approval_level'].lower().replace('_', ' ') if r['status'] == 'PENDING' else ''}"
+            f"{', over budget' if r['over_budget'] else ''}, created {r['created_at']:%Y-%m-%d}. "
+            f"{(r['reason'] or '')[:200]}"
+        ).strip()
+        for r in rows.iterator(chunk_size=2000)
+    }
+
+
+def issue_records(pks=None):
+    rows = _filtered(IssueReport.objects.all(), pks).values(
+        'id', 'software_name', 'issue_type', 'status', 'description', 'created_at',
+        username=F('reported_by__username'), department=F('reported_by__profile__department'),
+    )
+    return {
+        f"issue:{r['id']}": (
+            f"Issue #{r['id']} with {r['software_name']} ({r['issue_type'].lower()}), {r['status'].lower()}, "
+            f"reported by {r['username']} (department {r['department'] or 'none'}) on {r['created_at']:%Y-%m-%d}. "
+            f"{(r['description'] or '')[:200]}"
+        ).strip()
+        for r in rows.iterator(chunk_size=2000)
+    }
+
+
+def department_records(pks=None):
+    names = dict(SaaSApplication.objects.values_list('id', 'name'))
+    records = {}
+    for rollup in DepartmentRollup.objects.order_by('department_key'):
+        software = sorted(names.get(int(key), key) for key in rollup.software_counts)
+        records[f"department:{rollup.department_key}"] = (
+            f"Department {rollup.department_key}: {rollup.team_size} members, "
+            f"{rollup.approved_grants} licenses granted, ${rollup.monthly_spend}/month, "
+            f"uses {', '.join(software) or 'no software'}."
+        )
+    return records
+
+
+# kind -> (loader, data versions it depends on, whether the change log lists its pks)
+SOURCES = {
+    'software': (software_records, ('catalog',), True),
+    'user': (user_records, ('users',), True),
+    'request': (request_records, ('license-requests', 'users', 'catalog'), True),
+    'issue': (issue_records, ('issues', 'users'), True),
+    # Few rows that depend on several tables; simply reloaded when any changes
+    'department': (department_records, ('rollups', 'users', 'catalog'), False),
+}
+
+# For the versions a logged kind depends on besides its own: (model, field holding the changed pk)
+RELATED = {
+    'request': {'users': (LicenseRequest, 'user_id'), 'catalog': (LicenseRequest, 'software_id')},
+    'issue': {'users': (IssueReport, 'reported_by_id')},
+}
+
+
+class BM25Index:
+    """An inverted index with BM25 scoring that supports adding and removing documents."""
+
+    def __init__(self):
+        self.docs = {}
+        self.lengths = {}
+        self.postings = defaultdict(dict)
+        self.total_length = 0
+
+    def remove(self, doc_id):
+        if doc_id not in self.docs:
+            return
+        for term in set(tokenize(self.docs.pop(doc_id))):
+            postings = self.postings[term]
+            postings.pop(doc_id, None)
+            if not postings:
+                del self.postings[term]
+        self.total_length -= self.lengths.pop(doc_id)
+
+    def upsert(self, doc_id, text):
+        self.remove(doc_id)
+        terms = tokenize(text)
+        self.docs[doc_id] = text
+        self.lengths[doc_id] = len(terms)
+        self.total_length += len(terms)
+        for term, count in Counter(terms).items():
+            self.postings[term][doc_id] = count
+
+    def scores(self, query):
+        n = len(self.docs)
+        if not n:
+            return {}
+        average_length = self.total_length / n or 1
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            postings = self.postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            for doc_id, tf in postings.items():
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[doc_id] / average_length)
+                scores[doc_id] += idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores
+
+
+class RetrievalIndex:
+    def __init__(self):
+        self._index = BM25Index()
+        self._doc_ids = defaultdict(set)
+        self._applied = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def _load(self, kind, pks=None):
+        loader = SOURCES[kind][0]
+        records = loader(pks)
+        stale = self._doc_ids[kind] if pks is None else {f'{kind}:{pk}' for pk in pks}
+        for doc_id in stale - set(records):
+            self._index.remove(doc_id)
+            self._doc_ids[kind].discard(doc_id)
+        for doc_id, text in records.items():
+            self._index.upsert(doc_id, text)
+            self._doc_ids[kind].add(doc_id)
+
+    def _changed_pks(self, kind, depends_on, applied, current):
+        """The pks of `kind` to re-index, or None if a change log is incomplete."""
+        pks = set()
+        for name, since, until in zip(depends_on, applied, current):
+            if since == until:
+                continue
+            changes = get_changes(name, since, until)
+            if changes is None:
+                return None
+            if name == depends_on[0]:
+                pks.update(changes)
+            else:
+                model, field = RELATED[kind][name]
+                pks.update(model.objects.filter(**{f'{field}__in': changes}).values_list('pk', flat=True))
+        return pks
+
+    def sync(self):
+        """Brings the index up to date with the data versions (one cache read when nothing changed)."""
+        names = sorted({v for _, depends_on, _ in SOURCES.values() for v in depends_on})
+        versions = get_versions(names)
+        with self._lock:
+            if not cache_is_shared():
+                now = time.monotonic()
+                if self._loaded_at is None or now - self._loaded_at >= LOCAL_RELOAD_INTERVAL:
+                    # Versions here don't see other workers' changes: reload everything
+                    self._applied.clear()
+                    self._loaded_at = now
+            for kind, (_, depends_on, logged) in SOURCES.items():
+                current = tuple(versions[name] for name in depends_on)
+                applied = self._applied.get(kind)
+                if applied == current:
+                    continue
+                pks = None
+                if applied is not None and logged:
+                    pks = self._changed_pks(kind, depends_on, applied, current)
+                if pks is None:
+                    self._load(kind)
+                elif pks:
+                    self._load(kind, pks)
+                self._applied[kind] = current
+
+    def search(self, question, token_budget=DEFAULT_TOKEN_BUDGET, limit=50, kinds=None):
+        """
+        Returns the text of the records most relevant to `question`, best
+        first, as many as fit in `token_budget`.
+        """
+        self.sync()
+        with self._lock:
+            scores = self._index.scores(question)
+            if kinds:
+                scores = {d: s for d, s in scores.items() if d.split(':', 1)[0] in kinds}
+            ranked = sorted(scores, key=lambda d: (-scores[d], d))[:limit]
+            texts = [self._index.docs[doc_id] for doc_id in ranked]
+
+        selected = []
+        used = 0
+        for text in texts:
+            cost = count_tokens(text) + 2  # plus the list marker and newline
+            if used + cost > token_budget:
+                continue
+            selected.append(text)
+            used += cost
+        return selected
+
+
+_retrieval_index = RetrievalIndex()
+
+
+def search(question, token_budget=DEFAULT_TOKEN_BUDGET, limit=50, kinds=None):
+    """Searches this worker's index (see RetrievalIndex.search)."""
+    return _retrieval_index.search(question, token_budget=token_budget, limit=limit, kinds=kinds)
@@ -0,0 +1,175 @@
+"""
+Incremental maintenance of the DepartmentRollup table.
+
+Every function here applies a small delta to one or more rollup rows while
+holding a row lock, so callers should run them inside the same transaction
+as the change they describe.
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Count, F
+
+from tenants.models import Profile
+from .models import DepartmentRollup, SaaSApplication, UserLicense
+from .versions import bump_version_on_commit
+
+
+def department_key_for_user(user_id):
+    """Returns the normalized department of a user, or None."""
+    return Profile.objects.filter(user_id=user_id).values_list('department_key', flat=True).first()
+
+
+def _software_cost(software_id):
+    cost = SaaSApplication.objects.filter(pk=software_id).values_list('monthly_cost', flat=True).first()
+    return cost if cost is not None else Decimal('0')
+
+
+def _locked_rollup(department_key):
+    rollup, _ = DepartmentRollup.objects.select_for_update().get_or_create(department_key=department_key)
+    return rollup
+
+
+def apply_grant_delta(department_key, software_id, delta):
+    """
+    Adds (delta > 0) or removes (delta < 0) approved grants of one software
+    to a department, updating the distinct software set and monthly spend.
+    """
+    if not department_key or not delta:
+        return
+
+    with transaction.atomic():
+        rollup = _locked_rollup(department_key)
+        key = str(software_id)
+        before = rollup.software_counts.get(key, 0)
+        after = max(before + delta, 0)
+
+        if after:
+            rollup.software_counts[key] = after
+        else:
+            rollup.software_counts.pop(key, None)
+
+        # Spend only changes when the software enters or leaves the set
+        if before == 0 and after > 0:
+            rollup.monthly_spend += _software_cost(software_id)
+        elif before > 0 and after == 0:
+            rollup.monthly_spend = max(rollup.monthly_spend - _software_cost(software_id), Decimal('0'))
+
+        rollup.approved_grants = max(rollup.approved_grants + (after - before), 0)
+        rollup.save()
+
+
+def apply_team_delta(department_key, delta):
+    """Adds or removes team members from a department."""
+    if not department_key or not delta:
+        return
+
+    with transaction.atomic():
+        rollup = _locked_rollup(department_key)
+        rollup.team_size = max(rollup.team_size + delta, 0)
+        rollup.save(update_fields=['team_size', 'updated_at'])
+
+
+def move_user(user_id, old_key, new_key):
+    """
+    Moves a user and all of their licenses from one department to another.
+    Either key may be None (user had / gets no department).
+    """
+    if old_key == new_key:
+        return
+
+    grants = UserLicense.objects.filter(user_id=user_id).values('software_id').annotate(n=Count('id'))
+
+    with transaction.atomic():
+        apply_team_delta(old_key, -1)
+        apply_team_delta(new_key, 1)
+        for row in grants:
+            apply_grant_delta(old_key, row['software_id'], -row['n'])
+            apply_grant_delta(new_key, row['software_id'], row['n'])
+
+
+def apply_cost_change(software_id, old_cost, new_cost):
+    """Re-prices a software in every department that currently uses it."""
+    delta = Decimal(str(new_cost or 0)) - Decimal(str(old_cost or 0))
+    if not delta:
+        return
+
+    DepartmentRollup.objects.filter(
+        software_counts__has_key=str(software_id)
+    ).update(monthly_spend=F('monthly_spend') + delta)
+
+
+ROLLUP_FIELDS = ('team_size', 'approved_grants', 'software_counts', 'monthly_spend')
+
+
+def _empty_rollup():
+    return {
+        'team_size': 0,
+        'approved_grants': 0,
+        'software_counts': {},
+        'monthly_spend': Decimal('0'),
+    }
+
+
+def compute_rollups():
+    """
+    Computes every department's rollup from the live tables.
+    Returns a dict of department_key -> field values.
+    """
+    rollups = defaultdict(_empty_rollup)
+
+    user_departments = {}
+    for user_id, key in Profile.objects.values_list('user_id', 'department_key'):
+        if key:
+            user_departments[user_id] = key
+            rollups[key]['team_size'] += 1
+
+    grants = UserLicense.objects.values('user_id', 'software_id').annotate(n=Count('id'))
+
+    for row in grants:
+        key = user_departments.get(row['user_id'])
+        if not key:
+            continue
+        counts = rollups[key]['software_counts']
+        software_key = str(row['software_id'])
+        counts[software_key] = counts.get(software_key, 0) + row['n']
+        rollups[key]['approved_grants'] += row['n']
+
+    costs = dict(SaaSApplication.objects.values_list('id', 'monthly_cost'))
+    for data in rollups.values():
+        data['monthly_spend'] = sum(
+            (costs.get(int(software_id), Decimal('0')) for software_id in data['software_counts']),
+            Decimal('0')
+        )
+
+    return dict(rollups)
+
+
+def rebuild_rollups(dry_run=False):
+    """
+    Rebuilds the rollup table from scratch.
+    Returns a list of (department_key, field, stored_value, live_value) drift entries.
+    """
+    live = compute_rollups()
+    drift = []
+
+    with transaction.atomic():
+        stored = {r.department_key: r for r in DepartmentRollup.objects.select_for_update()}
+
+        for key in sorted(set(stored) | set(live)):
+            row = stored.get(key)
+            expected = live.get(key) or _empty_rollup()
+            for field in ROLLUP_FIELDS:
+                stored_value = getattr(row, field) if row else _empty_rollup()[field]
+                live_value = expected[field]
+                if stored_value != live_value:
+                    drift.append((key, field, stored_value, live_value))
+
+        if not dry_run:
+            DepartmentRollup.objects.exclude(department_key__in=list(live)).delete()
+            for key, values in live.items():
+                DepartmentRollup.objects.update_or_create(department_key=key, defaults=values)
+            bump_version_on_commit('rollups')
+
+    return drift
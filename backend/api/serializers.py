@@ -1,7 +1,11 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from tenants.models import Profile
-from .models import SaaSApplication, LicenseRequest, IssueReport
+from tenants.models import Profile, normalize_department
+from .models import SaaSApplication, LicenseRequest, IssueReport, UserLicense
+from .catalog import get_or_create_software, resolve_software_id
+from django.db import IntegrityError, transaction
+from django.db.models import Count, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
 from datetime import date
 
 class RegisterSerializer(serializers.ModelSerializer):
@@ -32,7 +36,7 @@ class RegisterSerializer(serializers.ModelSerializer):
             # Check if this department already has a head (case-insensitive)
             existing_head = Profile.objects.filter(
                 role='DEPT_HEAD',
-                department__iexact=department
+                department_key=normalize_department(department)
             ).first()
             
             if existing_head:
@@ -66,6 +70,18 @@ class UserProfileSerializer(serializers.ModelSerializer):
         model = Profile
         fields = ['username', 'email', 'role', 'department']
 
+def approved_licenses_count_subquery():
+    """
+    A subquery annotation with the number of licenses each user holds,
+    so a whole list of users can be counted in one query.
+    """
+    counts = UserLicense.objects.filter(
+        user=OuterRef('pk')
+    ).order_by().values('user').annotate(
+        count=Count('id')
+    ).values('count')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
 class UserSerializer(serializers.ModelSerializer):
     role = serializers.CharField(source='profile.role', read_only=True)
     department = serializers.CharField(source='profile.department', read_only=True)
@@ -77,11 +93,10 @@ class UserSerializer(serializers.ModelSerializer):
     
     def get_licenses_count(self, obj):
         """Get count of approved licenses for this user"""
-        return LicenseRequest.objects.filter(
-            user=obj,
-            request_type='GRANT',
-            status='APPROVED'
-        ).values('software_id').distinct().count()
+        # UserListView annotates the count onto the queryset, so use it when present
+        if hasattr(obj, 'approved_licenses_count'):
+            return obj.approved_licenses_count
+        return UserLicense.objects.filter(user=obj).count()
 
 class LicenseSerializer(serializers.Serializer):
     """Simple serializer for license information"""
@@ -100,26 +115,47 @@ class UserWithLicensesSerializer(serializers.ModelSerializer):
     
     def get_licenses(self, obj):
         """Get all approved license requests for this user"""
-        # Get unique software IDs for approved GRANT requests
-        approved_software_ids = LicenseRequest.objects.filter(
-            user=obj,
-            request_type='GRANT',
-            status='APPROVED'
-        ).values_list('software_id', flat=True).distinct()
-        
-        # Get the software objects
-        from .models import SaaSApplication
-        software_list = SaaSApplication.objects.filter(id__in=approved_software_ids)
+        # List views pass a pre-loaded map for the whole page (see api/loaders.py)
+        license_map = self.context.get('license_map')
+        if license_map is not None and obj.pk in license_map:
+            return license_map[obj.pk]
         
+        # Read the user's current licenses from the entitlement table
         return [
-            {'id': software.id, 'name': software.name}
-            for software in software_list
+            {'id': software_id, 'name': name}
+            for software_id, name in UserLicense.objects.filter(user=obj).order_by(
+                'software_id'
+            ).values_list('software_id', 'software__name')
         ]
 
 class SaaSApplicationSerializer(serializers.ModelSerializer):
+    seats_available = serializers.IntegerField(read_only=True)
+    
     class Meta:
         model = SaaSApplication
         fields = '__all__'
+    
+    def validate_name(self, value):
+        """Software names must be unique, ignoring case and surrounding spaces"""
+        existing_id = resolve_software_id(value)
+        if existing_id and (self.instance is None or existing_id != self.instance.pk):
+            raise serializers.ValidationError(f"Software '{value.strip()}' already exists in the inventory.")
+        return value
+    
+    def _save_unique(self, save, *args):
+        # The unique name_key index has the last word if the name was taken meanwhile
+        try:
+            with transaction.atomic():
+                return save(*args)
+        except IntegrityError:
+            name = str(self.validated_data.get('name', '')).strip()
+            raise serializers.ValidationError({'name': [f"Software '{name}' already exists in the inventory."]})
+    
+    def create(self, validated_data):
+        return self._save_unique(super().create, validated_data)
+    
+    def update(self, instance, validated_data):
+        return self._save_unique(super().update, instance, validated_data)
 
 class LicenseRequestSerializer(serializers.ModelSerializer):
     software_name = serializers.CharField(write_only=True, required=True)
@@ -127,20 +163,24 @@ class LicenseRequestSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = LicenseRequest
-        fields = ['id', 'request_type', 'status', 'user', 'software', 'software_name', 'reason', 'requested_by', 'created_at', 'approval_level']
-        read_only_fields = ['status', 'created_at', 'software', 'requested_by', 'approval_level']
+        fields = ['id', 'request_type', 'status', 'user', 'software', 'software_name', 'reason', 'requested_by', 'created_at', 'approval_level', 'over_budget']
+        read_only_fields = ['status', 'created_at', 'software', 'requested_by', 'approval_level', 'over_budget']
     
     def create(self, validated_data):
         software_name = validated_data.pop('software_name')
         
-        # Use filter().first() to handle duplicates gracefully
-        software_instance = SaaSApplication.objects.filter(name__iexact=software_name).first()
+        # Resolved from the in-memory catalog (see api/catalog.py)
+        software_id = resolve_software_id(software_name)
         
-        if not software_instance:
+        if not software_id:
             raise serializers.ValidationError({"detail": f"Software '{software_name}' not found in the inventory."})
         
-        license_request = LicenseRequest.objects.create(software=software_instance, **validated_data)
-        return license_request
+        try:
+            with transaction.atomic():
+                return LicenseRequest.objects.create(software_id=software_id, **validated_data)
+        except IntegrityError:
+            # The software was deleted after it was resolved
+            raise serializers.ValidationError({"detail": f"Software '{software_name}' not found in the inventory."})
 
 class UserLicenseRequestSerializer(serializers.ModelSerializer):
     """
@@ -151,8 +191,8 @@ class UserLicenseRequestSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = LicenseRequest
-        fields = ['id', 'request_type', 'status', 'user', 'software', 'software_name', 'reason', 'requested_by', 'created_at', 'approval_level']
-        read_only_fields = ['status', 'created_at', 'software', 'requested_by', 'user', 'request_type', 'approval_level']
+        fields = ['id', 'request_type', 'status', 'user', 'software', 'software_name', 'reason', 'requested_by', 'created_at', 'approval_level', 'over_budget']
+        read_only_fields = ['status', 'created_at', 'software', 'requested_by', 'user', 'request_type', 'approval_level', 'over_budget']
     
     def create(self, validated_data):
         software_name = validated_data.pop('software_name')
@@ -160,22 +200,22 @@ class UserLicenseRequestSerializer(serializers.ModelSerializer):
         # Set request_type to GRANT by default for user requests
         validated_data['request_type'] = 'GRANT'
         
-        # Use filter().first() to handle duplicates gracefully
-        software_instance = SaaSApplication.objects.filter(name__iexact=software_name).first()
-        
-        if not software_instance:
-            # Auto-create software if it doesn't exist
-            software_instance = SaaSApplication.objects.create(
-                name=software_name,
-                vendor='Unknown',
-                category='Other',
-                total_licenses=1,
-                monthly_cost=0.00,
-                renewal_date=date(2025, 12, 31)
-            )
+        # Resolve from the in-memory catalog, or auto-create the software if it doesn't exist.
+        # Concurrent requests for the same new name end up sharing one row.
+        software_id = get_or_create_software(software_name, defaults={
+            'vendor': 'Unknown',
+            'category': 'Other',
+            'total_licenses': 1,
+            'monthly_cost': 0.00,
+            'renewal_date': date(2025, 12, 31)
+        })
         
-        license_request = LicenseRequest.objects.create(software=software_instance, **validated_data)
-        return license_request
+        try:
+            with transaction.atomic():
+                return LicenseRequest.objects.create(software_id=software_id, **validated_data)
+        except IntegrityError:
+            # The software was deleted after it was resolved
+            raise serializers.ValidationError({"detail": f"Software '{software_name}' not found in the inventory."})
 
 class IssueReportSerializer(serializers.ModelSerializer):
     """
@@ -0,0 +1,212 @@
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.contrib.auth.models import User
+from django.core.signals import request_started
+from django.db import transaction
+from django.dispatch import receiver
+
+from tenants.models import Profile
+from .models import DepartmentBudget, IssueReport, LicenseRequest, SaaSApplication, UserLicense
+from . import entitlements, rollups
+from .dashboard import invalidate_dashboard_snapshot, warm_dashboard_snapshot
+from .catalog import invalidate_catalog
+from .versions import bump_version_on_commit
+from .authentication import revoke_claims
+
+
+# --- LICENSE REQUESTS ---
+@receiver(pre_save, sender=LicenseRequest)
+def remember_previous_status(sender, instance, **kwargs):
+    """Stores the status before this save so post_save can spot a new approval."""
+    instance._previous_status = None
+    if instance._state.adding or not instance.pk:
+        return
+    instance._previous_status = LicenseRequest.objects.filter(
+        pk=instance.pk
+    ).values_list('status', flat=True).first()
+
+
+@receiver(post_save, sender=LicenseRequest)
+def update_entitlements_for_request(sender, instance, **kwargs):
+    """
+    Applies a GRANT or REVOKE to the entitlement table when it is approved,
+    and undoes it when an approved request is changed to another status.
+    The department rollups follow through the UserLicense signals below.
+    """
+    approved = LicenseRequest.RequestStatus.APPROVED
+    previous_status = getattr(instance, '_previous_status', None)
+    if instance.status == approved and previous_status != approved:
+        entitlements.apply_approved_request(instance)
+    elif previous_status == approved and instance.status != approved:
+        entitlements.withdraw_approval(instance.user_id, instance.software_id)
+    instance._previous_status = instance.status
+
+
+@receiver(post_delete, sender=LicenseRequest)
+def withdraw_deleted_approval(sender, instance, origin=None, **kwargs):
+    """
+    Undoes an approved request that is deleted on its own. When the user or
+    the software is deleted instead, the cascade removes their licenses too.
+    """
+    if instance.status != LicenseRequest.RequestStatus.APPROVED:
+        return
+    if not (isinstance(origin, LicenseRequest) or getattr(origin, 'model', None) is LicenseRequest):
+        return
+    entitlements.withdraw_approval(instance.user_id, instance.software_id)
+
+
+# --- ENTITLEMENTS ---
+@receiver(post_save, sender=UserLicense)
+def add_license_to_rollup(sender, instance, created, **kwargs):
+    if created:
+        rollups.apply_grant_delta(rollups.department_key_for_user(instance.user_id), instance.software_id, 1)
+
+
+@receiver(pre_delete, sender=UserLicense)
+def remember_deleted_license(sender, instance, **kwargs):
+    # Look the department up now; the profile may be deleted in the same cascade.
+    instance._rollup_department_key = rollups.department_key_for_user(instance.user_id)
+
+
+@receiver(post_delete, sender=UserLicense)
+def remove_license_from_rollup(sender, instance, **kwargs):
+    department_key = getattr(instance, '_rollup_department_key', None)
+    rollups.apply_grant_delta(department_key, instance.software_id, -1)
+    entitlements.release_seat(instance.software_id)
+
+
+# --- PROFILES ---
+@receiver(pre_save, sender=Profile)
+def remember_previous_department(sender, instance, **kwargs):
+    instance._previous_department_key = None
+    instance._previous_claims = None
+    if instance._state.adding or not instance.pk:
+        return
+    previous = Profile.objects.filter(pk=instance.pk).values_list('department_key', 'role').first()
+    if previous:
+        instance._previous_department_key = previous[0]
+        instance._previous_claims = previous
+
+
+@receiver(post_save, sender=Profile)
+def update_rollup_for_profile(sender, instance, created, **kwargs):
+    """
+    Moves the user (and their approved grants) between department rollups
+    when their department changes.
+    """
+    new_key = instance.department_key
+    if created:
+        rollups.apply_team_delta(new_key, 1)
+    else:
+        rollups.move_user(instance.user_id, getattr(instance, '_previous_department_key', None), new_key)
+    instance._previous_department_key = new_key
+
+
+@receiver(post_delete, sender=Profile)
+def remove_profile_from_rollup(sender, instance, **kwargs):
+    # The user's grants are removed by their own delete signals.
+    rollups.apply_team_delta(instance.department_key, -1)
+
+
+# --- SOFTWARE ---
+@receiver(pre_save, sender=SaaSApplication)
+def remember_previous_cost(sender, instance, **kwargs):
+    instance._previous_monthly_cost = None
+    if instance._state.adding or not instance.pk:
+        return
+    instance._previous_monthly_cost = SaaSApplication.objects.filter(
+        pk=instance.pk
+    ).values_list('monthly_cost', flat=True).first()
+
+
+@receiver(post_save, sender=SaaSApplication)
+def update_rollup_for_cost(sender, instance, created, **kwargs):
+    """Re-prices department spend when a software's monthly cost changes."""
+    if created:
+        return
+    previous = getattr(instance, '_previous_monthly_cost', None)
+    if previous is not None:
+        rollups.apply_cost_change(instance.pk, previous, instance.monthly_cost)
+    instance._previous_monthly_cost = instance.monthly_cost
+
+
+# --- DASHBOARD SNAPSHOT ---
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+@receiver(post_save, sender=SaaSApplication)
+@receiver(post_delete, sender=SaaSApplication)
+def invalidate_dashboard(sender, update_fields=None, **kwargs):
+    """Any change to users, departments or the catalog makes the dashboard stale."""
+    # Logging in only touches last_login, which the dashboard doesn't show
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    # Wait for the commit so a concurrent read can't re-cache the old data
+    transaction.on_commit(invalidate_dashboard_snapshot)
+
+
+@receiver(request_started, dispatch_uid='warm-dashboard-snapshot')
+def warm_dashboard_on_first_request(sender, **kwargs):
+    """Warms the snapshot once per worker, on its first request rather than at import."""
+    request_started.disconnect(dispatch_uid='warm-dashboard-snapshot')
+    warm_dashboard_snapshot()
+
+
+# --- SOFTWARE CATALOG ---
+@receiver(post_save, sender=SaaSApplication)
+@receiver(post_delete, sender=SaaSApplication)
+def invalidate_catalog_cache(sender, instance, **kwargs):
+    """Tells every worker to reload its in-memory catalog once the change is committed."""
+    software_id = instance.pk
+    transaction.on_commit(lambda: invalidate_catalog(software_id))
+
+
+# --- DATA VERSIONS (ETags, see api/conditional.py) ---
+@receiver(post_save, sender=LicenseRequest)
+@receiver(post_delete, sender=LicenseRequest)
+def bump_license_requests_version(sender, instance, **kwargs):
+    bump_version_on_commit('license-requests', changed=instance.pk)
+
+
+@receiver(post_save, sender=IssueReport)
+@receiver(post_delete, sender=IssueReport)
+def bump_issues_version(sender, instance, **kwargs):
+    bump_version_on_commit('issues', changed=instance.pk)
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def bump_users_version(sender, instance, update_fields=None, **kwargs):
+    if update_fields and set(update_fields) == {'last_login'}:
+        return
+    bump_version_on_commit('users', changed=instance.user_id if sender is Profile else instance.pk)
+
+
+@receiver(post_save, sender=UserLicense)
+@receiver(post_delete, sender=UserLicense)
+@receiver(post_save, sender=DepartmentBudget)
+@receiver(post_delete, sender=DepartmentBudget)
+def bump_rollups_version(sender, **kwargs):
+    """Department stats read the rollups (which follow UserLicense) and budgets."""
+    bump_version_on_commit('rollups')
+
+
+# --- TOKEN CLAIMS (see api/authentication.py) ---
+@receiver(post_save, sender=Profile)
+def revoke_stale_claims(sender, instance, created, **kwargs):
+    """Tokens carry the role and department, so changing either revokes them."""
+    previous = getattr(instance, '_previous_claims', None)
+    instance._previous_claims = (instance.department_key, instance.role)
+    if created or previous is None or previous == instance._previous_claims:
+        return
+    user_id = instance.user_id
+    transaction.on_commit(lambda: revoke_claims(user_id))
+
+
+@receiver(post_save, sender=User)
+def revoke_claims_of_inactive_user(sender, instance, created, **kwargs):
+    if not created and not instance.is_active:
+        user_id = instance.pk
+        transaction.on_commit(lambda: revoke_claims(user_id))
@@ -0,0 +1,37 @@
+"""
+Streaming response bodies that stream under both WSGI and ASGI.
+
+Django's StreamingHttpResponse buffers a sync iterator whole before sending
+it under ASGI, and an async iterator under WSGI. streaming_body() hands it
+the kind the server can stream: under ASGI the sync iterator is wrapped in
+an async one that pulls each chunk in the request's thread (where its
+database cursor lives), so the first chunk goes out as soon as it's read.
+"""
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+
+_DONE = object()
+
+
+async def aiter_in_thread(chunks):
+    """Yields the chunks of a sync iterator, reading each one with sync_to_async."""
+    iterator = iter(chunks)
+    read = sync_to_async(next, thread_sensitive=True)
+    try:
+        while True:
+            chunk = await read(iterator, _DONE)
+            if chunk is _DONE:
+                return
+            yield chunk
+    finally:
+        # Closes the generator (and its cursor) if the client went away early
+        close = getattr(iterator, 'close', None)
+        if close is not None:
+            await sync_to_async(close, thread_sensitive=True)()
+
+
+def streaming_body(request, chunks):
+    """The chunks as StreamingHttpResponse should get them for the server `request` came from."""
+    if isinstance(getattr(request, '_request', request), ASGIRequest):
+        return aiter_in_thread(chunks)
+    return chunks
@@ -0,0 +1,628 @@
+import asyncio
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import request_started
+from django.db import connection, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+
+from api import llm
+from api.answer_cache import LOCAL_TTL_SECONDS, AnswerCache
+from api.authentication import issue_access_token
+from api.catalog import resolve_software_id
+from api.chat_context import LOCAL_SECTION_TIMEOUT, get_chat_context
+from api.dashboard import compute_dashboard_stats, warm_dashboard_snapshot
+from api.entitlements import SeatCapacityError, rebuild_entitlements, reserve_seat
+from api.exports import stream_ndjson
+from api.fake_llm import FakeLLMServer, fake_answer
+from api.inventory import summarize_inventory
+from api.leases import MAX_TTL
+from api.models import AIRecommendation, DepartmentRollup, LicenseLease, LicenseRequest, SaaSApplication, UserLicense
+from api.retrieval import LOCAL_RELOAD_INTERVAL, RetrievalIndex
+from api.signals import warm_dashboard_on_first_request
+from api.tasks import run_license_optimization_task
+from api.versions import get_version
+
+STREAM_URL = '/api/license-chatbot/stream/'
+
+
+def parse_events(body):
+    """The (event, data) pairs of a Server-Sent Events response body."""
+    events = []
+    for block in body.decode().split('\n\n'):
+        if block.strip():
+            fields = dict(line.split(': ', 1) for line in block.splitlines())
+            events.append((fields['event'], json.loads(fields['data'])))
+    return events
+
+
+@override_settings(LLM_PROVIDER='cohere')
+class LicenseChatbotStreamTests(TestCase):
+    """Drives the streaming chatbot view against the local fake LLM server (api/fake_llm.py)."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('alice', password='unused')
+
+    def setUp(self):
+        cache.clear()
+        self.headers = {'Authorization': f'Bearer {issue_access_token(self.user)}'}
+        # A fresh breaker and no retries, so one test's failures can't slow down or short-circuit another
+        for name, value in (('breaker', llm.CircuitBreaker()), ('max_retries', 0)):
+            patcher = mock.patch.object(llm.client, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def ask(self, server, question, session_id=None):
+        with mock.patch.dict(os.environ, {'CO_API_URL': server.url, 'CO_API_KEY': 'fake-key'}):
+            response = await self.async_client.post(
+                STREAM_URL, {'question': question, 'session_id': session_id},
+                content_type='application/json', headers=self.headers,
+            )
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response['Content-Type'], 'text/event-stream')
+            body = b''.join([chunk async for chunk in response.streaming_content])
+        return parse_events(body)
+
+    async def test_streams_tokens_then_done(self):
+        server = await FakeLLMServer(token_delay=0).start()
+        try:
+            events = await self.ask(server, 'Which software renews soon?')
+        finally:
+            await server.close()
+
+        names = [name for name, _ in events]
+        self.assertEqual(names[-1], 'done')
+        self.assertGreater(names.count('token'), 1)
+        answer = ''.join(data['text'] for name, data in events if name == 'token')
+        self.assertEqual(answer.strip(), fake_answer('USER QUESTION: Which software renews soon?'))
+        self.assertEqual(events[-1][1]['cached'], False)
+        self.assertEqual(events[-1][1]['turn'], 1)
+
+    async def test_repeat_question_is_answered_from_cache(self):
+        server = await FakeLLMServer(token_delay=0).start()
+        try:
+            await self.ask(server, 'What is our total monthly cost?')
+            requests = server.requests
+            events = await self.ask(server, 'what is our total monthly cost')
+        finally:
+            await server.close()
+
+        self.assertEqual(server.requests, requests)
+        self.assertEqual([name for name, _ in events], ['token', 'done'])
+        self.assertEqual(events[-1][1]['cached'], True)
+
+    async def test_follow_up_continues_the_session(self):
+        server = await FakeLLMServer(token_delay=0).start()
+        try:
+            first = await self.ask(server, 'Who uses the most licenses?')
+            session_id = first[-1][1]['session_id']
+            follow_up = await self.ask(server, 'And in which department?', session_id=session_id)
+        finally:
+            await server.close()
+
+        self.assertEqual(follow_up[-1][0], 'done')
+        self.assertEqual(follow_up[-1][1]['session_id'], session_id)
+        self.assertEqual(follow_up[-1][1]['turn'], 2)
+
+    async def test_provider_failure_ends_with_error_event(self):
+        server = await FakeLLMServer(token_delay=0, error_rate=1.0).start()
+        try:
+            events = await self.ask(server, 'How many users per department?')
+        finally:
+            await server.close()
+
+        self.assertEqual([name for name, _ in events], ['error'])
+        self.assertIn('503', events[0][1]['error'])
+
+    async def test_requires_authentication(self):
+        response = await self.async_client.post(
+            STREAM_URL, {'question': 'Hi'}, content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 401)
+
+
+class LLMClientTests(TestCase):
+    """The LLM client and the record/replay provider against the local fake LLM server."""
+
+    def setUp(self):
+        # A client of its own, so its pool, retries and breaker start fresh
+        self.client_under_test = llm.LLMClient(
+            connect_timeout=1.0, read_timeout=5.0, max_retries=4, backoff_base=0.01, backoff_max=0.1,
+            breaker=llm.CircuitBreaker(failure_threshold=3, reset_timeout=0.2),
+        )
+        self.addCleanup(self.client_under_test.close)
+
+    def fake_provider(self, server):
+        return mock.patch.dict(os.environ, {'CO_API_URL': server.url, 'CO_API_KEY': 'fake-key'})
+
+    async def test_replays_recorded_answers_without_the_provider(self):
+        question = 'USER QUESTION: Which licenses are unused?'
+        directory = self.enterContext(tempfile.TemporaryDirectory())
+        server = await FakeLLMServer(token_delay=0).start()
+        try:
+            with self.fake_provider(server), mock.patch.object(llm, 'client', self.client_under_test), \
+                    override_settings(LLM_PROVIDER='record', LLM_RECORDINGS_DIR=directory):
+                recorded = await sync_to_async(llm.chat)(question)
+                streamed = [chunk async for chunk in llm.astream_chat(question)]
+        finally:
+            await server.close()
+
+        with override_settings(LLM_PROVIDER='replay', LLM_RECORDINGS_DIR=directory):
+            self.assertEqual(await sync_to_async(llm.chat)(question), recorded)
+            self.assertEqual([chunk async for chunk in llm.astream_chat(question)], streamed)
+            with self.assertRaises(llm.LLMError):
+                await sync_to_async(llm.chat)('USER QUESTION: Never asked before')
+        self.assertEqual(recorded, fake_answer(question))
+        self.assertEqual(server.requests, 2)
+
+    async def test_retries_hide_a_flaky_provider(self):
+        server = await FakeLLMServer(token_delay=0, error_rate=0.3, seed=1).start()
+        try:
+            with self.fake_provider(server):
+                for n in range(20):
+                    await sync_to_async(self.client_under_test.chat)(f'USER QUESTION: check {n}')
+        finally:
+            await server.close()
+
+        stats = self.client_under_test.stats()
+        self.assertEqual(stats['successes'], 20)
+        self.assertGreater(stats['retries'], 0)
+
+    async def test_circuit_opens_during_an_outage_and_closes_after_recovery(self):
+        breaker = self.client_under_test.breaker
+        server = await FakeLLMServer(token_delay=0, error_rate=1.0).start()
+        try:
+            with self.fake_provider(server):
+                for _ in range(breaker.failure_threshold):
+                    with self.assertRaises(llm.LLMError):
+                        await sync_to_async(self.client_under_test.chat)('USER QUESTION: outage')
+                self.assertEqual(breaker.state, 'open')
+                requests = server.requests
+                with self.assertRaises(llm.CircuitOpenError):
+                    await sync_to_async(self.client_under_test.chat)('USER QUESTION: outage')
+                self.assertEqual(server.requests, requests)
+
+                server.error_rate = 0.0
+                await asyncio.sleep(breaker.reset_timeout)
+                await sync_to_async(self.client_under_test.chat)('USER QUESTION: recovered')
+        finally:
+            await server.close()
+        self.assertEqual(breaker.state, 'closed')
+
+
+@override_settings(LLM_PROVIDER='stub', LLM_STUB_LATENCY=0, LLM_STUB_TOKENS_PER_SECOND=0)
+class OfflineProviderTests(TestCase):
+    """The AI endpoints answer through the offline stub, with no network or API key."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('dave', password='unused')
+        SaaSApplication.objects.create(
+            name='Notion', vendor='Notion', category='Docs', total_licenses=4,
+            monthly_cost=Decimal('8.00'), renewal_date=date(2030, 1, 1),
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_chatbot_answers_from_the_stub(self):
+        self.client.force_login(self.user)
+        response = self.client.post(
+            '/api/license-chatbot/', {'question': 'Which software renews soon?'},
+            content_type='application/json', SERVER_NAME='localhost',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(response.json()['answer'].startswith('Error'))
+        self.assertEqual(llm.get_provider().stats()['provider'], 'stub')
+
+    def test_optimization_task_saves_the_stub_recommendations(self):
+        recommendations = run_license_optimization_task()
+        self.assertFalse(recommendations.startswith('Error'))
+        self.assertEqual(AIRecommendation.objects.get().recommendations_text, recommendations)
+
+    @override_settings(LLM_PROVIDER='openai')
+    def test_unknown_provider_is_rejected(self):
+        with self.assertRaises(ImproperlyConfigured):
+            llm.get_provider()
+
+
+class InventorySummaryTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.today = date(2030, 1, 1)
+        SaaSApplication.objects.bulk_create(
+            SaaSApplication(
+                name=f'App {days}', vendor='Acme', category='Tools', total_licenses=10, allocated_licenses=4,
+                monthly_cost=Decimal('1.00'), renewal_date=cls.today + timedelta(days=days),
+            )
+            for days in (-1, 0, 30, 31, 60, 61, 90, 91)
+        )
+
+    def test_totals_and_renewal_buckets_in_one_query(self):
+        with self.assertNumQueries(1):
+            summary = summarize_inventory(today=self.today)
+        self.assertEqual(summary, {
+            'total_software': 8,
+            'active_licenses': 80,
+            'allocated_licenses': 32,
+            'expired': 1,
+            'within_30_days': 2,
+            'within_31_60_days': 2,
+            'within_61_90_days': 2,
+        })
+
+
+class DashboardSnapshotTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('erin', password='unused')
+        cls.user.profile.department = 'Sales'
+        cls.user.profile.save()
+        User.objects.create_user('frank', password='unused', is_active=False)
+        SaaSApplication.objects.create(
+            name='Slack', vendor='Salesforce', category='Chat', total_licenses=5,
+            monthly_cost=Decimal('10.50'), renewal_date=date(2030, 1, 1),
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_stats_are_computed_in_one_query(self):
+        with self.assertNumQueries(1):
+            stats = compute_dashboard_stats()
+        self.assertEqual(stats['total_licenses'], 1)
+        self.assertEqual(stats['total_monthly_cost'], 10.5)
+        self.assertEqual(stats['active_users'], 1)
+        self.assertEqual(stats['users_by_department'], {'Sales': 1})
+
+    def test_snapshot_is_warmed_by_the_first_request_only(self):
+        request_started.connect(warm_dashboard_on_first_request, dispatch_uid='warm-dashboard-snapshot')
+        self.addCleanup(request_started.disconnect, dispatch_uid='warm-dashboard-snapshot')
+        self.client.force_login(self.user)
+        with mock.patch('api.signals.warm_dashboard_snapshot', wraps=warm_dashboard_snapshot) as warm:
+            self.client.get('/api/saas-applications/', SERVER_NAME='localhost')
+            self.client.get('/api/saas-applications/', SERVER_NAME='localhost')
+        warm.assert_called_once()
+        self.assertIsNotNone(cache.get(f"dashboard-stats:v{get_version('dashboard')}"))
+
+
+class ApprovalWithdrawalTests(TestCase):
+    """An approved GRANT that is rejected or deleted gives back its license, seat and rollup."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('root', password='unused')
+        cls.admin.profile.role = 'ADMIN'
+        cls.admin.profile.save()
+        cls.user = User.objects.create_user('erin', password='unused')
+        cls.user.profile.department = 'Eng'
+        cls.user.profile.save()
+        cls.software = SaaSApplication.objects.create(
+            name='Figma', vendor='Figma', category='Design', total_licenses=5,
+            monthly_cost=Decimal('10.00'), renewal_date=date(2030, 1, 1),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+
+    def grant_request(self):
+        return LicenseRequest.objects.create(
+            request_type='GRANT', user=self.user, software=self.software, requested_by=self.user,
+        )
+
+    def review(self, license_request, action):
+        return self.client.post(
+            f'/api/requests/{license_request.pk}/approve-reject/', {'action': action},
+            content_type='application/json', SERVER_NAME='localhost',
+        )
+
+    def assert_granted(self, granted):
+        self.software.refresh_from_db()
+        rollup = DepartmentRollup.objects.get(pk='eng')
+        self.assertEqual(UserLicense.objects.filter(user=self.user, software=self.software).count(), granted)
+        self.assertEqual(self.software.allocated_licenses, granted)
+        self.assertEqual(rollup.approved_grants, granted)
+        self.assertEqual(rollup.monthly_spend, Decimal('10.00') * granted)
+
+    def test_reviewed_request_cannot_be_reviewed_again(self):
+        license_request = self.grant_request()
+        self.assertEqual(self.review(license_request, 'approve').status_code, 200)
+        self.assert_granted(1)
+
+        self.assertEqual(self.review(license_request, 'reject').status_code, 409)
+        license_request.refresh_from_db()
+        self.assertEqual(license_request.status, 'APPROVED')
+        self.assert_granted(1)
+
+    def test_rejecting_an_approved_grant_undoes_it(self):
+        license_request = self.grant_request()
+        license_request.status = 'APPROVED'
+        license_request.save()
+        self.assert_granted(1)
+
+        license_request.status = 'REJECTED'
+        license_request.save()
+        self.assert_granted(0)
+        self.assertEqual(rebuild_entitlements(dry_run=True), ([], []))
+
+    def test_deleting_an_approved_grant_undoes_it(self):
+        license_request = self.grant_request()
+        license_request.status = 'APPROVED'
+        license_request.save()
+
+        license_request.delete()
+        self.assert_granted(0)
+
+
+class CatalogWithoutSharedCacheTests(TestCase):
+    """
+    Under LocMem another worker's catalog changes never reach this one, so
+    writes that skip the signals (bulk_create, update) stand in for them.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_user('root', password='unused')
+        cls.admin.profile.role = 'ADMIN'
+        cls.admin.profile.save()
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.admin)
+        # Load this worker's view of the catalog before the "other worker" writes
+        resolve_software_id('warm up')
+
+    def new_software(self, name):
+        return SaaSApplication(
+            name=name, name_key=name.lower(), vendor='Acme', category='Tools', total_licenses=3,
+            monthly_cost=Decimal('5.00'), renewal_date=date(2030, 1, 1),
+        )
+
+    def test_software_created_elsewhere_can_be_requested(self):
+        SaaSApplication.objects.bulk_create([self.new_software('Miro')])
+        response = self.client.post('/api/license-requests/', {
+            'request_type': 'GRANT', 'user': self.admin.pk, 'software_name': 'miro', 'reason': 'Boards',
+        }, content_type='application/json', SERVER_NAME='localhost')
+        self.assertEqual(response.status_code, 201)
+
+    def test_name_taken_elsewhere_is_rejected(self):
+        SaaSApplication.objects.bulk_create([self.new_software('Loom')])
+        response = self.client.post('/api/saas-applications/create/', {
+            'name': 'Loom', 'vendor': 'Loom', 'category': 'Video', 'total_licenses': 2,
+            'monthly_cost': '8.00', 'renewal_date': '2030-01-01',
+        }, content_type='application/json', SERVER_NAME='localhost')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('name', response.json())
+
+
+class ChatContextWithoutSharedCacheTests(TestCase):
+    """Under LocMem the chatbot's context has to expire on its own."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_change_made_elsewhere_shows_up_after_local_timeout(self):
+        get_chat_context()
+        # Skips the signals, like a write on another worker
+        SaaSApplication.objects.bulk_create([SaaSApplication(
+            name='Miro', name_key='miro', vendor='Miro', category='Design', total_licenses=3,
+            monthly_cost=Decimal('5.00'), renewal_date=date(2030, 1, 1),
+        )])
+        self.assertEqual(get_chat_context().inventory, [])
+
+        later = time.time() + LOCAL_SECTION_TIMEOUT + 1
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=later):
+            inventory = get_chat_context().inventory
+        self.assertEqual([app['software_name'] for app in inventory], ['Miro'])
+
+
+class RetrievalWithoutSharedCacheTests(TestCase):
+    """Under LocMem the retrieval index has to reload on its own."""
+
+    def setUp(self):
+        cache.clear()
+
+    def test_change_made_elsewhere_is_found_after_reload_interval(self):
+        index = RetrievalIndex()
+        with mock.patch('api.retrieval.time.monotonic', return_value=1000.0):
+            self.assertEqual(index.search('miro'), [])
+        # Skips the signals, like a write on another worker
+        SaaSApplication.objects.bulk_create([SaaSApplication(
+            name='Miro', name_key='miro', vendor='Miro', category='Design', total_licenses=3,
+            monthly_cost=Decimal('5.00'), renewal_date=date(2030, 1, 1),
+        )])
+        with mock.patch('api.retrieval.time.monotonic', return_value=1001.0):
+            self.assertEqual(index.search('miro'), [])
+        with mock.patch('api.retrieval.time.monotonic', return_value=1000.0 + LOCAL_RELOAD_INTERVAL):
+            results = index.search('miro')
+        self.assertEqual(len(results), 1)
+        self.assertIn('Software Miro', results[0])
+
+
+class AnswerCacheWithoutSharedCacheTests(TestCase):
+    def test_answers_expire_after_local_ttl(self):
+        answers = AnswerCache()
+        with mock.patch('api.answer_cache.time.monotonic', return_value=1000.0):
+            answers.put('key', 'cached answer')
+        with mock.patch('api.answer_cache.time.monotonic', return_value=1000.0 + LOCAL_TTL_SECONDS - 1):
+            self.assertEqual(answers.get('key'), 'cached answer')
+        with mock.patch('api.answer_cache.time.monotonic', return_value=1000.0 + LOCAL_TTL_SECONDS):
+            self.assertIsNone(answers.get('key'))
+
+
+class FloatingLicenseTtlTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('carol', password='unused')
+        cls.software = SaaSApplication.objects.create(
+            name='Tableau', vendor='Salesforce', category='Analytics', total_licenses=2,
+            monthly_cost=Decimal('70.00'), renewal_date=date(2030, 1, 1),
+            license_mode=SaaSApplication.LicenseMode.FLOATING,
+        )
+
+    def test_huge_ttl_is_capped(self):
+        self.client.force_login(self.user)
+        response = self.client.post(
+            f'/api/floating-licenses/{self.software.pk}/checkout/', {'ttl_seconds': 1e20},
+            content_type='application/json', SERVER_NAME='localhost',
+        )
+        self.assertEqual(response.status_code, 201)
+        lease = LicenseLease.objects.get()
+        self.assertLessEqual(lease.expires_at - lease.checked_out_at, MAX_TTL)
+
+
+class DeletedSoftwareRequestTests(TransactionTestCase):
+    """The foreign key is only checked at commit, so this needs real transactions."""
+
+    def test_request_for_software_deleted_meanwhile_is_rejected(self):
+        admin = User.objects.create_user('root', password='unused')
+        self.client.force_login(admin)
+        # Resolves to a row that no longer exists, as a stale catalog would
+        with mock.patch('api.serializers.resolve_software_id', return_value=999999):
+            response = self.client.post('/api/license-requests/', {
+                'request_type': 'GRANT', 'user': admin.pk, 'software_name': 'Gone', 'reason': '',
+            }, content_type='application/json', SERVER_NAME='localhost')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(LicenseRequest.objects.exists())
+
+
+
+async def call_asgi(path, headers=(), log=None, method='GET', body=b''):
+    """
+    Calls the ASGI app like a server would, without buffering the body as
+    httpx's ASGITransport does. Returns the ASGI messages it sent, and
+    appends 'sent' to `log` for each piece of body.
+    """
+    from saas_project.asgi import application
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': method,
+        'scheme': 'http', 'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+        'headers': [(b'host', b'localhost'), (b'content-length', str(len(body)).encode()), *headers],
+        'client': ('127.0.0.1', 50000), 'server': ('localhost', 80),
+    }
+    messages = []
+    requested = False
+    finished = asyncio.Event()
+
+    async def receive():
+        nonlocal requested
+        if not requested:
+            requested = True
+            return {'type': 'http.request', 'body': body, 'more_body': False}
+        # Like a client that stays connected until the response is complete
+        await finished.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(message):
+        messages.append(message)
+        if message['type'] != 'http.response.body':
+            return
+        if log is not None and message.get('body'):
+            log.append('sent')
+        if not message.get('more_body'):
+            finished.set()
+
+    await application(scope, receive, send)
+    return messages
+
+
+class SeatConcurrencyTests(TransactionTestCase):
+    """
+    Races threads, each with its own connection, to reserve seats. SQLite
+    serializes writers with a file lock, so this is only a real race on
+    PostgreSQL.
+    """
+
+    def test_concurrent_approvals_never_over_allocate(self):
+        seats, workers = 5, 20
+        software = SaaSApplication.objects.create(
+            name='Figma', vendor='Figma', category='Design', total_licenses=seats,
+            monthly_cost=Decimal('12.00'), renewal_date=date(2030, 1, 1),
+        )
+        start = threading.Barrier(workers)
+        outcomes = []
+
+        def approve():
+            try:
+                start.wait()
+                with transaction.atomic():
+                    reserve_seat(software.pk)
+                outcomes.append('reserved')
+            except SeatCapacityError:
+                outcomes.append('refused')
+            except Exception as e:
+                outcomes.append(f'error: {e}')
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=approve) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        software.refresh_from_db()
+        self.assertLessEqual(software.allocated_licenses, seats)
+        self.assertEqual(outcomes.count('reserved'), software.allocated_licenses)
+        errors = [outcome for outcome in outcomes if outcome.startswith('error')]
+        self.assertEqual(outcomes.count('reserved'), min(seats, workers - len(errors)))
+
+
+class ExportStreamingTests(TransactionTestCase):
+    """Exports must reach an ASGI server chunk by chunk, not be read whole first."""
+
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_user('root', password='unused')
+        self.admin.profile.role = 'ADMIN'
+        self.admin.profile.save()
+        SaaSApplication.objects.bulk_create([
+            SaaSApplication(name=f'App{n}', name_key=f'app{n}', vendor='Acme', category='Tools',
+                            total_licenses=1, monthly_cost=Decimal('1.00'), renewal_date=date(2030, 1, 1))
+            for n in range(5)
+        ])
+
+    async def test_export_streams_under_asgi(self):
+        log = []
+
+        def logged_stream(queryset, fields):
+            for chunk in stream_ndjson(queryset, fields, chunk_size=2):
+                log.append('read')
+                yield chunk
+
+        token = await sync_to_async(issue_access_token)(self.admin)
+        with mock.patch('api.views.stream_ndjson', logged_stream):
+            messages = await call_asgi(
+                '/api/exports/inventory/', headers=[(b'authorization', f'Bearer {token}'.encode())], log=log,
+            )
+
+        self.assertEqual(messages[0]['status'], 200)
+        body = b''.join(m.get('body', b'') for m in messages if m['type'] == 'http.response.body')
+        self.assertEqual(len(body.splitlines()), 5)
+        # Each chunk goes out before the next one is read
+        self.assertEqual(log, ['read', 'sent'] * 3)
+
+    async def test_import_error_report_streams_under_asgi(self):
+        token = await sync_to_async(issue_access_token)(self.admin)
+        rows = [{'user': 'nobody', 'software_name': 'App1', 'request_type': 'GRANT'}]
+        messages = await call_asgi(
+            '/api/license-requests/import/', method='POST', body=json.dumps({'rows': rows}).encode(),
+            headers=[(b'authorization', f'Bearer {token}'.encode()), (b'content-type', b'application/json')],
+        )
+
+        self.assertEqual(messages[0]['status'], 200)
+        lines = b''.join(m.get('body', b'') for m in messages if m['type'] == 'http.response.body').splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertEqual(json.loads(lines[-1])['summary'], {'rows': 1, 'created': 0, 'rejected': 1})
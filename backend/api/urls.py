@@ -5,6 +5,7 @@ from rest_framework_simplejwt.views import (
     TokenVerifyView,
 )
 from .health_checks import HealthCheckView
+from .chat_stream import license_chatbot_stream
 from .views import (
     UserListView, 
     SaaSApplicationCreateView, 
@@ -25,13 +26,22 @@ from .views import (
     DeptHeadPendingRequestsView,
     ApproveRejectRequestView,
     ForwardRequestToAdminView,
+    BatchRequestActionView,
+    LicenseRequestImportView,
     DeptHeadTeamIssuesView,
     AdminAllIssuesView,
     UpdateIssueStatusView,
     UserAllocatedLicensesView,
     TriggerOptimizationAgentView,
     AIRecommendationsView,
-    LicenseChatbotView
+    LicenseChatbotView,
+    LicenseChatbotCacheStatsView,
+    LLMClientStatsView,
+    DepartmentBudgetView,
+    FloatingLicenseCheckoutView,
+    FloatingLicenseHeartbeatView,
+    FloatingLicenseReleaseView,
+    ExportView
 )
 
 # This list defines all the URLs that are available under the `/api/` path.
@@ -78,6 +88,9 @@ urlpatterns = [
     path('license-requests/', LicenseRequestCreateView.as_view(), name='license-request-create'),
     path('user-license-request/', UserLicenseRequestCreateView.as_view(), name='user-license-request-create'),
     
+    # POST /api/license-requests/import/ -> Bulk-create requests from a CSV or JSON file
+    path('license-requests/import/', LicenseRequestImportView.as_view(), name='license-request-import'),
+    
     # GET /api/pending-requests/ -> Admin views all pending requests
     path('pending-requests/', PendingRequestsView.as_view(), name='pending-requests'),
     
@@ -90,6 +103,9 @@ urlpatterns = [
     # POST /api/requests/<id>/forward/ -> Dept head forwards request to admin
     path('requests/<int:request_id>/forward/', ForwardRequestToAdminView.as_view(), name='forward-request'),
     
+    # POST /api/requests/batch/ -> Approve, reject or forward many requests in one call
+    path('requests/batch/', BatchRequestActionView.as_view(), name='batch-request-action'),
+    
     # --- ISSUE REPORT ENDPOINTS ---
     path('report-issue/', IssueReportCreateView.as_view(), name='issue-report-create'),
     
@@ -106,6 +122,18 @@ urlpatterns = [
     # GET /api/user-licenses/ -> Get current user's allocated licenses
     path('user-licenses/', UserAllocatedLicensesView.as_view(), name='user-allocated-licenses'),
     
+    # --- BUDGET ENDPOINTS ---
+    # GET/PUT /api/department-budgets/ -> Admin lists or sets department budget ceilings
+    path('department-budgets/', DepartmentBudgetView.as_view(), name='department-budgets'),
+    
+    # --- FLOATING LICENSE ENDPOINTS ---
+    # POST /api/floating-licenses/<software_id>/checkout/ -> Lease a seat from a floating pool
+    path('floating-licenses/<int:software_id>/checkout/', FloatingLicenseCheckoutView.as_view(), name='floating-license-checkout'),
+    # POST /api/floating-licenses/leases/<token>/heartbeat/ -> Renew a lease
+    path('floating-licenses/leases/<uuid:token>/heartbeat/', FloatingLicenseHeartbeatView.as_view(), name='floating-license-heartbeat'),
+    # POST /api/floating-licenses/leases/<token>/release/ -> Give a leased seat back
+    path('floating-licenses/leases/<uuid:token>/release/', FloatingLicenseReleaseView.as_view(), name='floating-license-release'),
+    
     # --- AI OPTIMIZATION ENDPOINTS ---
     # POST /api/run-optimization-agent/ -> Trigger AI agent to analyze license usage
     path('run-optimization-agent/', TriggerOptimizationAgentView.as_view(), name='run-optimization-agent'),
@@ -113,5 +141,15 @@ urlpatterns = [
     path('ai-recommendations/', AIRecommendationsView.as_view(), name='ai-recommendations'),
     # POST /api/license-chatbot/ -> Ask questions about license data
     path('license-chatbot/', LicenseChatbotView.as_view(), name='license-chatbot'),
+    # POST /api/license-chatbot/stream/ -> Same as above, streamed as Server-Sent Events (async, for ASGI)
+    path('license-chatbot/stream/', license_chatbot_stream, name='license-chatbot-stream'),
+    # GET /api/license-chatbot/cache-stats/ -> Admin views the chatbot answer cache hit/miss counters
+    path('license-chatbot/cache-stats/', LicenseChatbotCacheStatsView.as_view(), name='license-chatbot-cache-stats'),
+    # GET /api/llm/stats/ -> Admin views LLM call latency, token usage and circuit breaker state
+    path('llm/stats/', LLMClientStatsView.as_view(), name='llm-stats'),
+    
+    # --- EXPORT ENDPOINTS ---
+    # GET /api/exports/<license-requests|issues|inventory>/ -> Admin streams a full dump as NDJSON or CSV
+    path('exports/<str:resource>/', ExportView.as_view(), name='export'),
 ]
 
@@ -0,0 +1,104 @@
+"""
+Data version counters shared through Django's cache.
+
+Each named counter is bumped when the data it describes changes, so every
+worker can tell whether something it cached is stale with one cache read.
+A missing counter (cold or evicted cache) starts at the current time in
+nanoseconds, never at a fixed number, so a counter that was lost can't move
+back to a version something was already cached or validated under.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+# How long, and how many, per-version change records are kept
+CHANGE_LOG_TIMEOUT = 60 * 60
+MAX_CHANGES = 500
+
+
+# Backends whose contents each process keeps to itself
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def cache_is_shared():
+    """
+    True when the default cache is shared by every process (e.g. Redis).
+    With a per-process cache, a version bumped by another worker, a
+    management command or Celery is never seen here.
+    """
+    return settings.CACHES['default']['BACKEND'] not in PROCESS_LOCAL_BACKENDS
+
+
+def _key(name):
+    return f'data-version:{name}'
+
+
+def get_version(name):
+    """Returns the current version of `name`, seeding a missing counter from the clock."""
+    version = cache.get(_key(name))
+    if version is None:
+        # add() so concurrent workers don't reset each other's version
+        seed = time.time_ns()
+        cache.add(_key(name), seed, timeout=None)
+        version = cache.get(_key(name), seed)
+    return version
+
+
+def get_versions(names):
+    """Returns {name: version} for several counters with one cache round trip."""
+    keys = {_key(name): name for name in names}
+    versions = {keys[key]: version for key, version in cache.get_many(list(keys)).items()}
+    for name in names:
+        if name not in versions:
+            versions[name] = get_version(name)
+    return versions
+
+
+def _change_key(name, version):
+    return f'data-change:{name}:{version}'
+
+
+def bump_version(name, changed=None):
+    """
+    Moves `name` to a new version so anything cached for the old one is ignored.
+    `changed` (e.g. the pk of the row that changed) is recorded against the
+    new version, so readers that keep their own copy can apply just that
+    change (see get_changes).
+    """
+    try:
+        version = cache.incr(_key(name))
+    except ValueError:
+        # No version stored (cold or evicted cache): a fresh epoch is newer than anything cached before
+        cache.add(_key(name), time.time_ns(), timeout=None)
+        return get_version(name)
+    if changed is not None:
+        cache.set(_change_key(name, version), changed, timeout=CHANGE_LOG_TIMEOUT)
+    return version
+
+
+def get_changes(name, since, until):
+    """
+    Returns what changed between two versions of `name`, one entry per
+    version, or None if any of them wasn't recorded (a bulk change, or too
+    old), in which case the reader has to reload everything.
+    """
+    if until < since or until - since > MAX_CHANGES:
+        return None
+    keys = [_change_key(name, version) for version in range(since + 1, until + 1)]
+    recorded = cache.get_many(keys)
+    if len(recorded) != len(keys):
+        return None
+    return [recorded[key] for key in keys]
+
+
+def bump_version_on_commit(name, changed=None):
+    """
+    Bumps `name` once the current transaction commits (right away outside of
+    one), so a concurrent read can't cache the old data under the new version.
+    """
+    transaction.on_commit(lambda: bump_version(name, changed))
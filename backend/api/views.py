@@ -2,11 +2,11 @@ from rest_framework import generics, permissions, status
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from django.contrib.auth.models import User
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from django.utils import timezone
 from datetime import timedelta
-from django.db.models import Sum, Value, DecimalField
-from django.db.models.functions import Coalesce
-from decimal import Decimal
+from decimal import Decimal, InvalidOperation
 
 from .serializers import (
     UserSerializer, 
@@ -16,10 +16,25 @@ from .serializers import (
     RegisterSerializer,
     UserWithLicensesSerializer,
     UserLicenseRequestSerializer,
-    IssueReportSerializer
+    IssueReportSerializer,
+    approved_licenses_count_subquery
 )
-from .models import SaaSApplication, LicenseRequest, IssueReport
-from tenants.models import Profile
+from .models import SaaSApplication, LicenseRequest, IssueReport, DepartmentRollup, DepartmentBudget
+from .dashboard import get_dashboard_snapshot
+from .conditional import conditional_get
+from .authentication import issue_access_token
+from .pagination import UserKeysetPagination, InboxCursorPaginator
+from .loaders import load_user_licenses
+from .entitlements import SeatCapacityError
+from . import budgets
+from .budgets import BudgetExceededError
+from .leases import LeaseError, checkout as checkout_lease, renew as renew_lease, release as release_lease
+from .workflow import ACTIONS as BATCH_ACTIONS, MAX_BATCH_SIZE, apply_batch_action
+from .imports import ImportFileError, parse_rows, import_license_requests, stream_error_report
+from .exports import EXPORTS, FORMATS as EXPORT_FORMATS, ExportError, build_export_queryset, stream_csv, stream_ndjson
+from .streaming import streaming_body
+from .inventory import summarize_inventory, software_list
+from tenants.models import Profile, normalize_department
 
 # --- AUTHENTICATION & USER VIEWS ---
 class RegisterView(generics.CreateAPIView):
@@ -31,7 +46,8 @@ class UserProfileView(generics.RetrieveAPIView):
     permission_classes = [permissions.IsAuthenticated]
     serializer_class = UserProfileSerializer
     def get_object(self):
-        return self.request.user.profile
+        # request.user comes from the token claims, which don't include the email
+        return Profile.objects.select_related('user').get(user_id=self.request.user.pk)
 
 class UpdateDepartmentView(APIView):
     """
@@ -49,12 +65,18 @@ class UpdateDepartmentView(APIView):
             )
         
         try:
-            profile = request.user.profile
+            # Load the stored profile; request.user.profile is built from the token
+            profile = Profile.objects.get(user_id=request.user.pk)
             profile.department = department
-            profile.save()
             
+            # Saving the profile also moves the user between department rollups
+            with transaction.atomic():
+                profile.save()
+            
+            # The old token's claims were revoked by the profile save
             return Response(
-                {'detail': 'Department updated successfully.', 'department': department},
+                {'detail': 'Department updated successfully.', 'department': department,
+                 'access': issue_access_token(request.user)},
                 status=status.HTTP_200_OK
             )
         except Exception as e:
@@ -70,19 +92,38 @@ class UserListView(generics.ListAPIView):
     Accessible by authenticated users (typically admins).
     """
     permission_classes = [permissions.IsAuthenticated]
-    queryset = User.objects.all().select_related('profile')
     serializer_class = UserSerializer
+    pagination_class = UserKeysetPagination
+
+    def get_queryset(self):
+        # Resolve licenses_count for the whole page in the same query
+        return User.objects.select_related('profile').annotate(
+            approved_licenses_count=approved_licenses_count_subquery()
+        ).order_by('id')
 
 class SaaSApplicationListView(generics.ListAPIView):
     permission_classes = [permissions.IsAuthenticated]
     queryset = SaaSApplication.objects.all()
     serializer_class = SaaSApplicationSerializer
 
+    @conditional_get('catalog', 'seats')
+    def get(self, request, *args, **kwargs):
+        return self.list(request, *args, **kwargs)
+
 class SaaSApplicationDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [permissions.IsAuthenticated]
     queryset = SaaSApplication.objects.all()
     serializer_class = SaaSApplicationSerializer
 
+    # A cost change re-prices the department rollups, so keep it in one transaction
+    def perform_update(self, serializer):
+        with transaction.atomic():
+            serializer.save()
+
+    def perform_destroy(self, instance):
+        with transaction.atomic():
+            instance.delete()
+
 class SaaSApplicationCreateView(generics.CreateAPIView):
     permission_classes = [permissions.IsAuthenticated]
     queryset = SaaSApplication.objects.all()
@@ -99,10 +140,11 @@ class LicenseRequestCreateView(generics.CreateAPIView):
     
     def perform_create(self, serializer):
         # Dept heads request directly to admin
-        serializer.save(
+        license_request = serializer.save(
             requested_by=self.request.user,
             approval_level='ADMIN'
         )
+        budgets.flag_requests([license_request])
 
 class UserLicenseRequestCreateView(generics.CreateAPIView):
     """
@@ -128,11 +170,12 @@ class UserLicenseRequestCreateView(generics.CreateAPIView):
         else:
             approval_level = 'DEPT_HEAD'
         
-        serializer.save(
+        license_request = serializer.save(
             user=self.request.user,
             requested_by=self.request.user,
             approval_level=approval_level
         )
+        budgets.flag_requests([license_request])
 
 class IssueReportCreateView(generics.CreateAPIView):
     """
@@ -148,51 +191,26 @@ class IssueReportCreateView(generics.CreateAPIView):
 # --- DASHBOARD STATISTICS VIEWS ---
 class InventoryStatsView(APIView):
     permission_classes = [permissions.IsAuthenticated]
+    @conditional_get('catalog', 'seats', daily=True)
     def get(self, request, *args, **kwargs):
         try:
-            from datetime import datetime, timedelta
-            
-            # Get all software applications
-            all_software = SaaSApplication.objects.all()
-            total_software = all_software.count()
-            
-            # Calculate active licenses (sum of all total_licenses)
-            active_licenses = all_software.aggregate(
-                total=Coalesce(Sum('total_licenses'), Value(0))
-            )['total']
-            
-            # Calculate expiring soon (within 30 days) and expired
-            today = datetime.now().date()
-            thirty_days_from_now = today + timedelta(days=30)
-            
-            expiring_soon = 0
-            expired = 0
-            
-            for software in all_software:
-                if software.renewal_date:
-                    if software.renewal_date < today:
-                        expired += 1
-                    elif software.renewal_date <= thirty_days_from_now:
-                        expiring_soon += 1
-            
-            # Build software list for charts
-            software_list = []
-            for app in all_software:
-                software_list.append({
-                    'name': app.name,
-                    'vendor': app.vendor,
-                    'category': app.category,
-                    'total_licenses': app.total_licenses,
-                    'monthly_cost': str(app.monthly_cost),
-                    'renewal_date': str(app.renewal_date)
-                })
+            # Counts, license total and renewal buckets in one aggregate query
+            summary = summarize_inventory()
             
             data = {
-                'total_software': total_software,
-                'active_licenses': active_licenses,
-                'expiring_soon': expiring_soon,
-                'expired': expired,
-                'software_list': software_list,  # Added for charts
+                'total_software': summary['total_software'],
+                'active_licenses': summary['active_licenses'],
+                'allocated_licenses': summary['allocated_licenses'],
+                'seats_available': max(summary['active_licenses'] - summary['allocated_licenses'], 0),
+                'expiring_soon': summary['within_30_days'],
+                'expired': summary['expired'],
+                'renewal_buckets': {
+                    'expired': summary['expired'],
+                    'within_30_days': summary['within_30_days'],
+                    'within_31_60_days': summary['within_31_60_days'],
+                    'within_61_90_days': summary['within_61_90_days'],
+                },
+                'software_list': software_list(),  # Added for charts
             }
             return Response(data)
         
@@ -283,12 +301,16 @@ class AIRecommendationsView(APIView):
 
 class LicenseChatbotView(APIView):
     """
-    Interactive chatbot endpoint for asking questions about license data
+    Interactive chatbot endpoint for asking questions about license data.
+    Send back the returned `session_id` with follow-up questions to continue
+    the conversation; without one (or once it expired) a new one starts.
     """
     permission_classes = [permissions.IsAuthenticated]
     
     def post(self, request, *args, **kwargs):
-        from .license_agent import chat_with_license_data
+        from .license_agent import chat_in_session
+        from .answer_cache import scope_for_user
+        from .chat_sessions import session_store
         
         question = request.data.get('question', '')
         
@@ -298,12 +320,20 @@ class LicenseChatbotView(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
+        scope = scope_for_user(request.user)
+        session_id = request.data.get('session_id')
+        session = session_store.get(str(session_id), request.user.pk, scope) if session_id else None
+        if session is None:
+            session = session_store.create(request.user.pk, scope)
+        
         try:
-            answer = chat_with_license_data(question)
+            answer = chat_in_session(question, session)
             return Response(
                 {
                     "question": question,
-                    "answer": answer
+                    "answer": answer,
+                    "session_id": session.id,
+                    "turn": session.turn_count,
                 },
                 status=status.HTTP_200_OK
             )
@@ -314,55 +344,51 @@ class LicenseChatbotView(APIView):
             )
 
 
+class LicenseChatbotCacheStatsView(APIView):
+    """
+    Endpoint for admins to see how often the chatbot answers from its cache,
+    and how its conversation sessions are used (counters are per worker process).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request):
+        if request.user.profile.role != 'ADMIN':
+            return Response(
+                {'detail': 'Only admins can view chatbot cache stats.'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        from .answer_cache import answer_cache
+        from .chat_sessions import session_store
+        return Response({**answer_cache.stats(), 'sessions': session_store.stats()}, status=status.HTTP_200_OK)
+
+
+class LLMClientStatsView(APIView):
+    """
+    Endpoint for admins to see the LLM provider's call, retry and token counters,
+    latency percentiles and circuit breaker state (per worker process).
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request):
+        if request.user.profile.role != 'ADMIN':
+            return Response(
+                {'detail': 'Only admins can view LLM client stats.'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        from . import llm
+        return Response(llm.get_provider().stats(), status=status.HTTP_200_OK)
+
+
 # --- THIS IS THE CORRECTED VIEW ---
 class DashboardStatsView(APIView):
     permission_classes = [permissions.IsAuthenticated]
 
+    @conditional_get('dashboard')
     def get(self, request, *args, **kwargs):
         try:
-            # User calculations
-            total_users = User.objects.count()
-            active_users = User.objects.filter(is_active=True).count() 
-
-            # Inventory calculations
-            inventory_queryset = SaaSApplication.objects.all()
-            
-            # Use database aggregation for a more efficient cost calculation.
-            # The result will be a Decimal type or None.
-            total_cost_result = inventory_queryset.aggregate(
-                total_cost=Sum('monthly_cost')
-            )['total_cost']
-
-            # Ensure total_cost_result is not None before converting.
-            total_monthly_cost_decimal = total_cost_result or Decimal('0.0')
-
-            # --- THIS IS THE FIX ---
-            # We must explicitly convert the Decimal type from the database to a float
-            # before performing multiplication with another float.
-            cost_savings = float(total_monthly_cost_decimal) * 0.15 
-
-            # Use total software count as a proxy for total licenses for now
-            total_licenses = inventory_queryset.count()
-
-            # Get users by department
-            users_by_dept = {}
-            for user in User.objects.filter(is_active=True):
-                dept = getattr(user, 'department', None)
-                if hasattr(user, 'profile'):
-                    dept = user.profile.department if hasattr(user.profile, 'department') else None
-                
-                dept_name = dept if dept else 'No Department'
-                users_by_dept[dept_name] = users_by_dept.get(dept_name, 0) + 1
-            
-            # --- THIS IS THE FIX ---
-            # We must include `total_monthly_cost` in the data we send back.
-            data = {
-                'total_licenses': total_licenses,
-                'active_users': active_users,
-                'cost_savings': round(cost_savings, 2),
-                'total_monthly_cost': round(float(total_monthly_cost_decimal), 2),
-                'users_by_department': users_by_dept
-            }
+            # Served from the cached snapshot in api/dashboard.py, which is
+            # recomputed only after a User, Profile or SaaSApplication changes.
+            data = get_dashboard_snapshot()
             return Response(data)
         
         except Exception as e:
@@ -384,12 +410,13 @@ class DepartmentTeamView(generics.ListAPIView):
             user_profile = self.request.user.profile
             
             # If the user has a department set, filter the user list by that department
-            if user_profile and user_profile.department:
-                # Use case-insensitive filtering to match departments
+            # (a blank name has no key, and filtering on None would match every unassigned user)
+            if user_profile and user_profile.department_key:
+                # Match on the normalized department key (an indexed equality lookup)
                 # We also exclude the department head themselves from the list
                 return User.objects.filter(
-                    profile__department__iexact=user_profile.department
-                ).exclude(pk=self.request.user.pk)
+                    profile__department_key=user_profile.department_key
+                ).exclude(pk=self.request.user.pk).select_related('profile')
         
         except Profile.DoesNotExist:
             # If the user somehow has no profile, return an empty list to prevent a crash
@@ -398,6 +425,20 @@ class DepartmentTeamView(generics.ListAPIView):
         # If the user has no department, or something else goes wrong, return an empty list
         return User.objects.none()
 
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        users = page if page is not None else list(queryset)
+        
+        # Load every team member's licenses in one query instead of two per user
+        context = self.get_serializer_context()
+        context['license_map'] = load_user_licenses(user.pk for user in users)
+        serializer = self.get_serializer_class()(users, many=True, context=context)
+        
+        if page is not None:
+            return self.get_paginated_response(serializer.data)
+        return Response(serializer.data)
+
 class UserUpdateView(APIView):
     """
     Endpoint for admins to update user profile information (department and role).
@@ -416,6 +457,13 @@ class UserUpdateView(APIView):
             email = request.data.get('email')
             is_active = request.data.get('is_active')
             
+            # Validate role
+            if role and role not in ['ADMIN', 'DEPT_HEAD', 'USER']:
+                return Response(
+                    {'detail': 'Invalid role. Must be ADMIN, DEPT_HEAD, or USER.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
             # Update email if provided
             if email:
                 user.email = email
@@ -424,37 +472,34 @@ class UserUpdateView(APIView):
             if is_active is not None:
                 user.is_active = bool(is_active)
             
-            user.save()
-            
             # Update department if provided
             if department is not None:
                 profile.department = department.strip() if department.strip() else None
             
             # Update role if provided
             if role:
-                # Validate role
-                if role not in ['ADMIN', 'DEPT_HEAD', 'USER']:
-                    return Response(
-                        {'detail': 'Invalid role. Must be ADMIN, DEPT_HEAD, or USER.'},
-                        status=status.HTTP_400_BAD_REQUEST
-                    )
                 profile.role = role
             
-            profile.save()
+            # The department rollups are updated by the profile save signals
+            # Changing the role or department also revokes the user's token claims
+            with transaction.atomic():
+                user.save()
+                profile.save()
             
-            return Response(
-                {
-                    'detail': 'User updated successfully.',
-                    'user': {
-                        'id': user.id,
-                        'username': user.username,
-                        'email': user.email,
-                        'department': profile.department,
-                        'role': profile.role
-                    }
-                },
-                status=status.HTTP_200_OK
-            )
+            data = {
+                'detail': 'User updated successfully.',
+                'user': {
+                    'id': user.id,
+                    'username': user.username,
+                    'email': user.email,
+                    'department': profile.department,
+                    'role': profile.role
+                }
+            }
+            if user.pk == request.user.pk and user.is_active:
+                # Admins editing themselves get a token with the new claims
+                data['access'] = issue_access_token(user)
+            return Response(data, status=status.HTTP_200_OK)
             
         except User.DoesNotExist:
             return Response(
@@ -474,6 +519,7 @@ class PendingRequestsView(APIView):
     """
     permission_classes = [permissions.IsAuthenticated]
     
+    @conditional_get('license-requests', 'users', 'catalog')
     def get(self, request):
         try:
             # Only admins should see all pending requests
@@ -487,10 +533,20 @@ class PendingRequestsView(APIView):
             pending_requests = LicenseRequest.objects.filter(
                 status='PENDING',
                 approval_level='ADMIN'
-            ).select_related('user', 'software', 'requested_by', 'original_requester').order_by('-created_at')
+            ).select_related(
+                'user__profile', 'software', 'requested_by__profile', 'original_requester'
+            ).order_by('-created_at')
+            
+            try:
+                page, pagination = InboxCursorPaginator(request).paginate(pending_requests)
+            except ValueError:
+                return Response(
+                    {'detail': 'Invalid cursor.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
             
             requests_data = []
-            for req in pending_requests:
+            for req in page:
                 requests_data.append({
                     'id': req.id,
                     'request_type': req.request_type,
@@ -517,11 +573,12 @@ class PendingRequestsView(APIView):
                         'username': req.original_requester.username,
                     } if req.original_requester else None,
                     'reason': req.reason,
+                    'over_budget': req.over_budget,
                     'created_at': req.created_at.isoformat(),
                 })
             
             return Response({
-                'count': len(requests_data),
+                **pagination,
                 'requests': requests_data
             }, status=status.HTTP_200_OK)
             
@@ -538,6 +595,7 @@ class DeptHeadPendingRequestsView(APIView):
     """
     permission_classes = [permissions.IsAuthenticated]
     
+    @conditional_get('license-requests', 'users', 'catalog')
     def get(self, request):
         try:
             user_profile = request.user.profile
@@ -548,7 +606,7 @@ class DeptHeadPendingRequestsView(APIView):
                     status=status.HTTP_403_FORBIDDEN
                 )
             
-            if not user_profile.department:
+            if not user_profile.department_key:
                 return Response(
                     {'detail': 'Department head must have a department assigned.'},
                     status=status.HTTP_400_BAD_REQUEST
@@ -558,11 +616,19 @@ class DeptHeadPendingRequestsView(APIView):
             pending_requests = LicenseRequest.objects.filter(
                 status='PENDING',
                 approval_level='DEPT_HEAD',
-                user__profile__department__iexact=user_profile.department
+                user__profile__department_key=user_profile.department_key
             ).select_related('user', 'software', 'requested_by').order_by('-created_at')
             
+            try:
+                page, pagination = InboxCursorPaginator(request).paginate(pending_requests)
+            except ValueError:
+                return Response(
+                    {'detail': 'Invalid cursor.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
             requests_data = []
-            for req in pending_requests:
+            for req in page:
                 requests_data.append({
                     'id': req.id,
                     'request_type': req.request_type,
@@ -577,11 +643,12 @@ class DeptHeadPendingRequestsView(APIView):
                         'monthly_cost': float(req.software.monthly_cost)
                     },
                     'reason': req.reason,
+                    'over_budget': req.over_budget,
                     'created_at': req.created_at.isoformat(),
                 })
             
             return Response({
-                'count': len(requests_data),
+                **pagination,
                 'requests': requests_data
             }, status=status.HTTP_200_OK)
             
@@ -607,8 +674,6 @@ class ApproveRejectRequestView(APIView):
                     status=status.HTTP_403_FORBIDDEN
                 )
             
-            license_request = LicenseRequest.objects.get(id=request_id)
-            
             action = request.data.get('action')  # 'approve' or 'reject'
             admin_response = request.data.get('response', '')
             
@@ -618,14 +683,25 @@ class ApproveRejectRequestView(APIView):
                     status=status.HTTP_400_BAD_REQUEST
                 )
             
-            if action == 'approve':
-                license_request.status = 'APPROVED'
-            else:
-                license_request.status = 'REJECTED'
-            
-            license_request.admin_response = admin_response
-            license_request.reviewed_by = request.user
-            license_request.save()
+            # The department rollup is updated by the save signals in the same transaction
+            with transaction.atomic():
+                license_request = LicenseRequest.objects.select_for_update().get(id=request_id)
+                
+                # Like the batch action, only pending requests can be reviewed
+                if license_request.status != 'PENDING':
+                    return Response(
+                        {'detail': f'This request was already {license_request.status.lower()}.'},
+                        status=status.HTTP_409_CONFLICT
+                    )
+                
+                if action == 'approve':
+                    license_request.status = 'APPROVED'
+                else:
+                    license_request.status = 'REJECTED'
+                
+                license_request.admin_response = admin_response
+                license_request.reviewed_by = request.user
+                license_request.save()
             
             return Response({
                 'detail': f'Request {action}d successfully.',
@@ -641,6 +717,20 @@ class ApproveRejectRequestView(APIView):
                 {'detail': 'License request not found.'},
                 status=status.HTTP_404_NOT_FOUND
             )
+        except SeatCapacityError:
+            # The approval was rolled back with the failed seat reservation
+            return Response(
+                {'detail': 'No seats left for this software. Increase its total licenses or revoke unused ones first.'},
+                status=status.HTTP_409_CONFLICT
+            )
+        except BudgetExceededError as e:
+            # Held: the request stays PENDING until the ceiling is raised
+            return Response(
+                {'detail': f'Approving this request would exceed the monthly budget of the {e.department_key} department.',
+                 'budget_ceiling': float(e.ceiling),
+                 'projected_spend': float(e.projected_spend)},
+                status=status.HTTP_409_CONFLICT
+            )
         except Exception as e:
             print(f"!!! ERROR in ApproveRejectRequestView: {e}")
             return Response(
@@ -695,6 +785,113 @@ class ForwardRequestToAdminView(APIView):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
+class BatchRequestActionView(APIView):
+    """
+    Endpoint to approve, reject or forward many license requests at once.
+    Admins can approve/reject, dept heads can forward their team's requests.
+    Requests that are no longer pending are skipped and reported per id.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def post(self, request):
+        try:
+            action = request.data.get('action')  # 'approve', 'reject' or 'forward'
+            request_ids = request.data.get('request_ids')
+            comment = request.data.get('response') or request.data.get('comments') or ''
+            
+            if action not in BATCH_ACTIONS:
+                return Response(
+                    {'detail': 'Action must be "approve", "reject" or "forward".'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            allowed_role = BATCH_ACTIONS[action][0]
+            if request.user.profile.role != allowed_role:
+                return Response(
+                    {'detail': f'Only {"admins" if allowed_role == "ADMIN" else "department heads"} can {action} requests.'},
+                    status=status.HTTP_403_FORBIDDEN
+                )
+            
+            if not isinstance(request_ids, list) or not request_ids:
+                return Response(
+                    {'detail': 'request_ids must be a non-empty list.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            try:
+                # Drop duplicates but keep the order the client sent
+                request_ids = list(dict.fromkeys(int(request_id) for request_id in request_ids))
+            except (TypeError, ValueError):
+                return Response(
+                    {'detail': 'request_ids must only contain integers.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            if len(request_ids) > MAX_BATCH_SIZE:
+                return Response(
+                    {'detail': f'At most {MAX_BATCH_SIZE} requests can be processed at once.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
+            results = apply_batch_action(request_ids, action, request.user, comment)
+            
+            summary = {}
+            for result in results:
+                summary[result['outcome']] = summary.get(result['outcome'], 0) + 1
+            
+            return Response({
+                'detail': f'Processed {len(results)} request(s).',
+                'summary': summary,
+                'results': results
+            }, status=status.HTTP_200_OK)
+            
+        except Exception as e:
+            print(f"!!! ERROR in BatchRequestActionView: {e}")
+            return Response(
+                {'detail': f'Failed to process requests: {str(e)}'},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+class LicenseRequestImportView(APIView):
+    """
+    Endpoint for admins and dept heads to create many license requests at once.
+    Accepts a CSV or JSON file upload (`file`) or a JSON body with a `rows` list.
+    Rows that fail validation are streamed back as an NDJSON error report.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def post(self, request):
+        if request.user.profile.role not in ['ADMIN', 'DEPT_HEAD']:
+            return Response(
+                {'detail': 'Only admins and department heads can import license requests.'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        try:
+            upload = request.FILES.get('file')
+            if upload:
+                file_format = 'csv' if upload.name.lower().endswith('.csv') else 'json'
+                rows = parse_rows(upload.file, file_format)
+            else:
+                rows = request.data.get('rows')
+                if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+                    raise ImportFileError('Upload a CSV/JSON file or send a list of rows.')
+        except ImportFileError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Dept heads' imports go to admin for approval, like their single requests
+        created, errors = import_license_requests(rows, requested_by=request.user, approval_level='ADMIN')
+        summary = {'rows': len(rows), 'created': created, 'rejected': len(errors)}
+        
+        response = StreamingHttpResponse(
+            streaming_body(request, stream_error_report(errors, summary)),
+            content_type='application/x-ndjson',
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
+        )
+        response['X-Imported-Count'] = str(created)
+        response['X-Rejected-Count'] = str(len(errors))
+        return response
+
 class DeptHeadTeamIssuesView(APIView):
     """
     Endpoint for department heads to view issues reported by their team members.
@@ -702,6 +899,7 @@ class DeptHeadTeamIssuesView(APIView):
     """
     permission_classes = [permissions.IsAuthenticated]
     
+    @conditional_get('issues', 'users')
     def get(self, request):
         try:
             user_profile = request.user.profile
@@ -712,7 +910,7 @@ class DeptHeadTeamIssuesView(APIView):
                     status=status.HTTP_403_FORBIDDEN
                 )
             
-            if not user_profile.department:
+            if not user_profile.department_key:
                 return Response(
                     {'detail': 'Department head must have a department assigned.'},
                     status=status.HTTP_400_BAD_REQUEST
@@ -720,13 +918,21 @@ class DeptHeadTeamIssuesView(APIView):
             
             # Get issues from team members (exclude other dept heads) that are not resolved/closed
             team_issues = IssueReport.objects.filter(
-                reported_by__profile__department__iexact=user_profile.department,
+                reported_by__profile__department_key=user_profile.department_key,
                 reported_by__profile__role='USER',  # Only regular users, not dept heads
                 status__in=['OPEN', 'IN_PROGRESS']  # Exclude resolved/closed
             ).select_related('reported_by').order_by('-created_at')
             
+            try:
+                page, pagination = InboxCursorPaginator(request).paginate(team_issues)
+            except ValueError:
+                return Response(
+                    {'detail': 'Invalid cursor.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            
             issues_data = []
-            for issue in team_issues:
+            for issue in page:
                 issues_data.append({
                     'id': issue.id,
                     'software_name': issue.software_name,
@@ -743,7 +949,7 @@ class DeptHeadTeamIssuesView(APIView):
                 })
             
             return Response({
-                'count': len(issues_data),
+                **pagination,
                 'issues': issues_data
             }, status=status.HTTP_200_OK)
             
@@ -761,6 +967,7 @@ class AdminAllIssuesView(APIView):
     """
     permission_classes = [permissions.IsAuthenticated]
     
+    @conditional_get('issues', 'users')
     def get(self, request):
         try:
             if request.user.profile.role != 'ADMIN':
@@ -772,10 +979,18 @@ class AdminAllIssuesView(APIView):
             # Get all issues that are not resolved/closed
             all_issues = IssueReport.objects.filter(
                 status__in=['OPEN', 'IN_PROGRESS']
-            ).select_related('reported_by').order_by('-created_at')
+            ).select_related('reported_by__profile').order_by('-created_at')
+            
+            try:
+                page, pagination = InboxCursorPaginator(request).paginate(all_issues)
+            except ValueError:
+                return Response(
+                    {'detail': 'Invalid cursor.'},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
             
             issues_data = []
-            for issue in all_issues:
+            for issue in page:
                 issues_data.append({
                     'id': issue.id,
                     'software_name': issue.software_name,
@@ -793,7 +1008,7 @@ class AdminAllIssuesView(APIView):
                 })
             
             return Response({
-                'count': len(issues_data),
+                **pagination,
                 'issues': issues_data
             }, status=status.HTTP_200_OK)
             
@@ -825,8 +1040,8 @@ class UpdateIssueStatusView(APIView):
             
             # Dept heads can only update issues from their department
             if user_profile.role == 'DEPT_HEAD':
-                if not user_profile.department or \
-                   issue.reported_by.profile.department.lower() != user_profile.department.lower():
+                if not user_profile.department_key or \
+                   issue.reported_by.profile.department_key != user_profile.department_key:
                     return Response(
                         {'detail': 'You can only update issues from your department.'},
                         status=status.HTTP_403_FORBIDDEN
@@ -877,6 +1092,7 @@ class DepartmentStatsView(APIView):
     """
     permission_classes = [permissions.IsAuthenticated]
     
+    @conditional_get('rollups', 'users', 'catalog')
     def get(self, request):
         try:
             # Get the department of the logged-in user
@@ -888,7 +1104,7 @@ class DepartmentStatsView(APIView):
                     status=status.HTTP_404_NOT_FOUND
                 )
             
-            if not user_profile.department:
+            if not user_profile.department_key:
                 return Response(
                     {'detail': 'User does not have a department assigned.'},
                     status=status.HTTP_400_BAD_REQUEST
@@ -896,44 +1112,28 @@ class DepartmentStatsView(APIView):
             
             department = user_profile.department
             
-            # Get all users in this department (excluding the dept head themselves)
-            team_members = User.objects.filter(
-                profile__department__iexact=department
-            ).exclude(pk=request.user.pk)
-            
-            team_count = team_members.count()
-            
-            # Calculate total licenses assigned to team members
-            # Count approved GRANT license requests for users in this department
-            total_licenses = LicenseRequest.objects.filter(
-                user__profile__department__iexact=department,
-                request_type='GRANT',
-                status='APPROVED'
-            ).count()
-            
-            # Calculate department spend
-            # Get all unique software assigned to team members in this department
-            department_software_ids = LicenseRequest.objects.filter(
-                user__profile__department__iexact=department,
-                request_type='GRANT',
-                status='APPROVED'
-            ).values_list('software_id', flat=True).distinct()
-            
-            # Sum the monthly costs of these software applications
-            department_spend = SaaSApplication.objects.filter(
-                id__in=department_software_ids
-            ).aggregate(
-                total=Coalesce(Sum('monthly_cost'), Value(0), output_field=DecimalField())
-            )['total']
-            
-            # Convert Decimal to float for JSON serialization
-            department_spend = float(department_spend) if department_spend else 0.0
+            # Everything comes from the pre-computed rollup (a single primary-key read).
+            # It is kept in sync by the signal handlers in api/signals.py.
+            rollup = DepartmentRollup.objects.filter(pk=user_profile.department_key).first()
+            budget = DepartmentBudget.objects.filter(pk=user_profile.department_key).first()
+            
+            if rollup:
+                # The rollup counts the dept head themselves, so leave them out
+                team_count = max(rollup.team_size - 1, 0)
+                total_licenses = rollup.approved_grants
+                department_spend = float(rollup.monthly_spend)
+            else:
+                team_count = 0
+                total_licenses = 0
+                department_spend = 0.0
             
             data = {
                 'team_members': team_count,
                 'department_spend': round(department_spend, 2),
                 'total_licenses': total_licenses,
-                'department_name': department
+                'department_name': department,
+                'budget_ceiling': float(budget.monthly_ceiling) if budget else None,
+                'budget_enforcement': budget.enforcement if budget else None
             }
             
             return Response(data, status=status.HTTP_200_OK)
@@ -959,15 +1159,11 @@ class UserAllocatedLicensesView(APIView):
     
     def get(self, request):
         try:
-            # Get all approved GRANT license requests for the current user
-            approved_software_ids = LicenseRequest.objects.filter(
-                user=request.user,
-                request_type='GRANT',
-                status='APPROVED'
-            ).values_list('software_id', flat=True).distinct()
-            
-            # Get the software objects with full details
-            allocated_licenses = SaaSApplication.objects.filter(id__in=approved_software_ids)
+            # The user's current licenses come from the entitlement table, so
+            # approved revocations are taken into account
+            allocated_licenses = SaaSApplication.objects.filter(
+                user_licenses__user=request.user
+            ).order_by('id')
             
             licenses_data = []
             for software in allocated_licenses:
@@ -991,4 +1187,167 @@ class UserAllocatedLicensesView(APIView):
             return Response(
                 {'detail': f'Failed to fetch allocated licenses: {str(e)}'},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
\ No newline at end of file
+            )
+
+
+class DepartmentBudgetView(APIView):
+    """
+    Endpoint for admins to list and set department budget ceilings.
+    GET lists every budget with the department's current monthly spend.
+    PUT {"department": "...", "monthly_ceiling": 5000, "enforcement": "HOLD"|"FLAG"}
+    creates or updates one.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request):
+        if request.user.profile.role != 'ADMIN':
+            return Response({'detail': 'Only admins can view budgets.'}, status=status.HTTP_403_FORBIDDEN)
+        
+        budget_list = list(DepartmentBudget.objects.order_by('department_key'))
+        spend = dict(DepartmentRollup.objects.filter(
+            pk__in=[b.department_key for b in budget_list]
+        ).values_list('department_key', 'monthly_spend'))
+        
+        return Response({
+            'budgets': [
+                {
+                    'department_key': budget.department_key,
+                    'monthly_ceiling': float(budget.monthly_ceiling),
+                    'enforcement': budget.enforcement,
+                    'monthly_spend': float(spend.get(budget.department_key, 0)),
+                }
+                for budget in budget_list
+            ]
+        }, status=status.HTTP_200_OK)
+    
+    def put(self, request):
+        if request.user.profile.role != 'ADMIN':
+            return Response({'detail': 'Only admins can set budgets.'}, status=status.HTTP_403_FORBIDDEN)
+        
+        department_key = normalize_department(str(request.data.get('department') or ''))
+        if not department_key:
+            return Response({'detail': 'department is required.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            ceiling = Decimal(str(request.data.get('monthly_ceiling')))
+        except InvalidOperation:
+            return Response({'detail': 'monthly_ceiling must be a number.'}, status=status.HTTP_400_BAD_REQUEST)
+        if not ceiling.is_finite() or ceiling < 0:
+            return Response({'detail': 'monthly_ceiling must be a positive number.'}, status=status.HTTP_400_BAD_REQUEST)
+        enforcement = request.data.get('enforcement', DepartmentBudget.Enforcement.HOLD)
+        if enforcement not in DepartmentBudget.Enforcement.values:
+            return Response({'detail': 'enforcement must be "HOLD" or "FLAG".'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        budget, _ = DepartmentBudget.objects.update_or_create(
+            department_key=department_key,
+            defaults={'monthly_ceiling': ceiling, 'enforcement': enforcement}
+        )
+        return Response({
+            'department_key': budget.department_key,
+            'monthly_ceiling': float(budget.monthly_ceiling),
+            'enforcement': budget.enforcement,
+        }, status=status.HTTP_200_OK)
+
+
+def _lease_data(lease):
+    return {
+        'token': str(lease.token),
+        'software_id': lease.software_id,
+        'expires_at': lease.expires_at.isoformat(),
+    }
+
+class FloatingLicenseCheckoutView(APIView):
+    """
+    Endpoint for users to check out a seat of a floating-licensed software.
+    Optional body: {"ttl_seconds": 900}. Send heartbeats before expires_at
+    to keep the seat.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def post(self, request, software_id):
+        try:
+            lease = checkout_lease(request.user, software_id, request.data.get('ttl_seconds'))
+        except (TypeError, ValueError):
+            return Response({'detail': 'ttl_seconds must be a number.'}, status=status.HTTP_400_BAD_REQUEST)
+        except LeaseError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except SeatCapacityError:
+            return Response(
+                {'detail': 'All floating seats are in use. Try again later.'},
+                status=status.HTTP_409_CONFLICT
+            )
+        return Response(_lease_data(lease), status=status.HTTP_201_CREATED)
+
+class FloatingLicenseHeartbeatView(APIView):
+    """
+    Endpoint for users to renew one of their leases.
+    Returns 410 if the lease already expired; the client must check out again.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def post(self, request, token):
+        try:
+            lease = renew_lease(token, request.user, request.data.get('ttl_seconds'))
+        except (TypeError, ValueError):
+            return Response({'detail': 'ttl_seconds must be a number.'}, status=status.HTTP_400_BAD_REQUEST)
+        except LeaseError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_410_GONE)
+        return Response(_lease_data(lease), status=status.HTTP_200_OK)
+
+class FloatingLicenseReleaseView(APIView):
+    """
+    Endpoint for users to give a leased seat back.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def post(self, request, token):
+        try:
+            release_lease(token, request.user)
+        except LeaseError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'detail': 'Lease released.'}, status=status.HTTP_200_OK)
+
+
+class ExportView(APIView):
+    """
+    Endpoint for admins to stream a full dump of license requests, issues or
+    the software inventory as NDJSON (default) or CSV.
+    Supports ?output=ndjson|csv, ?start= and ?end= (YYYY-MM-DD), ?department= and ?status=.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+    
+    def get(self, request, resource):
+        if request.user.profile.role != 'ADMIN':
+            return Response(
+                {'detail': 'Only admins can export data.'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        
+        spec = EXPORTS.get(resource)
+        if not spec:
+            return Response(
+                {'detail': f'Unknown export. Must be one of: {", ".join(EXPORTS)}.'},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        
+        output = request.query_params.get('output', 'ndjson').lower()
+        if output not in EXPORT_FORMATS:
+            return Response(
+                {'detail': 'Output must be either "ndjson" or "csv".'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        try:
+            queryset = build_export_queryset(spec, request.query_params)
+        except ExportError as e:
+            return Response({'detail': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        
+        # Rows are streamed in chunks as they're read, nothing is held in memory
+        # (as an async iterator under ASGI, see api/streaming.py)
+        timestamp = timezone.now().strftime('%Y%m%d-%H%M%S')
+        if output == 'csv':
+            body, content_type = stream_csv(queryset, spec.fields), 'text/csv'
+        else:
+            body, content_type = stream_ndjson(queryset, spec.fields), 'application/x-ndjson'
+        response = StreamingHttpResponse(streaming_body(request, body), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{resource}-{timestamp}.{output}"'
+        return response
@@ -0,0 +1,117 @@
+"""
+Batch actions for the license request workflow.
+
+A batch is applied in one transaction: the requests are locked with
+select_for_update, mutated in Python and written back with one
+bulk_update. Requests that are no longer PENDING are skipped, never
+overwritten.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from .models import LicenseRequest
+from . import budgets, entitlements
+from .versions import bump_version_on_commit
+
+MAX_BATCH_SIZE = 500
+
+ACTIONS = {
+    # action: (role allowed to perform it, outcome label)
+    'approve': ('ADMIN', 'approved'),
+    'reject': ('ADMIN', 'rejected'),
+    'forward': ('DEPT_HEAD', 'forwarded'),
+}
+
+
+def _skip_reason(license_request, action, actor_profile):
+    if license_request.status != LicenseRequest.RequestStatus.PENDING:
+        return f'Request is already {license_request.status.lower()}.'
+    if action == 'forward':
+        if license_request.approval_level != LicenseRequest.ApprovalLevel.DEPT_HEAD:
+            return 'Request is already waiting for admin approval.'
+        requester_key = getattr(getattr(license_request.user, 'profile', None), 'department_key', None)
+        if not actor_profile.department_key or requester_key != actor_profile.department_key:
+            return 'Request is not from your department.'
+    return None
+
+
+def apply_batch_action(request_ids, action, actor, comment=''):
+    """
+    Applies approve/reject/forward to every id in request_ids.
+    Returns a list of per-id outcomes in the order the ids were given.
+    """
+    actor_profile = actor.profile
+    now = timezone.now()
+    outcomes = {}
+    changed = []
+    fields = ['updated_at']
+
+    with transaction.atomic():
+        locked = LicenseRequest.objects.select_for_update(of=('self',)).select_related(
+            'user__profile'
+        ).filter(id__in=request_ids)
+
+        for license_request in locked:
+            reason = _skip_reason(license_request, action, actor_profile)
+            if reason:
+                outcomes[license_request.id] = {'outcome': 'skipped', 'detail': reason}
+                continue
+
+            if action == 'forward':
+                license_request.approval_level = LicenseRequest.ApprovalLevel.ADMIN
+                license_request.original_requester_id = license_request.requested_by_id
+                license_request.requested_by = actor
+                if comment:
+                    license_request.reason += f"\n\n[Dept Head Comments]: {comment}"
+            else:
+                license_request.status = (
+                    LicenseRequest.RequestStatus.APPROVED if action == 'approve'
+                    else LicenseRequest.RequestStatus.REJECTED
+                )
+                license_request.admin_response = comment
+                license_request.reviewed_by = actor
+
+            license_request.updated_at = now
+            changed.append(license_request)
+            outcomes[license_request.id] = {'outcome': ACTIONS[action][1]}
+
+        if action == 'forward':
+            fields += ['approval_level', 'original_requester', 'requested_by', 'reason']
+        else:
+            fields += ['status', 'admin_response', 'reviewed_by']
+
+        # bulk_update skips the save signals, so apply the approvals to the
+        # entitlement table here (the rollups follow its signals). Each one
+        # gets its own savepoint so a software with no seats left (or a
+        # department over budget) only refuses its own requests, which then
+        # stay PENDING.
+        if action == 'approve':
+            approved = []
+            for license_request in sorted(changed, key=lambda r: r.pk):
+                try:
+                    with transaction.atomic():
+                        entitlements.apply_approved_request(license_request)
+                except entitlements.SeatCapacityError:
+                    outcomes[license_request.id] = {
+                        'outcome': 'refused',
+                        'detail': 'No seats left for this software.'
+                    }
+                    continue
+                except budgets.BudgetExceededError as e:
+                    outcomes[license_request.id] = {
+                        'outcome': 'held',
+                        'detail': f'Over the {e.department_key} department budget.'
+                    }
+                    continue
+                approved.append(license_request)
+            changed = approved
+
+        if changed:
+            LicenseRequest.objects.bulk_update(changed, fields)
+            # bulk_update doesn't send post_save, so take the new version here
+            bump_version_on_commit('license-requests')
+
+    return [
+        {'id': request_id, **outcomes.get(request_id, {'outcome': 'not_found'})}
+        for request_id in request_ids
+    ]
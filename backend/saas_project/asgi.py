@@ -13,4 +13,6 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'saas_project.settings')
 
+# Run under an ASGI server (e.g. gunicorn -k uvicorn.workers.UvicornWorker) so
+# the streaming chatbot (api/chat_stream.py) shares one event loop per worker
 application = get_asgi_application()
@@ -114,6 +114,30 @@ DATABASES = {
 }
 
 
+# ================================
+# 🧠 CACHE CONFIG
+# ================================
+# Use Redis when available so every worker shares the same cached data,
+# otherwise fall back to a per-process memory cache for local dev. Without
+# Redis, invalidations only reach the worker that made the change: the others
+# may serve their dashboard snapshot for up to a minute
+# (api/dashboard.LOCAL_SNAPSHOT_TIMEOUT). ETags and trusting token claims
+# without a database read are turned off (api/versions.cache_is_shared).
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+
 # ================================
 # 🔑 PASSWORD VALIDATION
 # ================================
@@ -183,7 +207,8 @@ CORS_ALLOW_METHODS = [
 # ================================
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        # Reads role and department from the token claims (see api/authentication.py)
+        'api.authentication.ClaimsJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',  # For browsable API
     ),
     'DEFAULT_PERMISSION_CLASSES': (
@@ -198,6 +223,11 @@ REST_FRAMEWORK = {
 }
 
 
+SIMPLE_JWT = {
+    'TOKEN_OBTAIN_SERIALIZER': 'api.authentication.ClaimsTokenObtainPairSerializer',
+    'TOKEN_REFRESH_SERIALIZER': 'api.authentication.ClaimsTokenRefreshSerializer',
+}
+
 # ================================
 # ⚙ CELERY CONFIG (Local Only)
 # ================================
@@ -207,3 +237,17 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
+
+
+# ================================
+# 🤖 AI ASSISTANT SETTINGS
+# ================================
+# Token budget for the agent and chatbot prompts (see api/prompt_encoder.py)
+LLM_PROMPT_TOKEN_BUDGET = int(os.environ.get('LLM_PROMPT_TOKEN_BUDGET', 3000))
+
+# Which LLM answers the agent and chatbot (see api/llm_providers.py):
+# 'cohere', 'stub' (offline, deterministic), 'record' or 'replay'
+LLM_PROVIDER = os.environ.get('LLM_PROVIDER', 'cohere')
+LLM_STUB_LATENCY = float(os.environ.get('LLM_STUB_LATENCY', 0.2))
+LLM_STUB_TOKENS_PER_SECOND = float(os.environ.get('LLM_STUB_TOKENS_PER_SECOND', 50))
+LLM_RECORDINGS_DIR = os.environ.get('LLM_RECORDINGS_DIR', str(BASE_DIR / 'llm_recordings'))
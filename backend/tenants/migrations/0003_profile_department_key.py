@@ -0,0 +1,48 @@
+# Generated by Django 5.0.4 on 2026-10-17 17:19
+
+from collections import Counter, defaultdict
+
+from django.db import migrations, models
+
+
+def fold_department_variants(apps, schema_editor):
+    """
+    Fills department_key and folds case variants ("engineering", "Engineering ")
+    into one spelling: the one used by the department head, otherwise the most
+    common one.
+    """
+    Profile = apps.get_model('tenants', 'Profile')
+
+    groups = defaultdict(list)
+    for profile in Profile.objects.exclude(department__isnull=True):
+        key = profile.department.strip().lower()
+        groups[key or None].append(profile)
+
+    for key, profiles in groups.items():
+        if not key:
+            Profile.objects.filter(pk__in=[p.pk for p in profiles]).update(department=None, department_key=None)
+            continue
+
+        head_spellings = [p.department.strip() for p in profiles if p.role == 'DEPT_HEAD']
+        if head_spellings:
+            canonical = head_spellings[0]
+        else:
+            canonical = Counter(p.department.strip() for p in profiles).most_common(1)[0][0]
+
+        Profile.objects.filter(pk__in=[p.pk for p in profiles]).update(department=canonical, department_key=key)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tenants', '0002_profile_department'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='profile',
+            name='department_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=100, null=True),
+        ),
+        migrations.RunPython(fold_department_variants, migrations.RunPython.noop),
+    ]
@@ -3,6 +3,16 @@ from django.contrib.auth.models import User
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 
+
+def normalize_department(name):
+    """
+    Returns the canonical key for a department name, or None if it is blank.
+    "Engineering", " engineering " and "ENGINEERING" all map to "engineering".
+    """
+    if not name:
+        return None
+    return name.strip().lower() or None
+
 # This is the Profile class that was missing.
 class Profile(models.Model):
     # These are the choices for the user's role.
@@ -17,6 +27,16 @@ class Profile(models.Model):
     role = models.CharField(max_length=10, choices=Role.choices, default=Role.USER)
     # This stores the user's department (optional field).
     department = models.CharField(max_length=100, blank=True, null=True, help_text="User's department")
+    # Normalized, indexed copy of `department` used for all department lookups,
+    # so they are plain equality matches instead of case-insensitive scans.
+    department_key = models.CharField(max_length=100, blank=True, null=True, db_index=True, editable=False)
+
+    def save(self, *args, **kwargs):
+        self.department_key = normalize_department(self.department)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'department' in update_fields:
+            kwargs['update_fields'] = set(update_fields) | {'department_key'}
+        super().save(*args, **kwargs)
 
     # This __str__ method is now correctly indented inside the Profile class.
     def __str__(self):
@@ -20,6 +20,8 @@ export default function LicenseChatbot() {
   ]);
   const [input, setInput] = useState('');
   const [isLoading, setIsLoading] = useState(false);
+  // Server-side conversation, so follow-up questions keep the earlier context
+  const sessionIdRef = useRef<string | null>(null);
   const messagesEndRef = useRef<HTMLDivElement>(null);
 
   const scrollToBottom = () => {
@@ -44,25 +46,47 @@ export default function LicenseChatbot() {
     setIsLoading(true);
 
     try {
-      const response = await fetchWithAuth('/api/license-chatbot/', {
+      const response = await fetchWithAuth('/api/license-chatbot/stream/', {
         method: 'POST',
         headers: {
           'Content-Type': 'application/json',
         },
-        body: JSON.stringify({ question: input }),
+        body: JSON.stringify({ question: input, session_id: sessionIdRef.current }),
       });
 
-      if (!response.ok) throw new Error('Failed to get response');
-
-      const data = await response.json();
-
-      const assistantMessage: Message = {
-        role: 'assistant',
-        content: data.answer,
-        timestamp: new Date()
+      if (!response.ok || !response.body) throw new Error('Failed to get response');
+
+      // The answer streams in as Server-Sent Events: `token` chunks, then `done` or `error`
+      let started = false;
+      const appendToAnswer = (text: string) => {
+        if (!started) {
+          started = true;
+          setMessages(prev => [...prev, { role: 'assistant', content: text, timestamp: new Date() }]);
+        } else {
+          setMessages(prev => {
+            const last = prev[prev.length - 1];
+            return [...prev.slice(0, -1), { ...last, content: last.content + text }];
+          });
+        }
       };
 
-      setMessages(prev => [...prev, assistantMessage]);
+      const reader = response.body.getReader();
+      const decoder = new TextDecoder();
+      let buffer = '';
+      while (true) {
+        const { done, value } = await reader.read();
+        if (done) break;
+        buffer += decoder.decode(value, { stream: true });
+        const events = buffer.split('\n\n');
+        buffer = events.pop() ?? '';
+        for (const raw of events) {
+          const event = raw.match(/^event: (.*)$/m)?.[1];
+          const data = JSON.parse(raw.match(/^data: (.*)$/m)?.[1] ?? '{}');
+          if (event === 'token') appendToAnswer(data.text);
+          else if (event === 'done') sessionIdRef.current = data.session_id ?? null;
+          else if (event === 'error') throw new Error(data.error);
+        }
+      }
     } catch (error: any) {
       const errorMessage: Message = {
         role: 'assistant',
@@ -155,8 +179,8 @@ export default function LicenseChatbot() {
           </div>
         ))}
 
-        {/* Loading Indicator */}
-        {isLoading && (
+        {/* Loading Indicator, until the first words of the answer arrive */}
+        {isLoading && messages[messages.length - 1].role === 'user' && (
           <div className="flex justify-start">
             <div className="flex items-start space-x-2">
               <div className="flex-shrink-0 w-8 h-8 rounded-full bg-gradient-to-r from-purple-600 to-blue-600 flex items-center justify-center">